@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, make_response
+from flask import Flask, render_template, request, jsonify, make_response, Response
 import cv2
 import face_recognition
 import numpy as np
@@ -8,11 +8,13 @@ import os
 
 DB_PATH = os.getenv('DB_PATH', 'attendance.db')
 import base64
+import csv
+import io
+import json
 import pandas as pd
 import threading
 import time
 import socket
-from decimal import Decimal
 import logging
 from logging.handlers import RotatingFileHandler
 
@@ -38,11 +40,32 @@ from time_utils import (
     time_calculator,
     get_current_time_precise,
     calculate_duration_precise,
-    calculate_exposure_precise
+    calculate_exposure_precise,
+    quantize_exposure
 )
 
 # استيراد نظام التخزين المؤقت
-from cache_manager import get_radiation_cache
+from cache_manager import get_radiation_cache, SharedLatestReading
+from pagination import parse_page_size, encode_cursor, decode_cursor, date_range_condition, fetch_page
+from response_cache import (response_cache, cached_response, bump_generation, conditional_response,
+                            make_etag, matching_etag, not_modified_response)
+from compression import ResponseCompressor, compress, no_compress
+from downsampling import DOWNSAMPLING_METHODS, parse_max_points, downsample_indices
+from timeseries import SERIES_FIELDS, MAX_BUCKETS, parse_bucket, parse_aggregates, parse_time, fetch_buckets
+
+# استيراد حساب البيانات التراكمية المشترك مع المُجدول
+from cumulative_data import (
+    update_employees_cumulative_data,
+    init_cumulative_storage,
+    init_change_tracking,
+    mark_employees_dirty,
+    init_daily_dose_ledger,
+    refresh_daily_dose_ledger,
+    dose_window_starts,
+    get_daily_dose,
+    get_total_dose,
+    fetch_dose_summaries
+)
 
 # إعدادات النظام
 DEFAULT_SENSOR_ID = "ESP32_001"
@@ -51,6 +74,19 @@ print("✅ النظام يستخدم قاعدة البيانات المحلية
 # إنشاء كائن التخزين المؤقت العام
 radiation_cache = get_radiation_cache()
 
+# آخر قراءة مشتركة بين عمال gunicorn (التخزين المؤقت أعلاه خاص بكل عملية)
+latest_reading_store = SharedLatestReading(DB_PATH)
+
+def get_live_reading():
+    """أحدث قراءة حية: المشتركة في SQLite أو التي في ذاكرة هذا العامل، أيهما أحدث"""
+    shared_reading = latest_reading_store.get_latest()
+    local_reading = radiation_cache.get_latest_reading()
+    if shared_reading is None:
+        return local_reading
+    if local_reading is not None and local_reading.timestamp > shared_reading.timestamp:
+        return local_reading
+    return shared_reading
+
 def update_cache_from_local_db():
     """تحديث التخزين المؤقت من قاعدة البيانات المحلية"""
     try:
@@ -120,6 +156,9 @@ def get_local_ip():
 
 app = Flask(__name__)
 
+# ضغط استجابات JSON/CSV الكبيرة (brotli أو gzip حسب المتصفح)
+response_compressor = ResponseCompressor(app, min_size=int(os.getenv('COMPRESSION_MIN_SIZE', '1024')))
+
 # إعداد مُجدول البيانات التراكمية
 global_scheduler = None
 
@@ -128,10 +167,8 @@ def initialize_scheduler():
     global global_scheduler
     if SCHEDULER_AVAILABLE and global_scheduler is None:
         try:
-            local_ip = get_local_ip()
-            api_url = f"http://{local_ip}:5000"
-            global_scheduler = CumulativeDataScheduler(api_base_url=api_url)
-            print(f"✅ تم تهيئة مُجدول البيانات التراكمية - {api_url}")
+            global_scheduler = CumulativeDataScheduler(db_path=DB_PATH)
+            print("✅ تم تهيئة مُجدول البيانات التراكمية (تنفيذ داخلي)")
             return True
         except Exception as e:
             print(f"❌ خطأ في تهيئة المُجدول: {e}")
@@ -151,6 +188,8 @@ def init_db():
 
     # تفعيل إعدادات SQLite لتحسين الاعتمادية والأداء
     try:
+        # يسري فقط على قاعدة بيانات جديدة؛ القواعد الموجودة تُرحَّل يدوياً: python cleanup_advanced.py --vacuum-migrate
+        c.execute("PRAGMA auto_vacuum=INCREMENTAL")
         c.execute("PRAGMA journal_mode=WAL")
         c.execute("PRAGMA synchronous=NORMAL")
         c.execute("PRAGMA busy_timeout=5000")
@@ -191,6 +230,11 @@ def init_db():
         c.execute("ALTER TABLE attendance ADD COLUMN time TEXT")
     except Exception:
         pass
+    # فهارس ترقيم التقارير بالمؤشر (الترتيب على timestamp ثم id)
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_attendance_timestamp
+                 ON attendance (timestamp)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_attendance_employee_timestamp
+                 ON attendance (employee_id, timestamp)''')
     # جدول قراءات الإشعاع المحلية
     c.execute('''CREATE TABLE IF NOT EXISTS radiation_readings_local
                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -208,6 +252,15 @@ def init_db():
     # فهرس للأداء على session_id
     c.execute('''CREATE INDEX IF NOT EXISTS idx_radiation_readings_session_id
                  ON radiation_readings_local (session_id)''')
+    # فهرس نطاقات الوقت لاستعلامات السلاسل الزمنية (/api/readings/query)
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_radiation_readings_timestamp
+                 ON radiation_readings_local (timestamp)''')
+    # آخر قراءة حية لكل حساس (مشتركة بين عمال gunicorn)
+    latest_reading_store.ensure_table(c)
+    # عدادات أجيال التخزين المؤقت للاستجابات (مشتركة بين عمال gunicorn والمُجدول)
+    response_cache.share_generations(DB_PATH, c)
+    # أي تعديل على الموظفين (الجنس/الحمل، الحدود، الحذف) يزيد جيل 'employees' - علامة إصدار للوحة التقارير
+    response_cache.bump_on_write(c, 'employees', 'employees')
 
     # جدول فترات التعرض للموظفين
     c.execute('''CREATE TABLE IF NOT EXISTS employee_exposure_sessions
@@ -243,6 +296,12 @@ def init_db():
     except Exception:
         pass  # العمود موجود بالفعل
 
+    # فهارس ترقيم تقارير التعرض بالمؤشر (الترتيب على check_in_time ثم id)
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_exposure_sessions_check_in
+                 ON employee_exposure_sessions (check_in_time)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_exposure_sessions_employee_check_in
+                 ON employee_exposure_sessions (employee_id, check_in_time)''')
+
     # جدول تنبيهات الأمان
     c.execute('''CREATE TABLE IF NOT EXISTS safety_alerts
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -275,7 +334,9 @@ def init_db():
         ('auto_checkout_hours', '12', 'الخروج التلقائي بعد ساعات'),
         ('alert_email_enabled', 'false', 'تفعيل تنبيهات البريد الإلكتروني'),
         ('sensor_timeout_minutes', '5', 'انتهاء مهلة الحساس بالدقائق'),
-        ('tube_type', 'J305', 'نوع أنبوب Geiger المستخدم (SBM20 أو J305)')
+        ('tube_type', 'J305', 'نوع أنبوب Geiger المستخدم (SBM20 أو J305)'),
+        ('readings_retention_days', '90', 'مدة الاحتفاظ بقراءات الإشعاع الخام بعد تلخيصها (أيام)'),
+        ('alerts_retention_days', '30', 'مدة الاحتفاظ بالتنبيهات المُقَر بها (أيام)')
     ]
 
     for setting in default_settings:
@@ -325,6 +386,15 @@ def init_db():
     c.execute('''CREATE INDEX IF NOT EXISTS idx_employee_cumulative_last_updated 
                  ON employee_cumulative_data(last_updated)''')
 
+    # فهرس الجلسات حسب الموظف وعمود عدد القراءات لمحرك الحساب المجمَّع
+    init_cumulative_storage(c)
+
+    # سجل الموظفين المتغيرين - يعيد المُجدول حساب بياناتهم التراكمية فقط
+    init_change_tracking(c)
+
+    # سجل الجرعات اليومية (employee_id, dose_date) - يُحدَّث عند إغلاق كل جلسة
+    init_daily_dose_ledger(c)
+
     conn.commit()
     conn.close()
     print("✅ تم تهيئة قاعدة البيانات بنجاح")
@@ -398,6 +468,7 @@ def save_reading_to_database(reading):
                              VALUES (?, ?, ?, ?, ?)''',
                           (reading.cpm, reading.source_power, reading.absorbed_dose_rate, 
                            reading.total_absorbed_dose, session_id))
+            mark_employees_dirty(c, [employee_id for _, employee_id in active_sessions])
             print(f"✅ تم حفظ القراءة لـ {len(active_sessions)} جلسة نشطة")
         else:
             # حفظ قراءة عامة بدون session_id (للحفاظ على السجل العام)
@@ -409,6 +480,8 @@ def save_reading_to_database(reading):
 
         conn.commit()
         conn.close()
+        if active_sessions:
+            bump_generation('readings')  # القراءات العامة لا تظهر في تقارير الجلسات
         return True
 
     except Exception as e:
@@ -565,17 +638,26 @@ def tube_selector():
 # API Endpoints لبيانات الإشعاع
 # ===================================
 
+def radiation_data_version():
+    """علامة إصدار /api/radiation_data: أحدث قراءة حية (نفس العلامة في كل العمال)"""
+    latest_reading = get_live_reading()
+    if not latest_reading:
+        return None
+    return latest_reading.timestamp.isoformat(), latest_reading.total_absorbed_dose
+
 @app.route('/api/radiation_data', methods=['GET'])
+@no_compress
+@conditional_response(radiation_data_version)
 def get_radiation_data():
     """إرسال أحدث بيانات الإشعاع للواجهة - جلب من الذاكرة أولاً"""
     try:
-        # محاولة جلب البيانات من التخزين المؤقت أولاً
-        latest_reading = radiation_cache.get_latest_reading()
+        # محاولة جلب آخر قراءة حية أولاً (مشتركة بين العمال)
+        latest_reading = get_live_reading()
 
-        # إذا لم توجد بيانات في التخزين المؤقت، جلب من قاعدة البيانات المحلية
+        # إذا لم توجد بيانات حية، جلب من قاعدة البيانات المحلية
         if not latest_reading:
             update_cache_from_local_db()
-            latest_reading = radiation_cache.get_latest_reading()
+            latest_reading = get_live_reading()
 
         if latest_reading:
             print("📊 تم جلب البيانات من التخزين المؤقت")
@@ -590,10 +672,7 @@ def get_radiation_data():
                     "source": "cache"
                 }
             })
-            # منع التخزين المؤقت في المتصفح
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
+            # رؤوس التخزين (ETag + no-cache) يضيفها conditional_response
             return response
 
         # إذا لم توجد بيانات في الذاكرة، جرب قاعدة البيانات المحلية
@@ -718,7 +797,9 @@ def get_cache_stats():
         stats = radiation_cache.get_cache_stats()
         return jsonify({
             "success": True,
-            "stats": stats
+            "stats": stats,
+            "response_cache": response_cache.get_stats(),
+            "compression": response_compressor.get_stats()
         })
     except Exception as e:
         return jsonify({
@@ -781,7 +862,7 @@ def start_exposure_session(employee_id):
             }
         else:
             # التحقق من وجود جلسات قديمة نشطة (من أيام سابقة) وإغلاقها تلقائياً
-            c.execute('''SELECT id FROM employee_exposure_sessions
+            c.execute('''SELECT id, session_date FROM employee_exposure_sessions
                          WHERE employee_id = ?
                          AND is_active = 1
                          AND DATE(session_date) < DATE(?)''',
@@ -793,8 +874,11 @@ def start_exposure_session(employee_id):
                 for old_session in old_sessions:
                     c.execute('''UPDATE employee_exposure_sessions
                                 SET is_active = 0,
-                                    notes = COALESCE(notes, '') || ' [تم الإغلاق التلقائي]'
+                                    notes = COALESCE(notes, '') || ' [تم الإغلاق التلقائي]',
+                                    readings_count = (SELECT COUNT(*) FROM radiation_readings_local
+                                                      WHERE session_id = employee_exposure_sessions.id)
                                 WHERE id = ?''', (old_session[0],))
+                    refresh_daily_dose_ledger(c, employee_id, old_session[1])
                 conn.commit() # Commit these changes before creating a new session
 
             # إنشاء جلسة جديدة ليوم جديد
@@ -804,8 +888,10 @@ def start_exposure_session(employee_id):
                       (employee_id, current_time, current_total_dose, current_date))
 
             session_id = c.lastrowid
+            mark_employees_dirty(c, [employee_id])
             conn.commit()
             conn.close()
+            bump_generation('sessions')
 
             print(f"✅ بدء جلسة تعرض جديدة للموظف {employee_id}")
             print(f"   Session ID: {session_id}")
@@ -858,10 +944,10 @@ def end_exposure_session(employee_id):
         check_in_dt = time_calculator.normalize_datetime(check_in_time)
         duration_data = calculate_duration_precise(check_in_dt, check_out_dt)
 
-        # استخراج القيم بدقة عالية
-        duration_seconds_precise = Decimal(str(duration_data['seconds']))
+        # القيم بـ float64 - التقريب يتم مرة واحدة عند الحفظ والإرجاع
+        duration_seconds = duration_data['seconds']
         duration_minutes = int(duration_data['minutes'])
-        duration_hours = Decimal(str(duration_data['hours']))
+        duration_hours = duration_data['hours']
 
         # حساب التعرض الفعلي للموظف خلال فترة العمل - محدث
         # بدلاً من الاعتماد على الجرعة الإجمالية العامة، نحسب التعرض من القراءات الفعلية
@@ -877,8 +963,8 @@ def end_exposure_session(employee_id):
                 # الحصول على متوسط معدل الجرعة من القراءات الحديثة
                 avg_dose_rate = get_average_dose_rate_from_cache()
                 if avg_dose_rate > 0 and duration_hours > 0:
-                    total_exposure = float(avg_dose_rate * duration_hours)
-                    print(f"📊 حساب التعرض من معدل الجرعة: {avg_dose_rate:.3f} μSv/h × {float(duration_hours):.3f} h = {total_exposure:.3f} μSv")
+                    total_exposure = avg_dose_rate * duration_hours
+                    print(f"📊 حساب التعرض من معدل الجرعة: {avg_dose_rate:.3f} μSv/h × {duration_hours:.3f} h = {total_exposure:.3f} μSv")
                 else:
                     total_exposure = 0.0
             else:
@@ -886,9 +972,12 @@ def end_exposure_session(employee_id):
         else:
             total_exposure = actual_exposure
 
-        # حساب متوسط معدل الجرعة بدقة عالية
+        # تقريب التعرض مرة واحدة قبل الحفظ
+        total_exposure = float(quantize_exposure(total_exposure))
+
+        # حساب متوسط معدل الجرعة
         if duration_hours > 0:
-            average_dose_rate = float(Decimal(str(total_exposure)) / Decimal(str(duration_hours)))
+            average_dose_rate = total_exposure / duration_hours
         else:
             average_dose_rate = 0.0
 
@@ -912,13 +1001,18 @@ def end_exposure_session(employee_id):
                          max_dose_rate = ?,
                          min_dose_rate = ?,
                          daily_total_exposure = ?,
-                         is_active = 0
+                         is_active = 0,
+                         readings_count = (SELECT COUNT(*) FROM radiation_readings_local
+                                           WHERE session_id = employee_exposure_sessions.id)
                      WHERE id = ?''',
                   (check_out_dt, final_dose, duration_minutes, average_dose_rate,
                    total_exposure, max_dose_rate, min_dose_rate, daily_exposure, session_id))
+        refresh_daily_dose_ledger(c, employee_id, session_date)
+        mark_employees_dirty(c, [employee_id])
 
         conn.commit()
         conn.close()
+        bump_generation('sessions')
 
         print(f"📊 تفاصيل الجلسة:")
         print(f"   الجرعة اليومية (تم تصفيرها): {daily_exposure:.6f} μSv")
@@ -936,7 +1030,7 @@ def end_exposure_session(employee_id):
         print(f"✅ انتهاء فترة التعرض للموظف {employee_id}")
         print(f"   المدة: {formatted_duration}")
         print(f"   المدة بالدقائق: {duration_minutes}")
-        print(f"   المدة بالساعات: {float(duration_hours):.6f}")
+        print(f"   المدة بالساعات: {duration_hours:.6f}")
         print(f"   التعرض الإجمالي: {total_exposure:.6f} μSv")
         print(f"   متوسط معدل الجرعة: {average_dose_rate:.6f} μSv/h")
         print(f"   أقصى معدل جرعة: {max_dose_rate:.6f} μSv/h")
@@ -955,8 +1049,8 @@ def end_exposure_session(employee_id):
             "success": True,
             "session_id": session_id,
             "duration_minutes": duration_minutes,
-            "duration_hours": round(float(duration_hours), 6),
-            "duration_seconds": round(float(duration_seconds_precise), 3),
+            "duration_hours": round(duration_hours, 6),
+            "duration_seconds": round(duration_seconds, 3),
             "duration_formatted": formatted_duration,
             "total_exposure": round(total_exposure, 6),
             "average_dose_rate": round(average_dose_rate, 6),
@@ -980,9 +1074,9 @@ def end_exposure_session(employee_id):
 def get_current_total_dose():
     """الحصول على الجرعة الإجمالية الحالية من التخزين المؤقت أو قاعدة البيانات"""
     try:
-        # أولاً: محاولة الحصول على البيانات من التخزين المؤقت
+        # أولاً: محاولة الحصول على آخر قراءة حية (مشتركة بين العمال)
         if radiation_cache and hasattr(radiation_cache, 'get_latest_reading'):
-            latest_reading = radiation_cache.get_latest_reading()
+            latest_reading = get_live_reading()
             if latest_reading and hasattr(latest_reading, 'total_absorbed_dose'):
                 print(f"📊 جرعة إجمالية من التخزين المؤقت: {latest_reading.total_absorbed_dose} μSv")
                 return latest_reading.total_absorbed_dose
@@ -1072,39 +1166,27 @@ def calculate_employee_exposure(employee_id, start_time, end_time, session_id=No
                 print(f"⚠️ لا توجد قراءات إشعاعية للموظف {employee_id} خلال الفترة")
                 return None
 
-            total_exposure = Decimal('0')
-            previous_time = start_dt
-
             print(f"📊 حساب التعرض للموظف {employee_id}:")
             print(f"   عدد القراءات: {len(readings)}")
 
-            for i, (dose_rate, timestamp) in enumerate(readings):
-                # تطبيع وقت القراءة
-                current_time = time_calculator.normalize_datetime(timestamp)
-
-                # حساب الفترة الزمنية بدقة عالية
-                _, _, time_diff_hours, _ = time_calculator.calculate_duration(previous_time, current_time)
-
-                # حساب التعرض للفترة بدقة عالية
-                exposure_increment = time_calculator.calculate_precise_exposure(dose_rate, time_diff_hours)
-                total_exposure += exposure_increment
-
-                print(f"   القراءة {i+1}: {dose_rate:.6f} μSv/h × {float(time_diff_hours):.6f} h = {float(exposure_increment):.6f} μSv")
-
-                previous_time = current_time
+            # حساب الفترات والتعرض لجميع القراءات دفعة واحدة (float64 بدون تقريب وسيط)
+            dose_rates = np.array([float(r[0]) for r in readings], dtype='float64')
+            _, _, interval_hours, _ = time_calculator.calculate_pairwise_durations_array(
+                [r[1] for r in readings], start_time=start_dt
+            )
 
-            # إضافة التعرض للفترة الأخيرة حتى نهاية العمل
-            if readings:
-                last_reading_time = time_calculator.normalize_datetime(readings[-1][1])
-                _, _, final_time_diff, _ = time_calculator.calculate_duration(last_reading_time, end_dt)
+            # إضافة الفترة الأخيرة حتى نهاية العمل بمعدل آخر قراءة
+            last_reading_time = time_calculator.normalize_datetime(readings[-1][1])
+            final_time_diff = time_calculator.calculate_duration_seconds(last_reading_time, end_dt) / 3600.0
 
-                if final_time_diff > 0:
-                    last_dose_rate = readings[-1][0]
-                    final_exposure = time_calculator.calculate_precise_exposure(last_dose_rate, final_time_diff)
-                    total_exposure += final_exposure
-                    print(f"   الفترة الأخيرة: {last_dose_rate:.6f} μSv/h × {float(final_time_diff):.6f} h = {float(final_exposure):.6f} μSv")
+            if final_time_diff > 0:
+                dose_rates = np.append(dose_rates, dose_rates[-1])
+                interval_hours = np.append(interval_hours, final_time_diff)
+                print(f"   الفترة الأخيرة: {dose_rates[-1]:.6f} μSv/h × {final_time_diff:.6f} h = {dose_rates[-1] * final_time_diff:.6f} μSv")
 
-            final_exposure_float = float(total_exposure)
+            # جمع معوَّض ثم تقريب واحد إلى 6 خانات عند الإرجاع
+            total_exposure = time_calculator.integrate_exposure_float(dose_rates, interval_hours)
+            final_exposure_float = float(quantize_exposure(total_exposure))
             print(f"   إجمالي التعرض: {final_exposure_float:.6f} μSv")
 
             return final_exposure_float
@@ -1147,17 +1229,10 @@ def get_employee_daily_dose(employee_id, date=None):
         if date is None:
             date = datetime.now().date()
 
-        # جلب جميع الجلسات في هذا اليوم
-        c.execute('''SELECT SUM(daily_total_exposure)
-                     FROM employee_exposure_sessions
-                     WHERE employee_id = ?
-                     AND DATE(session_date) = DATE(?)''',
-                  (employee_id, date))
-
-        result = c.fetchone()
+        # صف واحد من سجل الجرعات اليومية بدلاً من مسح جلسات اليوم
+        daily_dose = get_daily_dose(c, employee_id, date)
         conn.close()
 
-        daily_dose = result[0] if result and result[0] else 0.0
         print(f"📊 الجرعة اليومية للموظف {employee_id} في {date}: {daily_dose:.6f} μSv")
 
         return daily_dose
@@ -1172,17 +1247,10 @@ def get_employee_cumulative_dose(employee_id):
         conn = sqlite3.connect(DB_PATH)
         c = conn.cursor()
 
-        # جلب مجموع جميع الجرعات اليومية
-        c.execute('''SELECT SUM(daily_total_exposure)
-                     FROM employee_exposure_sessions
-                     WHERE employee_id = ?
-                     AND is_active = 0''',  # فقط الجلسات المغلقة
-                  (employee_id,))
-
-        result = c.fetchone()
+        # مجموع صفوف سجل الجرعات اليومية (الجلسات المغلقة فقط)
+        cumulative_dose = get_total_dose(c, employee_id)
         conn.close()
 
-        cumulative_dose = result[0] if result and result[0] else 0.0
         print(f"📊 الجرعة التراكمية للموظف {employee_id}: {cumulative_dose:.6f} μSv")
 
         return cumulative_dose
@@ -1191,6 +1259,50 @@ def get_employee_cumulative_dose(employee_id):
         print(f"❌ خطأ في حساب الجرعة التراكمية: {e}")
         return 0.0
 
+# حدود الجرعة (μSv) حسب الفئة
+DOSE_LIMITS = {
+    'worker': {'daily': 54.8, 'annual': 20000.0},
+    'pregnant': {'daily': 3.7, 'annual': 1000.0}
+}
+
+def dose_limit_status(is_pregnant, daily_dose, cumulative_dose):
+    """حالة الموظف مقابل الحدود: النسب المئوية والتحذيرات (بدون قاعدة بيانات - مشتركة بين الواجهة الفردية والجماعية)"""
+    # تحديد الحدود بناءً على حالة الحمل
+    limits = DOSE_LIMITS['pregnant' if is_pregnant else 'worker']
+    daily_limit = limits['daily']
+    annual_limit = limits['annual']
+
+    # حساب النسب المئوية
+    daily_percentage = (daily_dose / daily_limit) * 100 if daily_limit > 0 else 0
+    annual_percentage = (cumulative_dose / annual_limit) * 100 if annual_limit > 0 else 0
+
+    # تحديد حالة التحذير
+    warnings = []
+    if daily_percentage >= 100:
+        warnings.append(f"⚠️ تجاوز الحد اليومي: {daily_percentage:.1f}%")
+    elif daily_percentage >= 80:
+        warnings.append(f"⚠️ اقتراب من الحد اليومي: {daily_percentage:.1f}%")
+
+    if annual_percentage >= 100:
+        warnings.append(f"🚨 تجاوز الحد السنوي: {annual_percentage:.1f}%")
+    elif annual_percentage >= 80:
+        warnings.append(f"⚠️ اقتراب من الحد السنوي: {annual_percentage:.1f}%")
+
+    return {
+        "is_pregnant": is_pregnant,
+        "daily_percentage": round(daily_percentage, 2),
+        "annual_percentage": round(annual_percentage, 2),
+        "warnings": warnings,
+        "safe": len(warnings) == 0
+    }
+
+def evaluate_dose_limits(is_pregnant, daily_dose, cumulative_dose):
+    """مقارنة الجرعة اليومية والتراكمية بالحدود مع الحدود والجرعات نفسها في النتيجة"""
+    limits = DOSE_LIMITS['pregnant' if is_pregnant else 'worker']
+    return dict(dose_limit_status(is_pregnant, daily_dose, cumulative_dose),
+                daily_limit=limits['daily'], annual_limit=limits['annual'],
+                daily_dose=daily_dose, cumulative_dose=cumulative_dose)
+
 def check_dose_limits(employee_id, daily_dose, cumulative_dose):
     """التحقق من تجاوز الحدود اليومية والسنوية"""
     try:
@@ -1207,41 +1319,7 @@ def check_dose_limits(employee_id, daily_dose, cumulative_dose):
             gender, pregnant = employee_info
             is_pregnant = (gender == 'أنثى' and pregnant == 'نعم')
 
-        # تحديد الحدود بناءً على حالة الحمل
-        if is_pregnant:
-            daily_limit = 3.7      # μSv/يوم للحامل
-            annual_limit = 1000.0  # μSv/سنة للحامل
-        else:
-            daily_limit = 54.8     # μSv/يوم للعاملين
-            annual_limit = 20000.0 # μSv/سنة للعاملين
-
-        # حساب النسب المئوية
-        daily_percentage = (daily_dose / daily_limit) * 100 if daily_limit > 0 else 0
-        annual_percentage = (cumulative_dose / annual_limit) * 100 if annual_limit > 0 else 0
-
-        # تحديد حالة التحذير
-        warnings = []
-        if daily_percentage >= 100:
-            warnings.append(f"⚠️ تجاوز الحد اليومي: {daily_percentage:.1f}%")
-        elif daily_percentage >= 80:
-            warnings.append(f"⚠️ اقتراب من الحد اليومي: {daily_percentage:.1f}%")
-
-        if annual_percentage >= 100:
-            warnings.append(f"🚨 تجاوز الحد السنوي: {annual_percentage:.1f}%")
-        elif annual_percentage >= 80:
-            warnings.append(f"⚠️ اقتراب من الحد السنوي: {annual_percentage:.1f}%")
-
-        return {
-            "is_pregnant": is_pregnant,
-            "daily_limit": daily_limit,
-            "annual_limit": annual_limit,
-            "daily_dose": daily_dose,
-            "cumulative_dose": cumulative_dose,
-            "daily_percentage": round(daily_percentage, 2),
-            "annual_percentage": round(annual_percentage, 2),
-            "warnings": warnings,
-            "safe": len(warnings) == 0
-        }
+        return evaluate_dose_limits(is_pregnant, daily_dose, cumulative_dose)
 
     except Exception as e:
         print(f"❌ خطأ في التحقق من الحدود: {e}")
@@ -1299,6 +1377,81 @@ def get_employee_dose_summary(employee_id):
         print(f"❌ خطأ في جلب ملخص الجرعات: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# أقصى عدد موظفين في طلب ملخص جماعي واحد
+MAX_BULK_EMPLOYEES = 5000
+
+def fetch_dose_summary_rows(cursor, employee_ids=None, department=None):
+    """
+    الموظفون المطلوبون مع الجرعة اليومية والتراكمية باستعلام واحد مرتب بالاسم في SQL
+
+    Returns:
+        list: صفوف (employee_id, name, department, is_pregnant, daily, cumulative)
+    """
+    try:
+        cursor.execute("SELECT gender, pregnant FROM employees LIMIT 0")
+        pregnancy_sql = "(e.gender = 'أنثى' AND e.pregnant = 'نعم')"
+    except sqlite3.OperationalError:
+        pregnancy_sql = "0"  # عمود pregnant يُضاف عند أول إضافة موظف عبر /api/add_employee
+
+    return fetch_dose_summaries(cursor, employee_ids, department,
+                                columns=('e.name', 'e.department', pregnancy_sql))
+
+@app.route('/api/dose_summaries', methods=['GET', 'POST'])
+@cached_response('sessions', 'employees')
+def get_bulk_dose_summaries():
+    """ملخص الجرعات اليومية والتراكمية لمجموعة موظفين في طلب واحد
+
+    نفس حسابات /api/employee_dose_summary/<id> (سجل الجرعات اليومية + check_dose_limits)
+    لكن بعدد ثابت من الاستعلامات المجمّعة بدلاً من عدة اتصالات لكل موظف.
+    المدخلات: employee_ids (قائمة JSON في POST أو نص مفصول بفواصل في GET) أو department
+    """
+    try:
+        payload = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+        employee_ids = payload.get('employee_ids', request.args.get('employee_ids'))
+        department = payload.get('department', request.args.get('department', ''))
+
+        if isinstance(employee_ids, str):
+            employee_ids = [e.strip() for e in employee_ids.split(',') if e.strip()]
+        if employee_ids is not None:
+            if not isinstance(employee_ids, list):
+                return jsonify({'success': False, 'error': 'employee_ids يجب أن تكون قائمة'}), 400
+            employee_ids = list(dict.fromkeys(str(e) for e in employee_ids))
+            if len(employee_ids) > MAX_BULK_EMPLOYEES:
+                return jsonify({'success': False,
+                                'error': f'الحد الأقصى {MAX_BULK_EMPLOYEES} موظف في الطلب الواحد'}), 400
+        if not employee_ids and not department:
+            return jsonify({'success': False, 'error': 'يجب تحديد employee_ids أو department'}), 400
+
+        conn = sqlite3.connect(DB_PATH)
+        c = conn.cursor()
+        rows = fetch_dose_summary_rows(c, employee_ids or None, department)
+        conn.close()
+
+        # الحدود نفسها مرة واحدة في 'limits' أعلى الاستجابة بدلاً من تكرارها لكل موظف
+        summaries = [{
+            'employee_id': employee_id,
+            'name': name,
+            'department': employee_department,
+            'daily_dose': round(daily_dose, 6),
+            'cumulative_dose': round(cumulative_dose, 6),
+            'status': dose_limit_status(bool(is_pregnant), daily_dose, cumulative_dose)
+        } for employee_id, name, employee_department, is_pregnant, daily_dose, cumulative_dose in rows]
+
+        found_ids = {row[0] for row in rows}
+        return jsonify({
+            'success': True,
+            'date': str(datetime.now().date()),
+            'total_employees': len(summaries),
+            'employees_with_warnings': sum(1 for s in summaries if not s['status']['safe']),
+            'limits': DOSE_LIMITS,
+            'not_found': [e for e in (employee_ids or []) if e not in found_ids] if employee_ids else [],
+            'summaries': summaries
+        })
+
+    except Exception as e:
+        print(f"❌ خطأ في جلب ملخص الجرعات الجماعي: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/employee_exposure_history/<employee_id>', methods=['GET'])
 def get_employee_exposure_history(employee_id):
     """الحصول على تاريخ التعرض للموظف مع الجرعات اليومية"""
@@ -1368,6 +1521,7 @@ def get_employee_exposure_history(employee_id):
 # ===================================
 
 @app.route('/data', methods=['POST'])
+@no_compress
 def receive_radiation_data():
     """استقبال بيانات الإشعاع من ESP32 وحفظها فوراً في الذاكرة"""
     try:
@@ -1412,6 +1566,9 @@ def receive_radiation_data():
         )
 
         print("✅ تم حفظ البيانات في الذاكرة المؤقتة")
+
+        # نشر القراءة لبقية العمال (واجهات العرض تقرأ آخر قراءة من SQLite)
+        latest_reading_store.publish(reading)
         print("🔄 سيتم حفظ البيانات في قاعدة البيانات في الخلفية")
 
         # إرجاع استجابة فورية
@@ -1588,6 +1745,7 @@ def add_radiation_employee():
         
         conn.commit()
         conn.close()
+        bump_generation('employees')
         
         return jsonify({
             'success': True,
@@ -1804,6 +1962,7 @@ def end_radiation_exposure_session():
         return jsonify({'success': False, 'error': f'خطأ في إنهاء الجلسة: {str(e)}'}), 500
 
 @app.route('/api/radiation_reading', methods=['POST'])
+@no_compress
 def receive_radiation_reading():
     """استقبال قراءة إشعاع من جهاز Arduino أو مصادر أخرى - موحّد على attendance.db"""
     try:
@@ -2143,6 +2302,7 @@ def api_add_employee():
                     VALUES (?, ?, ?, ?, ?, ?)''', (employee_id, name, image_path, job_title, gender, pregnant))
         conn.commit()
         conn.close()
+        bump_generation('employees')
 
         # إعادة تحميل الوجوه المعروفة
         global known_face_encodings, known_face_names
@@ -2513,6 +2673,7 @@ def register_attendance():
 
 
 @app.route('/api/exposure_statistics', methods=['GET'])
+@cached_response('sessions', 'employees')
 def get_exposure_statistics():
     """الحصول على إحصائيات التعرض"""
     try:
@@ -2590,6 +2751,31 @@ if __name__ == '__main__':
     # تحديث التخزين المؤقت من البيانات المحلية عند بدء التشغيل
     update_cache_from_local_db()
 
+# المعايير الدولية للعاملين في المجال الإشعاعي (μSv/h)
+# بناءً على معايير ICRP و UNSCEAR و IAEA
+# تم تعديل الحدود حسب متطلبات المشروع
+NATURAL_BACKGROUND = 0.3      # الخلفية الطبيعية القصوى - آمن (UNSCEAR: 0.06-0.3 μSv/h)
+WARNING_LEVEL = 2.38          # مستوى تحذير - يتطلب مراقبة
+DANGER_LEVEL = 2.38           # مستوى خطر - أي قيمة >= 2.38 تعتبر خطيرة
+
+# الحدود القديمة (للمرجع فقط - غير مستخدمة)
+# WORKER_SAFE_LEVEL = 2.0       # مستوى آمن للعاملين (أقل من الحد القانوني)
+# WORKER_LIMIT_HOURLY = 6.8     # الحد القانوني للعاملين (54.8 μSv/يوم ÷ 8 ساعات)
+# ELEVATED_LEVEL = 15.0         # مستوى مرتفع يتطلب مراقبة مشددة
+# EMERGENCY_LEVEL = 100.0       # مستوى طوارئ - خطر شديد
+
+# المعايير اليومية للعاملين (μSv/يوم)
+# بناءً على ICRP: 20 mSv/سنة للعاملين
+WORKER_DAILY_LIMIT = 54.8     # الحد اليومي للعاملين (20 mSv/سنة ÷ 365 يوم)
+WORKER_WEEKLY_LIMIT = 383.6   # الحد الأسبوعي للعاملين (54.8 × 7)
+WORKER_ANNUAL_LIMIT = 20000.0 # الحد السنوي للعاملين (20 mSv)
+
+# المعايير الخاصة بالنساء الحوامل (ICRP Publication 103)
+# الحد الأقصى للجنين: 1 mSv خلال فترة الحمل المتبقية
+PREGNANT_TOTAL_LIMIT = 1000.0    # 1 mSv = 1000 μSv للجنين خلال الحمل
+PREGNANT_DAILY_LIMIT = 3.7       # تقريباً 1000 μSv ÷ 270 يوم (9 أشهر)
+PREGNANT_WARNING_LEVEL = 2.38    # نفس حد التحذير للعاملين العاديين
+
 def classify_radiation_safety(dose_rate_per_hour, total_dose, session_duration_minutes, employee_id=None):
     """
     تصنيف مستوى الأمان الإشعاعي بناءً على المعايير الدولية
@@ -2623,31 +2809,6 @@ def classify_radiation_safety(dose_rate_per_hour, total_dose, session_duration_m
         except Exception:
             pass  # في حالة عدم وجود الموظف أو خطأ في قاعدة البيانات
 
-    # المعايير الدولية للعاملين في المجال الإشعاعي (μSv/h)
-    # بناءً على معايير ICRP و UNSCEAR و IAEA
-    # تم تعديل الحدود حسب متطلبات المشروع
-    NATURAL_BACKGROUND = 0.3      # الخلفية الطبيعية القصوى - آمن (UNSCEAR: 0.06-0.3 μSv/h)
-    WARNING_LEVEL = 2.38          # مستوى تحذير - يتطلب مراقبة
-    DANGER_LEVEL = 2.38           # مستوى خطر - أي قيمة >= 2.38 تعتبر خطيرة
-
-    # الحدود القديمة (للمرجع فقط - غير مستخدمة)
-    # WORKER_SAFE_LEVEL = 2.0       # مستوى آمن للعاملين (أقل من الحد القانوني)
-    # WORKER_LIMIT_HOURLY = 6.8     # الحد القانوني للعاملين (54.8 μSv/يوم ÷ 8 ساعات)
-    # ELEVATED_LEVEL = 15.0         # مستوى مرتفع يتطلب مراقبة مشددة
-    # EMERGENCY_LEVEL = 100.0       # مستوى طوارئ - خطر شديد
-
-    # المعايير اليومية للعاملين (μSv/يوم)
-    # بناءً على ICRP: 20 mSv/سنة للعاملين
-    WORKER_DAILY_LIMIT = 54.8     # الحد اليومي للعاملين (20 mSv/سنة ÷ 365 يوم)
-    WORKER_WEEKLY_LIMIT = 383.6   # الحد الأسبوعي للعاملين (54.8 × 7)
-    WORKER_ANNUAL_LIMIT = 20000.0 # الحد السنوي للعاملين (20 mSv)
-
-    # المعايير الخاصة بالنساء الحوامل (ICRP Publication 103)
-    # الحد الأقصى للجنين: 1 mSv خلال فترة الحمل المتبقية
-    PREGNANT_TOTAL_LIMIT = 1000.0    # 1 mSv = 1000 μSv للجنين خلال الحمل
-    PREGNANT_DAILY_LIMIT = 3.7       # تقريباً 1000 μSv ÷ 270 يوم (9 أشهر)
-    PREGNANT_WARNING_LEVEL = 2.38    # نفس حد التحذير للعاملين العاديين
-
     # تحديد مستوى الخطر بناءً على حالة الحمل
     if is_pregnant:
         # معايير خاصة للنساء الحوامل - نفس النظام المبسط
@@ -2734,14 +2895,108 @@ def classify_radiation_safety(dose_rate_per_hour, total_dose, session_duration_m
 
     return safety_status, safety_percentage, risk_level, is_pregnant
 
+def fetch_pregnancy_map(cursor):
+    """
+    جلب حالة الحمل لجميع الموظفين باستعلام واحد
+
+    Returns:
+        dict: {employee_id: True/False}
+    """
+    try:
+        cursor.execute("SELECT employee_id, pregnant FROM employees")
+    except sqlite3.OperationalError:
+        return {}  # عمود pregnant يُضاف عند أول إضافة موظف عبر /api/add_employee
+    return {row[0]: row[1] == 'نعم' for row in cursor.fetchall()}
+
+def classify_radiation_safety_batch(dose_rates, total_doses, durations_minutes, employee_ids=None, pregnancy_map=None):
+    """
+    تصنيف مستوى الأمان الإشعاعي لمجموعة جلسات دفعة واحدة (نسخة متجهة من classify_radiation_safety)
+
+    تطبق نفس الحدود والقواعد على مصفوفات NumPy بدلاً من حلقة Python،
+    وتستخدم خريطة حمل مُحمّلة مسبقاً بدلاً من استعلام لكل صف.
+
+    Args:
+        dose_rates: معدلات التعرض بالساعة (μSv/h)
+        total_doses: إجمالي التعرض لكل جلسة (μSv)
+        durations_minutes: مدد الجلسات بالدقائق
+        employee_ids: أرقام الموظفين (بنفس ترتيب المصفوفات)
+        pregnancy_map: قاموس {employee_id: bool} من fetch_pregnancy_map
+
+    Returns:
+        tuple: (safety_statuses, safety_percentages, risk_levels, is_pregnant) كقوائم
+    """
+    rate = np.nan_to_num(np.asarray(dose_rates, dtype='float64'))
+    total = np.nan_to_num(np.asarray(total_doses, dtype='float64'))
+    count = rate.shape[0]
+
+    if employee_ids is not None and pregnancy_map:
+        pregnant = np.fromiter((bool(pregnancy_map.get(emp_id, False)) for emp_id in employee_ids),
+                               dtype=bool, count=count)
+    else:
+        pregnant = np.zeros(count, dtype=bool)
+
+    # المرحلة الأولى: التصنيف حسب معدل الجرعة (نفس الحدود للحوامل مع تسميات مختلفة)
+    is_safe = rate <= NATURAL_BACKGROUND
+    is_warning = ~is_safe & (rate < WARNING_LEVEL)
+    warning_level = np.where(pregnant, PREGNANT_WARNING_LEVEL, WARNING_LEVEL)
+
+    percentage = np.select(
+        [is_safe, is_warning],
+        [100.0, np.round(100 - ((rate - NATURAL_BACKGROUND) / (warning_level - NATURAL_BACKGROUND) * 50), 1)],
+        np.maximum(0, np.round(50 - ((rate - np.where(pregnant, PREGNANT_WARNING_LEVEL, DANGER_LEVEL))
+                                     / np.where(pregnant, PREGNANT_WARNING_LEVEL, DANGER_LEVEL) * 50), 1))
+    )
+    status = np.select(
+        [is_safe & pregnant, is_safe, is_warning & pregnant, is_warning, pregnant],
+        ["آمن - حامل", "آمن", "تحذير - حامل", "تحذير", "خطر - حامل"],
+        "خطر"
+    ).astype(object)
+    risk = np.select([is_safe, is_warning], ["منخفض جداً", "متوسط"], "عالي").astype(object)
+
+    # المرحلة الثانية: فحص الجرعة الإجمالية (التعديلات اللاحقة تطبق فقط على الحالات الآمنة)
+    # كل قاعدة: (الشرط، الحالة، مستوى الخطر، سقف النسبة)، بترتيب سلسلة elif في النسخة الفردية
+    daily_limit = np.where(pregnant, PREGNANT_DAILY_LIMIT, WORKER_DAILY_LIMIT)
+    exceeded = total > daily_limit
+    rules = [
+        (exceeded, np.where(pregnant, "خطر - تجاوز الحد اليومي للحامل", "خطر - تجاوز الحد اليومي للعاملين"),
+         "حرج", 0.0),
+        (pregnant & ~exceeded & (total > PREGNANT_DAILY_LIMIT * 0.8) & is_safe,
+         "تحذير - اقتراب من الحد اليومي للحامل", "عالي", 20.0),
+        (pregnant & (total <= PREGNANT_DAILY_LIMIT * 0.8) & (total > PREGNANT_DAILY_LIMIT * 0.5) & is_safe,
+         "مراقبة - نصف الحد اليومي للحامل", "متوسط", 50.0),
+        (~pregnant & ~exceeded & (total > WORKER_DAILY_LIMIT * 0.9) & is_safe,
+         "تحذير - اقتراب من الحد اليومي", "عالي", 15.0),
+        (~pregnant & (total <= WORKER_DAILY_LIMIT * 0.9) & (total > WORKER_DAILY_LIMIT * 0.75) & is_safe,
+         "مراقبة - ثلاثة أرباع الحد اليومي", "متوسط", 35.0),
+        (~pregnant & (total <= WORKER_DAILY_LIMIT * 0.75) & (total > WORKER_DAILY_LIMIT * 0.5) & is_safe,
+         "مراقبة - نصف الحد اليومي", "منخفض-متوسط", 65.0),
+    ]
+    for condition, rule_status, rule_risk, cap in rules:
+        status = np.where(condition, rule_status, status).astype(object)
+        risk = np.where(condition, rule_risk, risk).astype(object)
+        percentage = np.where(condition, np.minimum(percentage, cap), percentage)
+
+    return status.tolist(), percentage.tolist(), risk.tolist(), pregnant.tolist()
+
 @app.route('/api/exposure_reports', methods=['GET'])
+@cached_response('sessions', 'employees')
 def get_exposure_reports():
-    """API لجلب تقارير التعرض الفعلية من قاعدة البيانات"""
+    """API لجلب تقارير التعرض الفعلية من قاعدة البيانات
+
+    ترقيم بالمؤشر: limit (افتراضي 100، بحد أقصى 500) و cursor من next_cursor للصفحة السابقة
+    """
     try:
         employee_id = request.args.get('employee_id', '')
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
 
+        try:
+            page_size = parse_page_size(request.args.get('limit'))
+            position = decode_cursor(request.args.get('cursor', '')).get('e')
+            date_sql, date_params = date_range_condition('ses.check_in_time', date_from, date_to)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
         conn = sqlite3.connect('attendance.db')
         c = conn.cursor()
 
@@ -2750,7 +3005,8 @@ def get_exposure_reports():
                    ses.check_in_time, ses.check_out_time,
                    ses.exposure_duration_minutes, ses.total_exposure,
                    ses.average_dose_rate, ses.max_dose_rate, ses.min_dose_rate,
-                   ses.initial_total_dose, ses.final_total_dose, ses.safety_alerts, ses.notes
+                   ses.initial_total_dose, ses.final_total_dose, ses.safety_alerts, ses.notes,
+                   ses.id
             FROM employee_exposure_sessions ses
             LEFT JOIN employees e ON ses.employee_id = e.employee_id
             WHERE 1=1
@@ -2761,19 +3017,13 @@ def get_exposure_reports():
             query += ' AND ses.employee_id = ?'
             params.append(employee_id)
 
-        if date_from:
-            query += ' AND DATE(ses.check_in_time) >= ?'
-            params.append(date_from)
+        query += date_sql
+        params.extend(date_params)
 
-        if date_to:
-            query += ' AND DATE(ses.check_in_time) <= ?'
-            params.append(date_to)
-
-        query += ' ORDER BY ses.check_in_time DESC'
-
-        c.execute(query, params)
+        rows, next_position = fetch_page(c, query, params, 'ses.check_in_time', 'ses.id',
+                                         position, page_size, key=lambda row: (row[2], row[13]))
         reports = []
-        for row in c.fetchall():
+        for row in rows:
             reports.append({
                 'employee_id': row[0],
                 'employee_name': row[1],
@@ -2795,6 +3045,9 @@ def get_exposure_reports():
             'success': True,
             'reports': reports,
             'count': len(reports),
+            'page_size': page_size,
+            'has_more': next_position is not None,
+            'next_cursor': encode_cursor({'e': next_position}) if next_position else None,
             'filters': {
                 'employee_id': employee_id,
                 'date_from': date_from,
@@ -2844,6 +3097,100 @@ def get_raw_radiation_data():
             'error': str(e)
         }), 500
 
+# النطاق الافتراضي لاستعلام الحساس بدون from
+DEFAULT_QUERY_RANGE_SECONDS = 24 * 3600
+
+def session_time_range(cursor, session_id):
+    """بداية ونهاية الجلسة (ثوانٍ منذ 1970) - النهاية الآن إذا لم تُغلق، أو None إذا لم توجد الجلسة"""
+    cursor.execute('SELECT check_in_time, check_out_time FROM employee_exposure_sessions WHERE id = ?',
+                   (session_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    check_in_time, check_out_time = row
+    start = time_calculator.normalize_datetime(check_in_time).timestamp() if check_in_time else time.time()
+    end = time_calculator.normalize_datetime(check_out_time).timestamp() if check_out_time else time.time()
+    return int(start), int(end) + 1
+
+@app.route('/api/readings/query', methods=['GET'])
+def query_readings():
+    """قراءات مجمّعة لكل فترة زمنية (متوسط/أقصى/أدنى...) لحساس أو جلسة
+
+    المعاملات:
+    - session_id أو sensor_id (الافتراضي: الحساس الرئيسي)
+    - from / to: ثوانٍ منذ 1970 أو نص ISO (الافتراضي للحساس: آخر 24 ساعة، وللجلسة: كامل الجلسة)
+    - bucket: طول الفترة (300 أو 5m أو 1h أو 1d - الافتراضي 5m)
+    - agg: دوال التجميع مفصولة بفواصل من avg,min,max,sum,count (الافتراضي avg,max,min)
+    - field: absorbed_dose_rate (افتراضي) أو cpm أو source_power
+    النتيجة أعمدة متوازية: columns.t (بداية الفترة بالثواني) و columns.count ثم عمود لكل دالة
+    """
+    try:
+        session_id = request.args.get('session_id', type=int)
+        sensor_id = request.args.get('sensor_id', '')
+        if session_id is not None and sensor_id:
+            return jsonify({'success': False, 'error': 'حدد session_id أو sensor_id وليس كليهما'}), 400
+        if 'session_id' in request.args and session_id is None:
+            return jsonify({'success': False, 'error': 'قيمة session_id غير صالحة'}), 400
+        if sensor_id and sensor_id != DEFAULT_SENSOR_ID:
+            # القراءات المحفوظة لا تحمل معرف حساس - كلها من الحساس الرئيسي
+            return jsonify({'success': False, 'error': f'حساس غير معروف: {sensor_id}'}), 404
+
+        field = request.args.get('field', 'absorbed_dose_rate')
+        if field not in SERIES_FIELDS:
+            return jsonify({'success': False,
+                            'error': f"field يجب أن يكون: {', '.join(SERIES_FIELDS)}"}), 400
+        try:
+            bucket_seconds = parse_bucket(request.args.get('bucket'))
+            aggregates = parse_aggregates(request.args.get('agg'))
+            start = parse_time(request.args.get('from'))
+            end = parse_time(request.args.get('to'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        if session_id is None:
+            end = end if end is not None else int(time.time())
+            start = start if start is not None else end - DEFAULT_QUERY_RANGE_SECONDS
+        if start is not None and end is not None and end <= start:
+            return jsonify({'success': False, 'error': 'يجب أن يكون to بعد from'}), 400
+
+        conn = sqlite3.connect('attendance.db')
+        c = conn.cursor()
+
+        # الجلسة بدون from/to: الحد يُطبق على مدتها الفعلية (الدخول حتى الخروج أو الآن)
+        # والقراءات تبقى مقيدة بـ session_id فقط
+        range_start, range_end = start, end
+        if session_id is not None and (start is None or end is None):
+            session_range = session_time_range(c, session_id)
+            if session_range is None:
+                conn.close()
+                return jsonify({'success': False, 'error': f'جلسة غير موجودة: {session_id}'}), 404
+            range_start = start if start is not None else session_range[0]
+            range_end = end if end is not None else session_range[1]
+        if (range_end - range_start) / bucket_seconds > MAX_BUCKETS:
+            conn.close()
+            return jsonify({'success': False,
+                            'error': f'عدد الفترات أكبر من {MAX_BUCKETS} - استخدم bucket أكبر'}), 400
+
+        columns = fetch_buckets(c, field, aggregates, bucket_seconds, start or 0,
+                                session_id=session_id, start=start, end=end)
+        conn.close()
+
+        return jsonify({
+            'success': True,
+            'scope': {'session_id': session_id} if session_id is not None else {'sensor_id': DEFAULT_SENSOR_ID},
+            'field': field,
+            'bucket_seconds': bucket_seconds,
+            'from': start,
+            'to': end,
+            'aggregates': ['count'] + aggregates,
+            'buckets': len(columns['t']),
+            'columns': columns
+        })
+
+    except Exception as e:
+        print(f"❌ خطأ في استعلام القراءات المجمّعة: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/force_start_session/<employee_id>', methods=['POST'])
 def force_start_session(employee_id):
     """إنشاء جلسة تعرض نشطة يدوياً لأغراض التشخيص"""
@@ -2863,11 +3210,12 @@ def force_end_session(employee_id):
         return jsonify({"success": False, "error": str(e)})
 
 @app.route('/api/current_radiation', methods=['GET'])
+@no_compress
 def get_current_radiation():
-    """الحصول على البيانات الحالية من التخزين المؤقت"""
+    """الحصول على البيانات الحالية (آخر قراءة حية مشتركة بين العمال)"""
     try:
         if radiation_cache and hasattr(radiation_cache, 'get_latest_reading'):
-            latest_reading = radiation_cache.get_latest_reading()
+            latest_reading = get_live_reading()
             if latest_reading:
                 return jsonify({
                     "success": True,
@@ -2918,123 +3266,173 @@ def debug_status():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
-@app.route('/api/unified_reports', methods=['GET'])
-def get_unified_reports():
-    """API موحد لجلب بيانات الحضور والتعرض معاً"""
-    try:
-        employee_id = request.args.get('employee_id', '')
-        date_from = request.args.get('date_from', '')
-        date_to = request.args.get('date_to', '')
-
-        conn = sqlite3.connect('attendance.db')
-        c = conn.cursor()
-
-        # بناء الاستعلام للحضور
-        attendance_query = '''
-            SELECT a.employee_id, a.name, a.check_type, a.timestamp, a.date, a.time,
-                   e.job_title
-            FROM attendance a
-            LEFT JOIN employees e ON a.employee_id = e.employee_id
-            WHERE a.employee_id IS NOT NULL
-        '''
-        attendance_params = []
-
-        if employee_id:
-            attendance_query += ' AND a.employee_id = ?'
-            attendance_params.append(employee_id)
-
-        if date_from:
-            attendance_query += ' AND a.date >= ?'
-            attendance_params.append(date_from)
-
-        if date_to:
-            attendance_query += ' AND a.date <= ?'
-            attendance_params.append(date_to)
-
-        attendance_query += ' ORDER BY a.timestamp DESC'
-
-        # تنفيذ استعلام الحضور
-        c.execute(attendance_query, attendance_params)
-        attendance_records = []
-        for row in c.fetchall():
-            attendance_records.append({
-                'employee_id': row[0],
-                'name': row[1],
-                'check_type': row[2],
-                'timestamp': row[3],
-                'date': row[4],
-                'time': row[5],
-                'job_title': row[6] if row[6] else ''
-            })
-
-        # جلب بيانات التعرض الفعلية بدلاً من المحاكاة
-        exposure_records = []
-        exposure_query = '''
-            SELECT ses.employee_id, e.name AS employee_name,
-                   ses.check_in_time, ses.check_out_time,
-                   ses.exposure_duration_minutes, ses.total_exposure,
-                   ses.average_dose_rate, ses.max_dose_rate, ses.min_dose_rate,
-                   ses.initial_total_dose, ses.final_total_dose, ses.safety_alerts, ses.notes
-            FROM employee_exposure_sessions ses
-            LEFT JOIN employees e ON ses.employee_id = e.employee_id
-            WHERE 1=1
-        '''
-        exposure_params = []
+# استعلامات التقارير الموحدة (مشتركة بين /api/unified_reports و /api/export)
+ATTENDANCE_REPORT_QUERY = '''
+    SELECT a.employee_id, a.name, a.check_type, a.timestamp, a.date, a.time,
+           e.job_title, a.id
+    FROM attendance a
+    LEFT JOIN employees e ON a.employee_id = e.employee_id
+'''
+
+EXPOSURE_REPORT_QUERY = '''
+    SELECT ses.employee_id, e.name AS employee_name,
+           ses.check_in_time, ses.check_out_time,
+           ses.exposure_duration_minutes, ses.total_exposure,
+           ses.average_dose_rate, ses.max_dose_rate, ses.min_dose_rate,
+           ses.initial_total_dose, ses.final_total_dose, ses.safety_alerts, ses.notes,
+           ses.id
+    FROM employee_exposure_sessions ses
+    LEFT JOIN employees e ON ses.employee_id = e.employee_id
+'''
+
+def build_report_filters(employee_id='', date_from='', date_to=''):
+    """
+    شروط WHERE ومعاملاتها لاستعلامي الحضور والتعرض (ترفع ValueError لتاريخ غير صالح)
 
-        if employee_id:
-            exposure_query += ' AND ses.employee_id = ?'
-            exposure_params.append(employee_id)
+    التاريخ المحلي هو بداية نص timestamp - شرط قابل للفهرسة
+    :return: ((attendance_where, attendance_params), (exposure_where, exposure_params))
+    """
+    attendance_where = ' WHERE a.employee_id IS NOT NULL'
+    attendance_params = []
+    exposure_where = ' WHERE 1=1'
+    exposure_params = []
 
-        if date_from:
-            exposure_query += ' AND DATE(ses.check_in_time) >= ?'
-            exposure_params.append(date_from)
+    if employee_id:
+        attendance_where += ' AND a.employee_id = ?'
+        attendance_params.append(employee_id)
+        exposure_where += ' AND ses.employee_id = ?'
+        exposure_params.append(employee_id)
+
+    attendance_dates = date_range_condition('a.timestamp', date_from, date_to)
+    exposure_dates = date_range_condition('ses.check_in_time', date_from, date_to)
+    attendance_where += attendance_dates[0]
+    attendance_params.extend(attendance_dates[1])
+    exposure_where += exposure_dates[0]
+    exposure_params.extend(exposure_dates[1])
+
+    return (attendance_where, attendance_params), (exposure_where, exposure_params)
+
+def format_attendance_record(row):
+    """تحويل صف من ATTENDANCE_REPORT_QUERY إلى قاموس"""
+    return {
+        'employee_id': row[0],
+        'name': row[1],
+        'check_type': row[2],
+        'timestamp': row[3],
+        'date': row[4],
+        'time': row[5],
+        'job_title': row[6] if row[6] else ''
+    }
 
-        if date_to:
-            exposure_query += ' AND DATE(ses.check_in_time) <= ?'
-            exposure_params.append(date_to)
+def format_exposure_records(rows, pregnancy_map=None):
+    """
+    تحويل صفوف EXPOSURE_REPORT_QUERY إلى قواميس مع تصنيف مستوى الأمان
 
-        exposure_query += ' ORDER BY ses.check_in_time DESC'
+    التصنيف لجميع الصفوف دفعة واحدة (خريطة حمل واحدة بدلاً من استعلام لكل صف)
+    """
+    if not rows:
+        return []
+
+    safety_statuses, safety_percentages, risk_levels, _ = classify_radiation_safety_batch(
+        [row[6] if row[6] else 0.0 for row in rows], # average_dose_rate
+        [row[5] if row[5] else 0.0 for row in rows], # total_exposure
+        [row[4] if row[4] else 0 for row in rows],   # exposure_duration_minutes
+        [row[0] for row in rows],                    # employee_id
+        pregnancy_map
+    )
+
+    records = []
+    for row, safety_status, safety_percentage, risk_level in zip(
+            rows, safety_statuses, safety_percentages, risk_levels):
+        records.append({
+            'employee_id': row[0],
+            'name': row[1],
+            'check_in_time': row[2],
+            'check_out_time': row[3],
+            'exposure_duration_minutes': row[4] if row[4] is not None else None,
+            'total_exposure': round(row[5] if row[5] else 0.0, 5),
+            'average_dose_rate': round(row[6] if row[6] else 0.0, 5),
+            'max_dose_rate': round(row[7] if row[7] else 0.0, 5),
+            'min_dose_rate': round(row[8] if row[8] else 0.0, 5),
+            'initial_total_dose': round(row[9] if row[9] else 0.0, 5),
+            'final_total_dose': round(row[10] if row[10] else 0.0, 5),
+            'safety_alerts': row[11],
+            'notes': row[12],
+            'safety_status': safety_status,
+            'safety_percentage': safety_percentage,
+            'risk_level': risk_level,
+            'daily_limit_percentage': round(((row[5] if row[5] else 0.0) / 55.0) * 100, 1),
+            'annual_projection': round((row[5] if row[5] else 0.0) * 365, 1),
+            # توافق مع تسميات الواجهة الحالية (aliases)
+            'total_dose': round(row[5] if row[5] else 0.0, 5),
+            'avg_dose_rate': round(row[6] if row[6] else 0.0, 5),
+            'dose_rate': round(row[6] if row[6] else 0.0, 5),
+            'session_duration': row[4] if row[4] is not None else None,
+            'date': (row[2] or '')[:10] if row[2] else None,
+            'start_time': (row[2] or '')[11:16] if row[2] else None
+        })
+    return records
 
-        c.execute(exposure_query, exposure_params)
-        for row in c.fetchall():
-            # تصنيف مستوى الأمان
-            safety_status, safety_percentage, risk_level, is_pregnant = classify_radiation_safety(
-                row[6] if row[6] else 0.0, # average_dose_rate
-                row[5] if row[5] else 0.0, # total_exposure
-                row[4] if row[4] else 0,   # exposure_duration_minutes
-                row[1]                     # employee_id
-            )
+def build_unified_reports_payload(c, employee_id='', date_from='', date_to='', limit=None, cursor_token=''):
+    """
+    صفحة من التقارير الموحدة (حضور + تعرض) باستخدام مؤشر قاعدة بيانات مفتوح
 
-            exposure_records.append({
-                'employee_id': row[0],
-                'name': row[1],
-                'check_in_time': row[2],
-                'check_out_time': row[3],
-                'exposure_duration_minutes': row[4] if row[4] is not None else None,
-                'total_exposure': round(row[5] if row[5] else 0.0, 5),
-                'average_dose_rate': round(row[6] if row[6] else 0.0, 5),
-                'max_dose_rate': round(row[7] if row[7] else 0.0, 5),
-                'min_dose_rate': round(row[8] if row[8] else 0.0, 5),
-                'initial_total_dose': round(row[9] if row[9] else 0.0, 5),
-                'final_total_dose': round(row[10] if row[10] else 0.0, 5),
-                'safety_alerts': row[11],
-                'notes': row[12],
-                'safety_status': safety_status,
-                'safety_percentage': safety_percentage,
-                'risk_level': risk_level,
-                'daily_limit_percentage': round(((row[5] if row[5] else 0.0) / 55.0) * 100, 1),
-                'annual_projection': round((row[5] if row[5] else 0.0) * 365, 1),
-                # توافق مع تسميات الواجهة الحالية (aliases)
-                'total_dose': round(row[5] if row[5] else 0.0, 5),
-                'avg_dose_rate': round(row[6] if row[6] else 0.0, 5),
-                'dose_rate': round(row[6] if row[6] else 0.0, 5),
-                'session_duration': row[4] if row[4] is not None else None,
-                'date': (row[2] or '')[:10] if row[2] else None,
-                'start_time': (row[2] or '')[11:16] if row[2] else None
-            })
+    مشتركة بين /api/unified_reports و /api/dashboard_bundle
+    يرفع ValueError لقيم الفلاتر أو المؤشر غير الصالحة
+    """
+    page_size = parse_page_size(limit)
+    state = decode_cursor(cursor_token)
+    attendance_filter, exposure_filter = build_report_filters(employee_id, date_from, date_to)
+    first_page = not cursor_token
+
+    attendance_where, attendance_params = attendance_filter
+    exposure_where, exposure_params = exposure_filter
+
+    # تنفيذ استعلام الحضور (False في المؤشر = انتهت هذه القائمة)
+    attendance_records = []
+    attendance_next = None
+    if state.get('a') is not False:
+        attendance_rows, attendance_next = fetch_page(
+            c, ATTENDANCE_REPORT_QUERY + attendance_where, attendance_params, 'a.timestamp', 'a.id',
+            state.get('a'), page_size, key=lambda row: (row[3], row[7]))
+        attendance_records = [format_attendance_record(row) for row in attendance_rows]
+
+    # جلب بيانات التعرض الفعلية بدلاً من المحاكاة
+    exposure_rows, exposure_next = [], None
+    if state.get('e') is not False:
+        exposure_rows, exposure_next = fetch_page(
+            c, EXPOSURE_REPORT_QUERY + exposure_where, exposure_params, 'ses.check_in_time', 'ses.id',
+            state.get('e'), page_size, key=lambda row: (row[2], row[13]))
+
+    exposure_records = format_exposure_records(
+        exposure_rows, fetch_pregnancy_map(c) if exposure_rows else None)
+
+    has_more = attendance_next is not None or exposure_next is not None
+    payload = {
+        'attendance_records': attendance_records,
+        'exposure_records': exposure_records, # Fixed: JavaScript expects exposure_records
+        'page_size': page_size,
+        'has_more': has_more,
+        'next_cursor': encode_cursor({'a': attendance_next or False,
+                                      'e': exposure_next or False}) if has_more else None,
+        'filters': {
+            'employee_id': employee_id,
+            'date_from': date_from,
+            'date_to': date_to
+        }
+    }
 
+    if first_page:
+        # إحصائيات كامل النتائج (تجميع فقط بدون نقل الصفوف) وقائمة الموظفين للفلتر
+        c.execute('''SELECT COUNT(*),
+                            TOTAL(a.check_type = 'check_in'),
+                            TOTAL(a.check_type = 'check_out'),
+                            COUNT(DISTINCT a.employee_id)
+                     FROM attendance a''' + attendance_where, attendance_params)
+        total, check_ins, check_outs, active_employees = c.fetchone()
+        c.execute('SELECT COUNT(*) FROM employee_exposure_sessions ses' + exposure_where, exposure_params)
+        total_exposure_records = c.fetchone()[0]
 
-        # جلب قائمة الموظفين للفلتر
         c.execute('SELECT DISTINCT employee_id, name FROM employees ORDER BY name')
         employees = []
         for row in c.fetchall():
@@ -3043,22 +3441,44 @@ def get_unified_reports():
                 'name': row[1]
             })
 
-        conn.close()
-
-        return jsonify({
-            'success': True,
-            'attendance_records': attendance_records,
-            'exposure_records': exposure_records, # Fixed: JavaScript expects exposure_records
+        payload.update({
             'employees': employees,
-            'total_attendance_records': len(attendance_records),
-            'total_exposure_records': len(exposure_records),
-            'filters': {
-                'employee_id': employee_id,
-                'date_from': date_from,
-                'date_to': date_to
+            'total_attendance_records': total,
+            'total_exposure_records': total_exposure_records,
+            'attendance_summary': {
+                'total_records': total,
+                'check_in_records': int(check_ins),
+                'check_out_records': int(check_outs),
+                'active_employees': active_employees
             }
         })
 
+    return payload
+
+@app.route('/api/unified_reports', methods=['GET'])
+def get_unified_reports():
+    """API موحد لجلب بيانات الحضور والتعرض معاً
+
+    ترقيم بالمؤشر: كل صفحة تحوي حتى limit سجل حضور وlimit سجل تعرض، وnext_cursor
+    يحفظ موضع القائمتين معاً. الإحصائيات وقائمة الموظفين ترجع في الصفحة الأولى فقط
+    """
+    try:
+        conn = sqlite3.connect('attendance.db')
+        try:
+            payload = build_unified_reports_payload(
+                conn.cursor(),
+                employee_id=request.args.get('employee_id', ''),
+                date_from=request.args.get('date_from', ''),
+                date_to=request.args.get('date_to', ''),
+                limit=request.args.get('limit'),
+                cursor_token=request.args.get('cursor', ''))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        finally:
+            conn.close()
+
+        return jsonify(dict({'success': True}, **payload))
+
     except Exception as e:
         print(f"❌ خطأ في API التقارير الموحدة: {e}")
         return jsonify({
@@ -3066,66 +3486,208 @@ def get_unified_reports():
             'error': str(e)
         }), 500
 
+# مجموعات التصدير: ترتيب الصفوف والحقول المصدرة
+# الحقول بدون الأسماء البديلة الخاصة بالواجهة (total_dose, dose_rate, ...)
+EXPORT_DATASETS = {
+    'attendance': {
+        'order_by': 'a.timestamp DESC, a.id DESC',
+        'fields': ['employee_id', 'name', 'check_type', 'timestamp', 'date', 'time', 'job_title']
+    },
+    'exposure': {
+        'order_by': 'ses.check_in_time DESC, ses.id DESC',
+        'fields': ['employee_id', 'name', 'check_in_time', 'check_out_time', 'exposure_duration_minutes',
+                   'total_exposure', 'average_dose_rate', 'max_dose_rate', 'min_dose_rate',
+                   'initial_total_dose', 'final_total_dose', 'safety_alerts', 'notes',
+                   'safety_status', 'safety_percentage', 'risk_level',
+                   'daily_limit_percentage', 'annual_projection']
+    }
+}
+EXPORT_FETCH_SIZE = 500
+
+@app.route('/api/export/<dataset>', methods=['GET'])
+@compress(gzip_level=4, brotli_quality=3)  # تصدير كبير: ضغط أسرع لكل جزء
+def export_reports(dataset):
+    """تصدير سجلات الحضور أو التعرض بتدفق (NDJSON أو CSV)
+
+    نفس فلاتر /api/unified_reports (employee_id, date_from, date_to) ونفس تصنيف الأمان.
+    الصفوف تُقرأ من المؤشر بدفعات fetchmany وتُرسل فوراً، فتبقى ذاكرة الخادم ثابتة
+    مهما كان عدد السجلات المصدرة
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({'success': False, 'error': f"مجموعة بيانات غير معروفة: {dataset}"}), 400
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'success': False, 'error': "الصيغة يجب أن تكون ndjson أو csv"}), 400
+
+    try:
+        attendance_filter, exposure_filter = build_report_filters(
+            request.args.get('employee_id', ''),
+            request.args.get('date_from', ''),
+            request.args.get('date_to', '')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    if dataset == 'attendance':
+        query = ATTENDANCE_REPORT_QUERY + attendance_filter[0]
+        params = attendance_filter[1]
+    else:
+        query = EXPOSURE_REPORT_QUERY + exposure_filter[0]
+        params = exposure_filter[1]
+    query += ' ORDER BY ' + EXPORT_DATASETS[dataset]['order_by']
+    fields = EXPORT_DATASETS[dataset]['fields']
+
+    # الاستعلام وأول دفعة قبل بناء الاستجابة: أخطاء الإعداد (جدول أو عمود مفقود...)
+    # تُرجع 500 بدلاً من ملف فارغ بحالة 200
+    conn = sqlite3.connect('attendance.db')
+    try:
+        c = conn.cursor()
+        pregnancy_map = fetch_pregnancy_map(c) if dataset == 'exposure' else None
+        c.execute(query, params)
+        first_rows = c.fetchmany(EXPORT_FETCH_SIZE)
+    except Exception as e:
+        conn.close()
+        print(f"❌ خطأ في تجهيز تصدير {dataset}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    def generate():
+        exported = 0
+        try:
+            if export_format == 'csv':
+                # BOM ليفتح Excel الملف بترميز UTF-8 (الأسماء العربية)
+                header = io.StringIO()
+                csv.writer(header).writerow(fields)
+                yield '\ufeff' + header.getvalue()
+
+            rows = first_rows
+            while rows:
+                if dataset == 'attendance':
+                    records = [format_attendance_record(row) for row in rows]
+                else:
+                    records = format_exposure_records(rows, pregnancy_map)
+
+                if export_format == 'csv':
+                    chunk = io.StringIO()
+                    csv.writer(chunk).writerows([record[field] for field in fields] for record in records)
+                    yield chunk.getvalue()
+                else:
+                    yield ''.join(json.dumps({field: record[field] for field in fields}, ensure_ascii=False) + '\n'
+                                  for record in records)
+                exported += len(rows)
+                rows = c.fetchmany(EXPORT_FETCH_SIZE)
+        except Exception as e:
+            # الترويسات أُرسلت بالفعل - لا يمكن إرجاع 500، فيُعاد رفع الخطأ لقطع الاتصال
+            # فيرى العميل نقلاً غير مكتمل بدلاً من ملف مقطوع يبدو سليماً
+            print(f"❌ خطأ أثناء تصدير {dataset} بعد {exported} سجل: {e}")
+            raise
+        finally:
+            conn.close()
+
+    filename = f"{dataset}_records_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    response = Response(generate(), mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson')
+    response.call_on_close(conn.close)  # إذا أُغلقت الاستجابة قبل بدء المولد
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'  # منع التخزين المؤقت في nginx حتى يصل التدفق مباشرة
+    return response
+
 @app.route('/api/cumulative_doses', methods=['GET'])
 def get_cumulative_doses():
-    """API لجلب الجرعات التراكمية لجميع الموظفين"""
+    """API لجلب الجرعات التراكمية لجميع الموظفين
+
+    عدد ثابت من الاستعلامات المجمَّعة بغض النظر عن عدد الموظفين والجلسات النشطة:
+    1. ملخص لكل موظف (الجرعات من سجل الجرعات اليومية + إحصائيات الجلسات المغلقة)
+    2. الجلسات النشطة مع أول وآخر قراءة وعدد القراءات (دوال النوافذ)
+    """
     try:
         employee_id = request.args.get('employee_id', '')
         
         conn = sqlite3.connect('attendance.db')
         c = conn.cursor()
 
-        # بناء الاستعلام - محدث لإضافة عدد القراءات والمدة الزمنية
-        query = '''
+        session_filter = 'AND employee_id = ?' if employee_id else ''
+        employee_params = [employee_id] if employee_id else []
+
+        # 1) ملخص لكل موظف - عدد القراءات من readings_count المحفوظ عند إغلاق الجلسة
+        current_time = get_current_time_precise()
+        windows = dose_window_starts(current_time.date())
+        query = f'''
             SELECT 
                 e.employee_id,
                 e.name,
                 e.department,
                 e.position,
-                -- ✨ تصحيح: استخدام ABS لضمان عدم وجود قيم سالبة + فقط الجلسات مع جرعة موجبة
-                COALESCE(SUM(CASE WHEN DATE(ses.session_date) = DATE('now') 
-                    AND ses.is_active = 0 AND COALESCE(ses.total_exposure, 0) > 0 
-                    THEN COALESCE(ses.total_exposure, 0) ELSE 0 END), 0) as daily_dose,
-                COALESCE(SUM(CASE WHEN DATE(ses.session_date) >= DATE('now', '-7 days') 
-                    AND ses.is_active = 0 AND COALESCE(ses.total_exposure, 0) > 0 
-                    THEN COALESCE(ses.total_exposure, 0) ELSE 0 END), 0) as weekly_dose,
-                COALESCE(SUM(CASE WHEN DATE(ses.session_date) >= DATE('now', '-30 days') 
-                    AND ses.is_active = 0 AND COALESCE(ses.total_exposure, 0) > 0 
-                    THEN COALESCE(ses.total_exposure, 0) ELSE 0 END), 0) as monthly_dose,
-                COALESCE(SUM(CASE WHEN DATE(ses.session_date) >= DATE('now', '-365 days') 
-                    AND ses.is_active = 0 AND COALESCE(ses.total_exposure, 0) > 0 
-                    THEN COALESCE(ses.total_exposure, 0) ELSE 0 END), 0) as annual_dose,
-                COALESCE(SUM(CASE WHEN ses.is_active = 0 AND COALESCE(ses.total_exposure, 0) > 0 
-                    THEN COALESCE(ses.total_exposure, 0) ELSE 0 END), 0) as total_cumulative_dose,
-                COUNT(CASE WHEN ses.is_active = 0 THEN 1 END) as total_sessions,
-                MAX(ses.check_out_time) as last_exposure_date,
-                (
-                    -- ✅ احتساب القراءات من الجلسات المغلقة والنشطة معاً
-                    SELECT COUNT(*) 
-                    FROM radiation_readings_local r 
-                    WHERE r.session_id IN (
-                        SELECT id FROM employee_exposure_sessions 
-                        WHERE employee_id = e.employee_id AND is_active IN (0, 1)
-                    )
-                ) as total_readings,
-                -- ✨ إضافة حساب المدة الإجمالية بالدقائق من الجلسات المغلقة
-                COALESCE(SUM(CASE WHEN ses.is_active = 0 THEN COALESCE(ses.exposure_duration_minutes, 0) ELSE 0 END), 0) as total_duration_minutes
+                COALESCE(w.daily_dose, 0) as daily_dose,
+                COALESCE(w.weekly_dose, 0) as weekly_dose,
+                COALESCE(w.monthly_dose, 0) as monthly_dose,
+                COALESCE(w.annual_dose, 0) as annual_dose,
+                COALESCE(w.total_dose, 0) as total_cumulative_dose,
+                COALESCE(sa.closed_sessions, 0) as total_sessions,
+                sa.last_exposure_date,
+                COALESCE(sa.closed_readings, 0) as total_readings,
+                COALESCE(sa.closed_minutes, 0) as total_duration_minutes
             FROM employees e
-            LEFT JOIN employee_exposure_sessions ses ON e.employee_id = ses.employee_id
-            WHERE 1=1
+            LEFT JOIN (
+                SELECT employee_id,
+                       TOTAL(CASE WHEN dose_date = ? THEN total_exposure END) AS daily_dose,
+                       TOTAL(CASE WHEN dose_date >= ? THEN total_exposure END) AS weekly_dose,
+                       TOTAL(CASE WHEN dose_date >= ? THEN total_exposure END) AS monthly_dose,
+                       TOTAL(CASE WHEN dose_date >= ? THEN total_exposure END) AS annual_dose,
+                       TOTAL(total_exposure) AS total_dose
+                FROM employee_daily_dose
+                WHERE 1=1 {session_filter}
+                GROUP BY employee_id
+            ) w ON w.employee_id = e.employee_id
+            LEFT JOIN (
+                SELECT employee_id,
+                       SUM(is_active = 0) AS closed_sessions,
+                       MAX(check_out_time) AS last_exposure_date,
+                       SUM(CASE WHEN is_active = 0 THEN COALESCE(readings_count,
+                           (SELECT COUNT(*) FROM radiation_readings_local r
+                            WHERE r.session_id = employee_exposure_sessions.id)) ELSE 0 END) AS closed_readings,
+                       TOTAL(CASE WHEN is_active = 0 THEN COALESCE(exposure_duration_minutes, 0) END) AS closed_minutes
+                FROM employee_exposure_sessions
+                WHERE 1=1 {session_filter}
+                GROUP BY employee_id
+            ) sa ON sa.employee_id = e.employee_id
+            WHERE 1=1 {'AND e.employee_id = ?' if employee_id else ''}
+            ORDER BY annual_dose DESC
         '''
-        params = []
-
-        if employee_id:
-            query += ' AND e.employee_id = ?'
-            params.append(employee_id)
-
-        query += ' GROUP BY e.employee_id, e.name, e.department, e.position ORDER BY annual_dose DESC'
-
+        params = ([windows['today'], windows['week_start'], windows['month_start'], windows['year_start']]
+                  + employee_params * 3)
         c.execute(query, params)
-        
+        employee_rows = c.fetchall()
+
+        # 2) الجلسات النشطة: التعرض الحالي = آخر قراءة - أول قراءة (دوال النوافذ بدلاً من استعلامين لكل جلسة)
+        c.execute(f'''
+            WITH active AS (
+                SELECT id, employee_id, session_date, check_in_time
+                FROM employee_exposure_sessions
+                WHERE is_active = 1 {session_filter}
+            ),
+            ranked AS (
+                SELECT r.session_id, r.total_absorbed_dose,
+                       ROW_NUMBER() OVER (PARTITION BY r.session_id ORDER BY r.timestamp ASC, r.id ASC) AS first_rank,
+                       ROW_NUMBER() OVER (PARTITION BY r.session_id ORDER BY r.timestamp DESC, r.id DESC) AS last_rank,
+                       COUNT(*) OVER (PARTITION BY r.session_id) AS readings
+                FROM radiation_readings_local r
+                WHERE r.session_id IN (SELECT id FROM active)
+            )
+            SELECT a.employee_id, a.id, a.session_date, a.check_in_time,
+                   MAX(CASE WHEN ranked.first_rank = 1 THEN ranked.total_absorbed_dose END) AS first_dose,
+                   MAX(CASE WHEN ranked.last_rank = 1 THEN ranked.total_absorbed_dose END) AS last_dose,
+                   COALESCE(MAX(ranked.readings), 0) AS readings
+            FROM active a
+            LEFT JOIN ranked ON ranked.session_id = a.id
+            GROUP BY a.id
+        ''', employee_params)
+
+        active_by_employee = {}
+        for active_row in c.fetchall():
+            active_by_employee.setdefault(active_row[0], []).append(active_row[1:])
+
+        today_str = windows['today']
         cumulative_data = []
-        for row in c.fetchall():
+        for row in employee_rows:
             emp_id = row[0]
             daily_dose = float(row[4])
             weekly_dose = float(row[5])
@@ -3138,50 +3700,25 @@ def get_cumulative_doses():
             total_duration_minutes = float(row[12]) if row[12] is not None else 0.0  # ✨ المدة الإجمالية
 
             # ✅ إضافة جرعات الجلسات النشطة حالياً (إن وجدت) إلى المجاميع
-            c2 = conn.cursor()
-            c2.execute('''SELECT id, initial_total_dose, session_date, check_in_time
-                          FROM employee_exposure_sessions
-                          WHERE employee_id = ? AND is_active = 1''', (emp_id,))
-            active_sessions = c2.fetchall()
-
-            active_exposure_sum = 0.0
-            for s in active_sessions:
-                sess_id, initial_total_dose, session_date, check_in_time = s
-                
-                # ✨ الطريقة المصححة: حساب الفرق بين أول وآخر قراءة في الجلسة
-                c2.execute('''SELECT total_absorbed_dose 
-                              FROM radiation_readings_local 
-                              WHERE session_id = ? 
-                              ORDER BY timestamp ASC LIMIT 1''', (sess_id,))
-                first_reading = c2.fetchone()
-                
-                c2.execute('''SELECT total_absorbed_dose 
-                              FROM radiation_readings_local 
-                              WHERE session_id = ? 
-                              ORDER BY timestamp DESC LIMIT 1''', (sess_id,))
-                last_reading = c2.fetchone()
-                
-                if first_reading and last_reading and first_reading[0] is not None and last_reading[0] is not None:
-                    first_dose = float(first_reading[0])
-                    last_dose = float(last_reading[0])
-                    exposure_now = max(0.0, last_dose - first_dose)
-                    active_exposure_sum += exposure_now
+            active_sessions = active_by_employee.get(emp_id, [])
+            for sess_id, session_date, check_in_time, first_dose, last_dose, readings in active_sessions:
+                total_readings += readings
+
+                if first_dose is not None and last_dose is not None:
+                    exposure_now = max(0.0, float(last_dose) - float(first_dose))
 
                     # إضافة التعرض الحالي إلى اليومي/الأسبوعي/الشهري/السنوي حسب التاريخ
-                    daily_dose += exposure_now if str(session_date) == str(datetime.now().date()) else 0.0
+                    daily_dose += exposure_now if str(session_date) == today_str else 0.0
                     weekly_dose += exposure_now  # اليوم ضمن الأسبوع الحالي
                     monthly_dose += exposure_now  # اليوم ضمن الشهر الحالي
                     annual_dose += exposure_now   # اليوم ضمن السنة الحالية
                     total_dose += exposure_now
-                    
-                    print(f"✨ حساب الجلسة النشطة {sess_id}: {first_dose:.6f} -> {last_dose:.6f} = {exposure_now:.6f} μSv")
-                    
+
                     # ✨ حساب مدة الجلسة النشطة بالدقائق
                     if check_in_time:
                         try:
-                            check_in_dt = datetime.fromisoformat(check_in_time.replace('Z', '+00:00'))
-                            current_time = datetime.now(timezone.utc)
-                            duration_minutes = (current_time - check_in_dt).total_seconds() / 60
+                            check_in_dt = time_calculator.normalize_datetime(check_in_time)
+                            duration_minutes = time_calculator.calculate_duration_seconds(check_in_dt, current_time) / 60
                             total_duration_minutes += max(0, duration_minutes)
                         except Exception:
                             pass
@@ -3262,156 +3799,167 @@ def get_cumulative_doses():
             'error': str(e)
         }), 500
 
-@app.route('/api/cumulative_doses_fast', methods=['GET'])
-def get_cumulative_doses_fast():
-    """API سريع لجلب الجرعات التراكمية من جدول البيانات المجمعة"""
+# حدود الجرعات (μSv) المعروضة مع الجرعات التراكمية
+CUMULATIVE_DOSE_LIMITS = {
+    'daily': 54.8,
+    'weekly': 383.6,
+    'monthly': 1643.8,
+    'annual': 20000.0
+}
+
+# حقول /api/cumulative_doses_fast: الحقل -> (تعبير SQL، خانات التقريب أو None)
+CUMULATIVE_FIELDS = {
+    'employee_id': ('ecd.employee_id', None),
+    'name': ('e.name', None),
+    'department': ("COALESCE(NULLIF(e.department, ''), '-')", None),
+    'position': ("COALESCE(NULLIF(e.position, ''), '-')", None),
+    'daily_exposure': ('ecd.daily_exposure', 6),
+    'weekly_exposure': ('ecd.weekly_exposure', 6),
+    'monthly_exposure': ('ecd.monthly_exposure', 6),
+    'annual_exposure': ('ecd.annual_exposure', 6),
+    'total_cumulative_exposure': ('ecd.total_cumulative_exposure', 6),
+    'total_sessions': ('ecd.total_sessions', None),
+    'completed_sessions': ('ecd.completed_sessions', None),
+    'active_sessions': ('ecd.active_sessions', None),
+    'total_readings': ('ecd.total_readings', None),
+    'total_duration_minutes': ('ecd.total_duration_minutes', 2),
+    'total_duration_hours': ('ecd.total_duration_hours', 2),
+    'average_dose_rate_per_hour': ('ecd.average_dose_rate_per_hour', 6),
+    'daily_exposure_percentage': ('ecd.daily_exposure_percentage', 2),
+    'weekly_exposure_percentage': ('ecd.weekly_exposure_percentage', 2),
+    'monthly_exposure_percentage': ('ecd.monthly_exposure_percentage', 2),
+    'annual_exposure_percentage': ('ecd.annual_exposure_percentage', 2),
+    'safety_status': ('ecd.safety_status', None),
+    'safety_class': ('ecd.safety_class', None),
+    'risk_level': ('ecd.risk_level', None),
+    'last_session_date': ('ecd.last_session_date', None),
+    'last_completed_session_date': ('ecd.last_completed_session_date', None),
+    'average_exposure_per_session': ('ecd.average_exposure_per_session', 6),
+    'max_single_session_exposure': ('ecd.max_single_session_exposure', 6),
+    'min_single_session_exposure': ('ecd.min_single_session_exposure', 6),
+    'first_session_date': ('ecd.first_session_date', None)
+}
+
+# أسماء الشكل القديم (cumulative_data) لكل حقل يختلف اسمه
+LEGACY_CUMULATIVE_NAMES = {
+    'daily_exposure': 'daily_dose',
+    'weekly_exposure': 'weekly_dose',
+    'monthly_exposure': 'monthly_dose',
+    'annual_exposure': 'annual_dose',
+    'total_cumulative_exposure': 'total_cumulative_dose',
+    'average_dose_rate_per_hour': 'dose_rate_per_hour',
+    'daily_exposure_percentage': 'daily_percentage',
+    'weekly_exposure_percentage': 'weekly_percentage',
+    'monthly_exposure_percentage': 'monthly_percentage',
+    'annual_exposure_percentage': 'annual_percentage',
+    'safety_class': 'status_class'
+}
+
+def legacy_cumulative_payload(records):
+    """
+    الشكل القديم لـ /api/cumulative_doses_fast (shape=legacy) للصفحات التي لم تُرحّل بعد:
+    كل موظف مرتين (cumulative_data بالأسماء القديمة و employees بأسماء الجدول) مع الحدود في كل صف
+    """
+    limits = {f'{period}_limit': value for period, value in CUMULATIVE_DOSE_LIMITS.items()}
+    cumulative_data = []
+    employees = []
+    for record in records:
+        cumulative_data.append(dict({LEGACY_CUMULATIVE_NAMES.get(k, k): v for k, v in record.items()}, **limits))
+        employees.append(dict(record, dose_rate_per_hour=record['average_dose_rate_per_hour'], **limits))
+    return {
+        'success': True,
+        'cumulative_data': cumulative_data,
+        'employees': employees,
+        'total_employees': len(employees),
+        'data_source': 'employee_cumulative_data_table',
+        'note': 'البيانات من جدول البيانات التراكمية المجمعة - أسرع في الأداء'
+    }
+
+def cumulative_doses_version():
+    """علامة إصدار /api/cumulative_doses_fast: آخر تحديث للجدول التراكمي وعدد صفوفه"""
     try:
-        employee_id = request.args.get('employee_id', '')
-        
         conn = sqlite3.connect('attendance.db')
-        c = conn.cursor()
-
-        # بناء الاستعلام من الجدول الجديد
-        query = '''
-            SELECT 
-                ecd.employee_id,
-                e.name,
-                e.department,
-                e.position,
-                ecd.daily_exposure,
-                ecd.weekly_exposure,
-                ecd.monthly_exposure,
-                ecd.annual_exposure,
-                ecd.total_cumulative_exposure,
-                ecd.total_sessions,
-                ecd.completed_sessions,
-                ecd.active_sessions,
-                ecd.total_readings,
-                ecd.total_duration_minutes,
-                ecd.total_duration_hours,
-                ecd.average_dose_rate_per_hour,
-                ecd.daily_exposure_percentage,
-                ecd.weekly_exposure_percentage,
-                ecd.monthly_exposure_percentage,
-                ecd.annual_exposure_percentage,
-                ecd.safety_status,
-                ecd.safety_class,
-                ecd.risk_level,
-                ecd.last_session_date,
-                ecd.last_completed_session_date,
-                ecd.average_exposure_per_session,
-                ecd.max_single_session_exposure,
-                ecd.min_single_session_exposure,
-                ecd.first_session_date
-            FROM employee_cumulative_data ecd
-            JOIN employees e ON ecd.employee_id = e.employee_id
-            WHERE 1=1
-        '''
-        params = []
+        try:
+            return conn.execute('SELECT MAX(last_updated), COUNT(*) FROM employee_cumulative_data').fetchone()
+        finally:
+            conn.close()
+    except sqlite3.OperationalError:
+        return None
 
-        if employee_id:
-            query += ' AND ecd.employee_id = ?'
-            params.append(employee_id)
+def parse_cumulative_fields(shape='records', fields_param=''):
+    """التحقق من shape و fields لـ /api/cumulative_doses_fast - يرفع ValueError للقيم غير الصالحة"""
+    if shape not in ('records', 'compact', 'legacy'):
+        raise ValueError("shape يجب أن يكون records أو compact أو legacy")
+    if shape == 'legacy':
+        return list(CUMULATIVE_FIELDS)
+    fields = [f.strip() for f in (fields_param or '').split(',') if f.strip()] or list(CUMULATIVE_FIELDS)
+    unknown = [f for f in fields if f not in CUMULATIVE_FIELDS]
+    if unknown:
+        raise ValueError(f"حقول غير معروفة: {', '.join(unknown)}")
+    return fields
+
+def fetch_cumulative_rows(c, fields, employee_id=''):
+    """صفوف الجدول التراكمي (الأعمدة المطلوبة فقط) مرتبة حسب التعرض السنوي"""
+    query = f'''
+        SELECT {', '.join(CUMULATIVE_FIELDS[f][0] for f in fields)}
+        FROM employee_cumulative_data ecd
+        JOIN employees e ON ecd.employee_id = e.employee_id
+        WHERE 1=1
+    '''
+    params = []
 
-        query += ' ORDER BY ecd.annual_exposure DESC'
+    if employee_id:
+        query += ' AND ecd.employee_id = ?'
+        params.append(employee_id)
+
+    query += ' ORDER BY ecd.annual_exposure DESC'
+
+    c.execute(query, params)
+    digits = [CUMULATIVE_FIELDS[f][1] for f in fields]
+    return [[round(value, d) if d is not None and value is not None else value
+             for value, d in zip(row, digits)]
+            for row in c.fetchall()]
+
+def build_cumulative_payload(fields, rows, shape='records'):
+    """استجابة الجرعات التراكمية بشكل records أو compact (بدون success)"""
+    payload = {
+        'limits': CUMULATIVE_DOSE_LIMITS,
+        'total_employees': len(rows),
+        'data_source': 'employee_cumulative_data_table'
+    }
+    if shape == 'compact':
+        payload.update({'fields': fields, 'rows': rows})
+    else:
+        payload['records'] = [dict(zip(fields, row)) for row in rows]
+    return payload
 
-        c.execute(query, params)
-        
-        cumulative_data = []
-        employees = []
-        for row in c.fetchall():
-            # حدود الأمان
-            daily_limit = 54.8
-            weekly_limit = 383.6
-            monthly_limit = 1643.8
-            annual_limit = 20000.0
-            
-            # تجميع بصيغة داخلية (توافق قديم)
-            item = {
-                'employee_id': row[0],
-                'name': row[1],
-                'department': row[2] or '-',
-                'position': row[3] or '-',
-                'daily_dose': round(row[4], 6),
-                'weekly_dose': round(row[5], 6),
-                'monthly_dose': round(row[6], 6),
-                'annual_dose': round(row[7], 6),
-                'total_cumulative_dose': round(row[8], 6),
-                'total_sessions': row[9],
-                'completed_sessions': row[10],
-                'active_sessions': row[11], 
-                'total_readings': row[12],
-                'total_duration_minutes': round(row[13], 2),
-                'total_duration_hours': round(row[14], 2),
-                'dose_rate_per_hour': round(row[15], 6),
-                'daily_percentage': round(row[16], 2),
-                'weekly_percentage': round(row[17], 2),
-                'monthly_percentage': round(row[18], 2),
-                'annual_percentage': round(row[19], 2),
-                'safety_status': row[20],
-                'status_class': row[21],
-                'risk_level': row[22],
-                'last_session_date': row[23],
-                'last_completed_session_date': row[24],
-                'average_exposure_per_session': round(row[25], 6),
-                'max_single_session_exposure': round(row[26], 6),
-                'min_single_session_exposure': round(row[27], 6),
-                'first_session_date': row[28],
-                'daily_limit': daily_limit,
-                'weekly_limit': weekly_limit,
-                'monthly_limit': monthly_limit,
-                'annual_limit': annual_limit
-            }
-            cumulative_data.append(item)
+@app.route('/api/cumulative_doses_fast', methods=['GET'])
+@conditional_response(cumulative_doses_version)
+@cached_response('cumulative', 'employees')
+def get_cumulative_doses_fast():
+    """API سريع لجلب الجرعات التراكمية من جدول البيانات المجمعة
 
-            # تجميع بصيغة متوافقة مع الواجهة الأمامية (employees)
-            employees.append({
-                'employee_id': item['employee_id'],
-                'name': item['name'],
-                'department': item['department'],
-                'position': item['position'],
-                'daily_exposure': item['daily_dose'],
-                'weekly_exposure': item['weekly_dose'],
-                'monthly_exposure': item['monthly_dose'],
-                'annual_exposure': item['annual_dose'],
-                'total_cumulative_exposure': item['total_cumulative_dose'],
-                'total_sessions': item['total_sessions'],
-                'completed_sessions': item['completed_sessions'],
-                'active_sessions': item['active_sessions'],
-                'total_readings': item['total_readings'],
-                'total_duration_minutes': item['total_duration_minutes'],
-                'total_duration_hours': item['total_duration_hours'],
-                'average_dose_rate_per_hour': item['dose_rate_per_hour'],
-                'dose_rate_per_hour': item['dose_rate_per_hour'],
-                'daily_exposure_percentage': item['daily_percentage'],
-                'weekly_exposure_percentage': item['weekly_percentage'],
-                'monthly_exposure_percentage': item['monthly_percentage'],
-                'annual_exposure_percentage': item['annual_percentage'],
-                'safety_status': item['safety_status'],
-                'safety_class': item['status_class'],
-                'risk_level': item['risk_level'],
-                'last_session_date': item['last_session_date'],
-                'last_completed_session_date': item['last_completed_session_date'],
-                'average_exposure_per_session': item['average_exposure_per_session'],
-                'max_single_session_exposure': item['max_single_session_exposure'],
-                'min_single_session_exposure': item['min_single_session_exposure'],
-                'first_session_date': item['first_session_date'],
-                'daily_limit': item['daily_limit'],
-                'weekly_limit': item['weekly_limit'],
-                'monthly_limit': item['monthly_limit'],
-                'annual_limit': item['annual_limit']
-            })
+    شكل صف واحد (أسماء أعمدة employee_cumulative_data) مع حدود الجرعات مرة واحدة في الاستجابة:
+    - fields: قائمة حقول مفصولة بفواصل (الافتراضي جميع الحقول) - تُجلب من SQL فقط الأعمدة المطلوبة
+    - shape: records (افتراضي، قائمة قواميس) أو compact (fields + rows كمصفوفات)
+             أو legacy (الشكل القديم: cumulative_data و employees مع الحدود في كل صف)
+    """
+    try:
+        employee_id = request.args.get('employee_id', '')
+        shape = request.args.get('shape', 'records')
+        try:
+            fields = parse_cumulative_fields(shape, request.args.get('fields', ''))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
 
+        conn = sqlite3.connect('attendance.db')
+        rows = fetch_cumulative_rows(conn.cursor(), fields, employee_id)
         conn.close()
 
-        return jsonify({
-            'success': True,
-            'cumulative_data': cumulative_data,
-            'employees': employees,
-            'total_employees': len(employees),
-            'data_source': 'employee_cumulative_data_table',
-            'note': 'البيانات من جدول البيانات التراكمية المجمعة - أسرع في الأداء'
-        })
+        if shape == 'legacy':
+            return jsonify(legacy_cumulative_payload([dict(zip(fields, row)) for row in rows]))
+
+        return jsonify(dict({'success': True}, **build_cumulative_payload(fields, rows, shape)))
 
     except Exception as e:
         print(f"❌ خطأ في API الجرعات التراكمية السريع: {e}")
@@ -3429,73 +3977,17 @@ def update_cumulative_data():
         conn = sqlite3.connect('attendance.db')
         c = conn.cursor()
         
-        # تحديد القائمة المراد تحديثها
+        # حساب وحفظ البيانات التراكمية (نفس المنطق المستخدم في المُجدول)
         if employee_id:
-            employees_to_update = [(employee_id,)]
             print(f"🔄 تحديث بيانات الموظف: {employee_id}")
+            updated_count = update_employees_cumulative_data(c, [employee_id])
         else:
-            c.execute('SELECT DISTINCT employee_id FROM employee_exposure_sessions')
-            employees_to_update = c.fetchall()
-            print(f"🔄 تحديث بيانات جميع الموظفين: {len(employees_to_update)} موظف")
-        
-        updated_count = 0
-        
-        for emp in employees_to_update:
-            emp_id = emp[0]
-            
-            # حساب البيانات التراكمية
-            cumulative_data = calculate_employee_cumulative_data_inline(c, emp_id)
-            
-            # تحديث أو إدراج البيانات
-            c.execute('''
-                INSERT OR REPLACE INTO employee_cumulative_data (
-                    employee_id, total_sessions, completed_sessions, active_sessions,
-                    total_duration_minutes, total_duration_hours, average_session_duration_minutes,
-                    total_cumulative_exposure, average_exposure_per_session, average_dose_rate_per_hour,
-                    max_single_session_exposure, min_single_session_exposure,
-                    daily_exposure, weekly_exposure, monthly_exposure, annual_exposure,
-                    daily_exposure_percentage, weekly_exposure_percentage, 
-                    monthly_exposure_percentage, annual_exposure_percentage,
-                    total_readings, average_readings_per_session,
-                    first_session_date, last_session_date, last_completed_session_date,
-                    safety_status, safety_class, risk_level, last_updated
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                emp_id,
-                cumulative_data['total_sessions'],
-                cumulative_data['completed_sessions'],
-                cumulative_data['active_sessions'],
-                cumulative_data['total_duration_minutes'],
-                cumulative_data['total_duration_hours'],
-                cumulative_data['average_session_duration_minutes'],
-                cumulative_data['total_cumulative_exposure'],
-                cumulative_data['average_exposure_per_session'],
-                cumulative_data['average_dose_rate_per_hour'],
-                cumulative_data['max_single_session_exposure'],
-                cumulative_data['min_single_session_exposure'],
-                cumulative_data['daily_exposure'],
-                cumulative_data['weekly_exposure'],
-                cumulative_data['monthly_exposure'],
-                cumulative_data['annual_exposure'],
-                cumulative_data['daily_exposure_percentage'],
-                cumulative_data['weekly_exposure_percentage'],
-                cumulative_data['monthly_exposure_percentage'],
-                cumulative_data['annual_exposure_percentage'],
-                cumulative_data['total_readings'],
-                cumulative_data['average_readings_per_session'],
-                cumulative_data['first_session_date'],
-                cumulative_data['last_session_date'],
-                cumulative_data['last_completed_session_date'],
-                cumulative_data['safety_status'],
-                cumulative_data['safety_class'],
-                cumulative_data['risk_level'],
-                datetime.now().isoformat()
-            ))
-            
-            updated_count += 1
+            updated_count = update_employees_cumulative_data(c)
+            print(f"🔄 تم تحديث بيانات جميع الموظفين: {updated_count} موظف")
         
         conn.commit()
         conn.close()
+        bump_generation('cumulative')
         
         return jsonify({
             'success': True,
@@ -3510,122 +4002,6 @@ def update_cumulative_data():
             'error': str(e)
         }), 500
 
-def calculate_employee_cumulative_data_inline(cursor, employee_id):
-    """حساب البيانات التراكمية لموظف محدد (نسخة مبسطة)"""
-    
-    # حدود الأمان
-    daily_limit = 54.8
-    weekly_limit = 383.6
-    monthly_limit = 1643.8
-    annual_limit = 20000.0
-    
-    # جلب بيانات الجلسات
-    cursor.execute('''
-        SELECT 
-            id, session_date, check_in_time, check_out_time,
-            exposure_duration_minutes, total_exposure, is_active
-        FROM employee_exposure_sessions 
-        WHERE employee_id = ?
-        ORDER BY session_date, check_in_time
-    ''', (employee_id,))
-    
-    sessions = cursor.fetchall()
-    
-    # حساب الإحصائيات
-    total_sessions = len(sessions)
-    completed_sessions = len([s for s in sessions if s[6] == 0])
-    active_sessions = len([s for s in sessions if s[6] == 1])
-    
-    # حساب المدد والجرعات
-    completed_session_data = [s for s in sessions if s[6] == 0 and s[5] is not None]
-    
-    total_duration_minutes = sum(s[4] or 0 for s in completed_session_data)
-    total_duration_hours = total_duration_minutes / 60
-    avg_session_duration = total_duration_minutes / max(completed_sessions, 1)
-    
-    exposures = [s[5] for s in completed_session_data if s[5] is not None]
-    total_cumulative_exposure = sum(exposures) if exposures else 0.0
-    avg_exposure_per_session = total_cumulative_exposure / max(completed_sessions, 1)
-    avg_dose_rate_per_hour = total_cumulative_exposure / max(total_duration_hours, 1)
-    max_exposure = max(exposures) if exposures else 0.0
-    min_exposure = min(exposures) if exposures else 0.0
-    
-    # حساب الجرعات حسب الفترات
-    today = datetime.now().date()
-    daily_exposure = sum(s[5] or 0 for s in completed_session_data if s[1] == str(today))
-    weekly_exposure = sum(s[5] or 0 for s in completed_session_data if (today - datetime.fromisoformat(s[1]).date()).days <= 7)
-    monthly_exposure = sum(s[5] or 0 for s in completed_session_data if (today - datetime.fromisoformat(s[1]).date()).days <= 30)
-    annual_exposure = sum(s[5] or 0 for s in completed_session_data if (today - datetime.fromisoformat(s[1]).date()).days <= 365)
-    
-    # حساب النسب المئوية
-    daily_percentage = (daily_exposure / daily_limit * 100) if daily_limit > 0 else 0
-    weekly_percentage = (weekly_exposure / weekly_limit * 100) if weekly_limit > 0 else 0
-    monthly_percentage = (monthly_exposure / monthly_limit * 100) if monthly_limit > 0 else 0
-    annual_percentage = (annual_exposure / annual_limit * 100) if annual_limit > 0 else 0
-    
-    # حساب عدد القراءات
-    total_readings = 0
-    for session in sessions:
-        cursor.execute('SELECT COUNT(*) FROM radiation_readings_local WHERE session_id = ?', (session[0],))
-        count = cursor.fetchone()[0]
-        total_readings += count
-    
-    avg_readings_per_session = total_readings / max(total_sessions, 1)
-    
-    # التواريخ المهمة
-    first_session_date = sessions[0][1] if sessions else None
-    last_session_date = sessions[-1][1] if sessions else None
-    completed_sessions_dates = [s[1] for s in sessions if s[6] == 0]
-    last_completed_session_date = max(completed_sessions_dates) if completed_sessions_dates else None
-    
-    # حالة الأمان
-    if annual_percentage >= 100:
-        safety_status = "خطر - تجاوز الحد السنوي"
-        safety_class = "danger"
-        risk_level = "عالي جداً"
-    elif annual_percentage >= 80:
-        safety_status = "تحذير - اقتراب من الحد السنوي"
-        safety_class = "warning"
-        risk_level = "عالي"
-    elif annual_percentage >= 50:
-        safety_status = "مراقبة - نصف الحد السنوي"
-        safety_class = "info"
-        risk_level = "متوسط"
-    else:
-        safety_status = "آمن"
-        safety_class = "success"
-        risk_level = "منخفض"
-    
-    return {
-        'total_sessions': total_sessions,
-        'completed_sessions': completed_sessions,
-        'active_sessions': active_sessions,
-        'total_duration_minutes': total_duration_minutes,
-        'total_duration_hours': total_duration_hours,
-        'average_session_duration_minutes': avg_session_duration,
-        'total_cumulative_exposure': total_cumulative_exposure,
-        'average_exposure_per_session': avg_exposure_per_session,
-        'average_dose_rate_per_hour': avg_dose_rate_per_hour,
-        'max_single_session_exposure': max_exposure,
-        'min_single_session_exposure': min_exposure,
-        'daily_exposure': daily_exposure,
-        'weekly_exposure': weekly_exposure,
-        'monthly_exposure': monthly_exposure,
-        'annual_exposure': annual_exposure,
-        'daily_exposure_percentage': daily_percentage,
-        'weekly_exposure_percentage': weekly_percentage,
-        'monthly_exposure_percentage': monthly_percentage,
-        'annual_exposure_percentage': annual_percentage,
-        'total_readings': total_readings,
-        'average_readings_per_session': avg_readings_per_session,
-        'first_session_date': first_session_date,
-        'last_session_date': last_session_date,
-        'last_completed_session_date': last_completed_session_date,
-        'safety_status': safety_status,
-        'safety_class': safety_class,
-        'risk_level': risk_level
-    }
-
 # =================================================================
 # API endpoints للتحكم في مُجدول البيانات التراكمية
 # =================================================================
@@ -3729,9 +4105,16 @@ def get_scheduler_status():
             'error': str(e)
         }), 500
 
+# أقصى انتظار لنتيجة التحديث اليدوي قبل الرد بـ 202 (لا يُحجز عامل الطلبات طوال مدة المهمة)
+FORCE_UPDATE_WAIT_SECONDS = float(os.getenv('FORCE_UPDATE_WAIT_SECONDS', '5'))
+
 @app.route('/api/scheduler/force_update', methods=['POST'])
 def force_scheduler_update():
-    """إجبار تحديث فوري للبيانات التراكمية"""
+    """إجبار تحديث فوري للبيانات التراكمية
+
+    ينتظر النتيجة FORCE_UPDATE_WAIT_SECONDS على الأكثر، وبعدها يرد بـ 202 مع حالة المهمة
+    التي تستمر في الخلفية (تظهر في /api/scheduler/status)
+    """
     global global_scheduler
     
     try:
@@ -3743,12 +4126,21 @@ def force_scheduler_update():
                 'error': 'المُجدول غير مُعرَّف'
             }), 400
         
-        # تنفيذ تحديث فوري
-        success = global_scheduler.update_cumulative_data_direct(employee_id)
+        # تنفيذ تحديث فوري عبر مجمّع العمال الداخلي للمُجدول
+        job = global_scheduler.run_update_now(employee_id, wait_seconds=FORCE_UPDATE_WAIT_SECONDS)
         
-        if success:
+        if job['state'] != 'done':
+            return jsonify({
+                'success': True,
+                'job': job['job'],
+                'state': job['state'],
+                'message': 'التحديث قيد التنفيذ في الخلفية'
+            }), 202
+        if job['result']:
             return jsonify({
                 'success': True,
+                'job': job['job'],
+                'state': job['state'],
                 'message': f'تم التحديث الفوري {"لموظف " + employee_id if employee_id else "لجميع الموظفين"} بنجاح'
             })
         else:
@@ -3764,124 +4156,133 @@ def force_scheduler_update():
             'error': str(e)
         }), 500
 
+def build_employee_sessions_payload(c, employee_id):
+    """
+    جلسات موظف مع التفاصيل الزمنية باستخدام مؤشر قاعدة بيانات مفتوح (بدون success)
+
+    :return: None إذا لم يوجد الموظف
+    """
+    # جلب معلومات الموظف
+    c.execute('SELECT name, department, position FROM employees WHERE employee_id = ?', (employee_id,))
+    emp_info = c.fetchone()
+    
+    if not emp_info:
+        return None
+    
+    # جلب جميع الجلسات (النشطة والمغلقة)
+    c.execute('''SELECT 
+                    id,
+                    session_date,
+                    check_in_time,
+                    check_out_time,
+                    exposure_duration_minutes,
+                    total_exposure,
+                    average_dose_rate,
+                    max_dose_rate,
+                    min_dose_rate,
+                    is_active,
+                    initial_total_dose,
+                    final_total_dose
+                 FROM employee_exposure_sessions
+                 WHERE employee_id = ?
+                 ORDER BY session_date DESC, check_in_time DESC''', (employee_id,))
+    
+    sessions = []
+    for row in c.fetchall():
+        session_id = row[0]
+        is_active = row[9]
+        check_in_time = row[2]
+        check_out_time = row[3]
+        duration_minutes = row[4]
+        total_exposure = row[5] if row[5] is not None else 0.0
+        initial_total_dose = row[10] if row[10] is not None else 0.0
+        final_total_dose = row[11] if row[11] is not None else 0.0
+        
+        # ✨ حساب التعرض الصحيح باستخدام الفرق بين أول وآخر قراءة
+        c2 = c.connection.cursor()
+        c2.execute('''SELECT total_absorbed_dose 
+                      FROM radiation_readings_local 
+                      WHERE session_id = ? 
+                      ORDER BY timestamp ASC LIMIT 1''', (session_id,))
+        first_reading = c2.fetchone()
+        
+        c2.execute('''SELECT total_absorbed_dose 
+                      FROM radiation_readings_local 
+                      WHERE session_id = ? 
+                      ORDER BY timestamp DESC LIMIT 1''', (session_id,))
+        last_reading = c2.fetchone()
+        
+        if first_reading and last_reading and first_reading[0] is not None and last_reading[0] is not None:
+            first_dose = float(first_reading[0])
+            last_dose = float(last_reading[0])
+            total_exposure = max(0.0, last_dose - first_dose)
+            final_total_dose = last_dose
+        elif total_exposure < 0:  # إذا كان هناك تعرض سالب في قاعدة البيانات، اجعله صفر
+            total_exposure = 0.0
+        
+        # حساب المدة (نشطة أو مغلقة)
+        if is_active and check_in_time:
+            try:
+                check_in_dt = datetime.fromisoformat(check_in_time.replace('Z', '+00:00'))
+                current_time = datetime.now(timezone.utc)
+                duration_minutes = (current_time - check_in_dt).total_seconds() / 60
+            except Exception:
+                duration_minutes = 0
+        
+        # حساب معدل الجرعة بالساعة
+        duration_hours = duration_minutes / 60 if duration_minutes and duration_minutes > 0 else 0
+        dose_rate_per_hour = (total_exposure / duration_hours) if duration_hours > 0 else 0
+        
+        # حساب عدد القراءات في هذه الجلسة
+        c2 = c.connection.cursor()
+        c2.execute('SELECT COUNT(*) FROM radiation_readings_local WHERE session_id = ?', (session_id,))
+        readings_count = c2.fetchone()[0]
+        
+        sessions.append({
+            'session_id': session_id,
+            'session_date': row[1],
+            'check_in_time': check_in_time,
+            'check_out_time': check_out_time,
+            'duration_minutes': round(duration_minutes, 2) if duration_minutes else None,
+            'duration_hours': round(duration_hours, 2) if duration_hours else None,
+            'total_exposure': round(total_exposure, 6),
+            'average_dose_rate': round(row[6], 6) if row[6] else 0,
+            'dose_rate_per_hour': round(dose_rate_per_hour, 6),
+            'max_dose_rate': round(row[7], 6) if row[7] else 0,
+            'min_dose_rate': round(row[8], 6) if row[8] else 0,
+            'is_active': bool(is_active),
+            'readings_count': readings_count,
+            'initial_total_dose': round(initial_total_dose, 6),
+            'final_total_dose': round(final_total_dose, 6)
+        })
+
+    return {
+        'employee_info': {
+            'employee_id': employee_id,
+            'name': emp_info[0],
+            'department': emp_info[1] or '-',
+            'position': emp_info[2] or '-'
+        },
+        'sessions': sessions,
+        'total_sessions': len(sessions)
+    }
+
 @app.route('/api/employee_sessions/<employee_id>', methods=['GET'])
+@cached_response('sessions', 'employees', 'readings')
 def get_employee_sessions(employee_id):
     """جلب جميع الجلسات الخاصة بموظف محدد مع التفاصيل الزمنية"""
     try:
         conn = sqlite3.connect('attendance.db')
-        c = conn.cursor()
-        
-        # جلب معلومات الموظف
-        c.execute('SELECT name, department, position FROM employees WHERE employee_id = ?', (employee_id,))
-        emp_info = c.fetchone()
-        
-        if not emp_info:
-            conn.close()
+        payload = build_employee_sessions_payload(conn.cursor(), employee_id)
+        conn.close()
+
+        if payload is None:
             return jsonify({
                 'success': False,
                 'error': 'لم يتم العثور على الموظف'
             }), 404
-        
-        # جلب جميع الجلسات (النشطة والمغلقة)
-        c.execute('''SELECT 
-                        id,
-                        session_date,
-                        check_in_time,
-                        check_out_time,
-                        exposure_duration_minutes,
-                        total_exposure,
-                        average_dose_rate,
-                        max_dose_rate,
-                        min_dose_rate,
-                        is_active,
-                        initial_total_dose,
-                        final_total_dose
-                     FROM employee_exposure_sessions
-                     WHERE employee_id = ?
-                     ORDER BY session_date DESC, check_in_time DESC''', (employee_id,))
-        
-        sessions = []
-        for row in c.fetchall():
-            session_id = row[0]
-            is_active = row[9]
-            check_in_time = row[2]
-            check_out_time = row[3]
-            duration_minutes = row[4]
-            total_exposure = row[5] if row[5] is not None else 0.0
-            initial_total_dose = row[10] if row[10] is not None else 0.0
-            final_total_dose = row[11] if row[11] is not None else 0.0
-            
-            # ✨ حساب التعرض الصحيح باستخدام الفرق بين أول وآخر قراءة
-            c2 = conn.cursor()
-            c2.execute('''SELECT total_absorbed_dose 
-                          FROM radiation_readings_local 
-                          WHERE session_id = ? 
-                          ORDER BY timestamp ASC LIMIT 1''', (session_id,))
-            first_reading = c2.fetchone()
-            
-            c2.execute('''SELECT total_absorbed_dose 
-                          FROM radiation_readings_local 
-                          WHERE session_id = ? 
-                          ORDER BY timestamp DESC LIMIT 1''', (session_id,))
-            last_reading = c2.fetchone()
-            
-            if first_reading and last_reading and first_reading[0] is not None and last_reading[0] is not None:
-                first_dose = float(first_reading[0])
-                last_dose = float(last_reading[0])
-                total_exposure = max(0.0, last_dose - first_dose)
-                final_total_dose = last_dose
-            elif total_exposure < 0:  # إذا كان هناك تعرض سالب في قاعدة البيانات، اجعله صفر
-                total_exposure = 0.0
-            
-            # حساب المدة (نشطة أو مغلقة)
-            if is_active and check_in_time:
-                try:
-                    check_in_dt = datetime.fromisoformat(check_in_time.replace('Z', '+00:00'))
-                    current_time = datetime.now(timezone.utc)
-                    duration_minutes = (current_time - check_in_dt).total_seconds() / 60
-                except Exception:
-                    duration_minutes = 0
-            
-            # حساب معدل الجرعة بالساعة
-            duration_hours = duration_minutes / 60 if duration_minutes and duration_minutes > 0 else 0
-            dose_rate_per_hour = (total_exposure / duration_hours) if duration_hours > 0 else 0
-            
-            # حساب عدد القراءات في هذه الجلسة
-            c2 = conn.cursor()
-            c2.execute('SELECT COUNT(*) FROM radiation_readings_local WHERE session_id = ?', (session_id,))
-            readings_count = c2.fetchone()[0]
-            
-            sessions.append({
-                'session_id': session_id,
-                'session_date': row[1],
-                'check_in_time': check_in_time,
-                'check_out_time': check_out_time,
-                'duration_minutes': round(duration_minutes, 2) if duration_minutes else None,
-                'duration_hours': round(duration_hours, 2) if duration_hours else None,
-                'total_exposure': round(total_exposure, 6),
-                'average_dose_rate': round(row[6], 6) if row[6] else 0,
-                'dose_rate_per_hour': round(dose_rate_per_hour, 6),
-                'max_dose_rate': round(row[7], 6) if row[7] else 0,
-                'min_dose_rate': round(row[8], 6) if row[8] else 0,
-                'is_active': bool(is_active),
-                'readings_count': readings_count,
-                'initial_total_dose': round(initial_total_dose, 6),
-                'final_total_dose': round(final_total_dose, 6)
-            })
-        
-        conn.close()
-        
-        return jsonify({
-            'success': True,
-            'employee_info': {
-                'employee_id': employee_id,
-                'name': emp_info[0],
-                'department': emp_info[1] or '-',
-                'position': emp_info[2] or '-'
-            },
-            'sessions': sessions,
-            'total_sessions': len(sessions)
-        })
+
+        return jsonify(dict({'success': True}, **payload))
         
     except Exception as e:
         print(f"❌ خطأ في جلب جلسات الموظف: {e}")
@@ -3892,10 +4293,140 @@ def get_employee_sessions(employee_id):
             'error': str(e)
         }), 500
 
+# أقسام /api/dashboard_bundle -> استعلامات علامة الإصدار لكل قسم (تُنفذ داخل نفس معاملة القراءة)
+# تعديل موظف لا يغيّر COUNT ولا MAX(rowid) - جيل 'employees' تزيده مشغلات الجدول عند أي كتابة
+EMPLOYEES_VERSION_QUERY = '''SELECT COUNT(*), MAX(rowid),
+                                    (SELECT generation FROM response_cache_generations WHERE name = 'employees')
+                             FROM employees'''
+# COUNT(*) مع MAX(id) حتى يغيّر حذف السجلات القديمة (الاحتفاظ، التنظيف) علامة الإصدار
+DASHBOARD_SECTIONS = {
+    'reports': ('SELECT MAX(id), COUNT(*) FROM attendance',
+                'SELECT MAX(id), COUNT(*), TOTAL(is_active) FROM employee_exposure_sessions',
+                EMPLOYEES_VERSION_QUERY),
+    'cumulative': ('SELECT MAX(last_updated), COUNT(*) FROM employee_cumulative_data',
+                   EMPLOYEES_VERSION_QUERY),
+    'alerts': ('SELECT MAX(id), COUNT(*), TOTAL(acknowledged = 0) FROM safety_alerts',),
+    'sessions': ('SELECT MAX(id), COUNT(*), TOTAL(is_active) FROM employee_exposure_sessions',
+                 'SELECT MAX(id) FROM radiation_readings_local',
+                 EMPLOYEES_VERSION_QUERY),
+}
+DEFAULT_DASHBOARD_SECTIONS = ('reports', 'cumulative', 'alerts')
+
+@app.route('/api/dashboard_bundle', methods=['GET'])
+def get_dashboard_bundle():
+    """الحالة الأولية لصفحة التقارير الموحدة في طلب واحد
+
+    كل الأقسام تُقرأ من اتصال واحد داخل معاملة قراءة واحدة فتكون من نفس اللقطة،
+    و version (وهو أيضاً ETag) يُحسب من علامات إصدار الأقسام المطلوبة داخل نفس المعاملة:
+    إذا طابق If-None-Match يُرجع 304 دون تنفيذ استعلامات الأقسام.
+    المعاملات:
+    - sections: أقسام مفصولة بفواصل من reports,cumulative,alerts,sessions (الافتراضي الثلاثة الأولى)
+    - employee_id: فلتر لكل الأقسام (مطلوب لقسم sessions)
+    - date_from, date_to, limit: كما في /api/unified_reports
+    - cumulative_fields, cumulative_shape (compact افتراضياً أو records): كما في /api/cumulative_doses_fast
+    - alerts_limit (100 افتراضياً), unread_only: كما في /api/alerts
+    كل قسم يحمل نفس محتوى الواجهة المنفردة بدون success
+    """
+    try:
+        sections = [s.strip() for s in request.args.get('sections', '').split(',') if s.strip()]
+        sections = list(dict.fromkeys(sections)) or list(DEFAULT_DASHBOARD_SECTIONS)
+        unknown = [s for s in sections if s not in DASHBOARD_SECTIONS]
+        if unknown:
+            return jsonify({'success': False, 'error': f"أقسام غير معروفة: {', '.join(unknown)}"}), 400
+
+        employee_id = request.args.get('employee_id', '')
+        if 'sessions' in sections and not employee_id:
+            return jsonify({'success': False, 'error': 'قسم sessions يتطلب employee_id'}), 400
+
+        try:
+            cumulative_shape = request.args.get('cumulative_shape', 'compact')
+            if cumulative_shape not in ('records', 'compact'):
+                raise ValueError("cumulative_shape يجب أن يكون records أو compact")
+            cumulative_fields = parse_cumulative_fields(cumulative_shape, request.args.get('cumulative_fields', ''))
+            try:
+                alerts_limit = int(request.args.get('alerts_limit', 100))
+            except ValueError:
+                raise ValueError("قيمة alerts_limit غير صالحة")
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        conn = sqlite3.connect('attendance.db')
+        try:
+            c = conn.cursor()
+            # معاملة قراءة واحدة: اللقطة تُثبت عند أول استعلام وتبقى حتى الإغلاق
+            c.execute('BEGIN')
+
+            markers = {}
+            for section in sections:
+                values = []
+                for query in DASHBOARD_SECTIONS[section]:
+                    try:
+                        values.append(c.execute(query).fetchone())
+                    except sqlite3.OperationalError:
+                        values.append(None)  # الجدول غير موجود بعد
+                markers[section] = values
+            version = make_etag(response_cache.make_key(request.endpoint, {}, request.args), markers)
+
+            matched = matching_etag(version)
+            if matched:
+                return not_modified_response(matched)
+
+            bundle = {'success': True, 'version': version, 'sections': sections}
+            if 'reports' in sections:
+                bundle['reports'] = build_unified_reports_payload(
+                    c, employee_id,
+                    date_from=request.args.get('date_from', ''),
+                    date_to=request.args.get('date_to', ''),
+                    limit=request.args.get('limit'))
+            if 'cumulative' in sections:
+                rows = fetch_cumulative_rows(c, cumulative_fields, employee_id)
+                bundle['cumulative'] = build_cumulative_payload(cumulative_fields, rows, cumulative_shape)
+            if 'alerts' in sections:
+                bundle['alerts'] = build_alerts_payload(
+                    c, employee_id,
+                    unread_only=request.args.get('unread_only', 'false').lower() == 'true',
+                    limit=alerts_limit)
+            if 'sessions' in sections:
+                sessions_payload = build_employee_sessions_payload(c, employee_id)
+                if sessions_payload is None:
+                    return jsonify({'success': False, 'error': 'لم يتم العثور على الموظف'}), 404
+                bundle['sessions'] = sessions_payload
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        finally:
+            conn.close()  # إنهاء معاملة القراءة (لا توجد كتابة)
+
+        response = jsonify(bundle)
+        response.set_etag(version)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    except Exception as e:
+        print(f"❌ خطأ في حزمة لوحة التقارير: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/session_readings/<int:session_id>', methods=['GET'])
 def get_session_readings(session_id):
-    """جلب جميع القراءات الخاصة بجلسة محددة"""
+    """جلب القراءات الخاصة بجلسة محددة
+
+    معاملات اختيارية للرسوم البيانية:
+    - max_points: أقصى عدد قراءات في الاستجابة (تقليل يحافظ على شكل السلسلة)
+    - method: lttb (افتراضي) أو minmax (أصغر/أكبر قيمة لكل دلو - يحفظ كل القمم)
+    الإحصائيات تُحسب دائماً من جميع القراءات
+    """
     try:
+        try:
+            max_points = parse_max_points(request.args.get('max_points'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        method = request.args.get('method', 'lttb')
+        if method not in DOWNSAMPLING_METHODS:
+            return jsonify({'success': False,
+                            'error': f"method يجب أن تكون: {', '.join(DOWNSAMPLING_METHODS)}"}), 400
+
         conn = sqlite3.connect('attendance.db')
         c = conn.cursor()
         
@@ -3924,20 +4455,47 @@ def get_session_readings(session_id):
                 'error': 'لم يتم العثور على الجلسة'
             }), 404
         
-        # جلب جميع قراءات الجلسة
-        c.execute('''SELECT 
-                        id,
-                        cpm,
-                        source_power,
-                        absorbed_dose_rate,
-                        total_absorbed_dose,
-                        timestamp
+        # إحصائيات القراءات في SQL (من جميع القراءات حتى عند تقليل النقاط)
+        c.execute('''SELECT COUNT(*), AVG(cpm), AVG(absorbed_dose_rate),
+                            MIN(absorbed_dose_rate), MAX(absorbed_dose_rate)
                      FROM radiation_readings_local
-                     WHERE session_id = ?
-                     ORDER BY timestamp ASC''', (session_id,))
-        
+                     WHERE session_id = ?''', (session_id,))
+        total_readings, avg_cpm, avg_absorbed_dose_rate, min_absorbed_dose_rate, max_absorbed_dose_rate = c.fetchone()
+
+        reading_columns = '''SELECT 
+                                id,
+                                cpm,
+                                source_power,
+                                absorbed_dose_rate,
+                                total_absorbed_dose,
+                                timestamp
+                             FROM radiation_readings_local'''
+        downsampled = max_points is not None and total_readings > max_points
+        if downsampled:
+            # المرور الأول بأعمدة الرسم فقط، ثم جلب الصفوف المختارة كاملة
+            c.execute('''SELECT id, julianday(timestamp), absorbed_dose_rate
+                         FROM radiation_readings_local
+                         WHERE session_id = ?
+                         ORDER BY timestamp ASC''', (session_id,))
+            series = c.fetchall()
+            times = np.fromiter((row[1] or 0.0 for row in series), dtype=float, count=len(series))
+            dose_rates = np.fromiter((row[2] or 0.0 for row in series), dtype=float, count=len(series))
+            selected_ids = [series[i][0] for i in downsample_indices(times, dose_rates, max_points, method)]
+
+            rows_by_id = {}
+            for start in range(0, len(selected_ids), 500):
+                chunk = selected_ids[start:start + 500]
+                c.execute(f"{reading_columns} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                rows_by_id.update((row[0], row) for row in c.fetchall())
+            rows = [rows_by_id[reading_id] for reading_id in selected_ids]
+        else:
+            # جلب جميع قراءات الجلسة
+            c.execute(f"{reading_columns} WHERE session_id = ? ORDER BY timestamp ASC", (session_id,))
+            rows = c.fetchall()
+        conn.close()
+
         readings = []
-        for row in c.fetchall():
+        for row in rows:
             readings.append({
                 'id': row[0],
                 'cpm': row[1],
@@ -3946,17 +4504,7 @@ def get_session_readings(session_id):
                 'total_absorbed_dose': round(row[4], 6),
                 'timestamp': row[5]
             })
-        
-        conn.close()
-        
-        # حساب إحصائيات القراءات
-        if readings:
-            avg_cpm = sum(r['cpm'] for r in readings) / len(readings)
-            avg_absorbed_dose_rate = sum(r['absorbed_dose_rate'] for r in readings) / len(readings)
-        else:
-            avg_cpm = 0
-            avg_absorbed_dose_rate = 0
-        
+
         return jsonify({
             'success': True,
             'session_info': {
@@ -3973,10 +4521,14 @@ def get_session_readings(session_id):
                 'min_dose_rate': round(session_info[10], 6) if session_info[10] else 0
             },
             'readings': readings,
-            'total_readings': len(readings),
+            'total_readings': total_readings,
+            'returned_readings': len(readings),
+            'downsampling': {'method': method, 'max_points': max_points} if downsampled else None,
             'readings_stats': {
-                'avg_cpm': round(avg_cpm, 2),
-                'avg_absorbed_dose_rate': round(avg_absorbed_dose_rate, 6)
+                'avg_cpm': round(avg_cpm or 0, 2),
+                'avg_absorbed_dose_rate': round(avg_absorbed_dose_rate or 0, 6),
+                'min_absorbed_dose_rate': round(min_absorbed_dose_rate or 0, 6),
+                'max_absorbed_dose_rate': round(max_absorbed_dose_rate or 0, 6)
             }
         })
         
@@ -4170,7 +4722,67 @@ def check_and_create_alerts(employee_id, dose_rate, daily_dose, annual_dose):
     except Exception as e:
         print(f"❌ خطأ في فحص التنبيهات: {e}")
 
+def alerts_version():
+    """علامة إصدار /api/alerts: أكبر معرف وعدد التنبيهات وعدد غير المقروءة (تتغير عند الإقرار)"""
+    try:
+        conn = sqlite3.connect('attendance.db')
+        try:
+            return conn.execute('SELECT MAX(id), COUNT(*), TOTAL(acknowledged = 0) FROM safety_alerts').fetchone()
+        finally:
+            conn.close()
+    except sqlite3.OperationalError:
+        return None  # الجدول غير موجود بعد
+
+def build_alerts_payload(c, employee_id='', unread_only=False, limit=50):
+    """آخر التنبيهات وعدد غير المقروءة باستخدام مؤشر قاعدة بيانات مفتوح (بدون success)"""
+    query = '''
+        SELECT a.id, a.employee_id, e.name, a.alert_type, a.alert_level, 
+               a.message, a.dose_value, a.threshold_value, a.timestamp, a.acknowledged
+        FROM safety_alerts a
+        LEFT JOIN employees e ON a.employee_id = e.employee_id
+        WHERE 1=1
+    '''
+    params = []
+    
+    if employee_id:
+        query += ' AND a.employee_id = ?'
+        params.append(employee_id)
+    
+    if unread_only:
+        query += ' AND a.acknowledged = 0'
+    
+    query += ' ORDER BY a.timestamp DESC LIMIT ?'
+    params.append(limit)
+    
+    c.execute(query, params)
+    
+    alerts = []
+    for row in c.fetchall():
+        alerts.append({
+            'id': row[0],
+            'employee_id': row[1],
+            'employee_name': row[2] or row[1],
+            'alert_type': row[3],
+            'alert_level': row[4],
+            'message': row[5],
+            'dose_value': row[6],
+            'threshold_value': row[7],
+            'timestamp': row[8],
+            'acknowledged': bool(row[9])
+        })
+    
+    # حساب عدد التنبيهات غير المقروءة
+    c.execute('SELECT COUNT(*) FROM safety_alerts WHERE acknowledged = 0')
+    unread_count = c.fetchone()[0]
+
+    return {
+        'alerts': alerts,
+        'total_alerts': len(alerts),
+        'unread_count': unread_count
+    }
+
 @app.route('/api/alerts', methods=['GET'])
+@conditional_response(alerts_version)
 def get_alerts():
     """API لجلب التنبيهات"""
     try:
@@ -4179,56 +4791,10 @@ def get_alerts():
         limit = int(request.args.get('limit', 50))
         
         conn = sqlite3.connect('attendance.db')
-        c = conn.cursor()
-        
-        query = '''
-            SELECT a.id, a.employee_id, e.name, a.alert_type, a.alert_level, 
-                   a.message, a.dose_value, a.threshold_value, a.timestamp, a.acknowledged
-            FROM safety_alerts a
-            LEFT JOIN employees e ON a.employee_id = e.employee_id
-            WHERE 1=1
-        '''
-        params = []
-        
-        if employee_id:
-            query += ' AND a.employee_id = ?'
-            params.append(employee_id)
-        
-        if unread_only:
-            query += ' AND a.acknowledged = 0'
-        
-        query += ' ORDER BY a.timestamp DESC LIMIT ?'
-        params.append(limit)
-        
-        c.execute(query, params)
-        
-        alerts = []
-        for row in c.fetchall():
-            alerts.append({
-                'id': row[0],
-                'employee_id': row[1],
-                'employee_name': row[2] or row[1],
-                'alert_type': row[3],
-                'alert_level': row[4],
-                'message': row[5],
-                'dose_value': row[6],
-                'threshold_value': row[7],
-                'timestamp': row[8],
-                'acknowledged': bool(row[9])
-            })
-        
-        # حساب عدد التنبيهات غير المقروءة
-        c.execute('SELECT COUNT(*) FROM safety_alerts WHERE acknowledged = 0')
-        unread_count = c.fetchone()[0]
-        
+        payload = build_alerts_payload(conn.cursor(), employee_id, unread_only, limit)
         conn.close()
         
-        return jsonify({
-            'success': True,
-            'alerts': alerts,
-            'total_alerts': len(alerts),
-            'unread_count': unread_count
-        })
+        return jsonify(dict({'success': True}, **payload))
         
     except Exception as e:
         print(f"❌ خطأ في جلب التنبيهات: {e}")
@@ -4286,6 +4852,15 @@ def acknowledge_all_alerts():
             'error': str(e)
         }), 500
 
+# تشغيل المُجدول عند الاستيراد من خادم WSGI (gunicorn) - كل عامل يبدأ مُجدوله
+# ويتنافس على عقد القيادة في قاعدة البيانات، فلا يعمل التحديث إلا في عملية واحدة
+if __name__ != '__main__' and os.getenv('SCHEDULER_AUTOSTART') == '1' and SCHEDULER_AVAILABLE:
+    try:
+        if initialize_scheduler() and global_scheduler:
+            global_scheduler.start_scheduler()
+    except Exception as e:
+        print(f"❌ فشل في تشغيل المُجدول التلقائي: {e}")
+
 if __name__ == '__main__':
     # تهيئة قواعد البيانات والنظام
     print("🚀 بدء تشغيل نظام مراقبة الإشعاع...")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+قياس أداء دوال time_utils
+Micro-benchmarks for time_utils
+
+الاستخدام:
+    python bench_time_utils.py
+    python bench_time_utils.py --number 20000 --repeat 5
+"""
+
+import argparse
+import re
+import timeit
+from datetime import datetime, timedelta
+
+from decimal import Decimal
+
+from time_utils import PrecisionTimeCalculator, quantize_exposure
+
+
+def legacy_normalize(calc, dt):
+    """التنفيذ السابق لـ normalize_datetime (للمقارنة فقط)"""
+    try:
+        if '+' in dt or 'Z' in dt:
+            if dt.endswith('Z'):
+                dt = dt.replace('Z', '+00:00')
+            return datetime.fromisoformat(dt).astimezone(calc.local_tz)
+    except ValueError:
+        pass
+
+    clean_dt_str = dt.replace('Z', '').replace('+00:00', '')
+    clean_dt_str = re.sub(r'[+-]\d{2}:\d{2}$', '', clean_dt_str)
+
+    for fmt in ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S',
+                '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return calc.local_tz.localize(datetime.strptime(clean_dt_str, fmt))
+        except ValueError:
+            continue
+    raise ValueError(f"Unable to parse datetime string: {dt}")
+
+
+def build_samples(count):
+    """توليد نصوص زمنية بالتنسيقات المخزنة في قاعدة البيانات"""
+    base = datetime(2025, 3, 1, 8, 0, 0)
+    samples = []
+    for i in range(count):
+        ts = base + timedelta(seconds=37 * i, microseconds=1234 * i)
+        if i % 3 == 0:
+            samples.append(ts.strftime('%Y-%m-%d %H:%M:%S.%f'))
+        elif i % 3 == 1:
+            samples.append(ts.strftime('%Y-%m-%d %H:%M:%S'))
+        else:
+            samples.append(ts.isoformat() + '+03:00')
+    return samples
+
+
+def report(name, seconds, calls, baseline=None):
+    """طباعة نتيجة قياس واحد"""
+    per_call_us = seconds / calls * 1e6
+    line = f"  {name:.<45} {per_call_us:8.2f} µs/call"
+    if baseline:
+        line += f"  ({baseline / seconds:5.1f}×)"
+    print(line)
+
+
+def main():
+    """الدالة الرئيسية"""
+    parser = argparse.ArgumentParser(description='قياس أداء time_utils')
+    parser.add_argument('--number', type=int, default=10000, help='عدد الاستدعاءات في كل تكرار')
+    parser.add_argument('--repeat', type=int, default=3, help='عدد التكرارات (يؤخذ الأفضل)')
+    args = parser.parse_args()
+
+    calc = PrecisionTimeCalculator()
+    unique = build_samples(args.number)
+    repeated = unique[:50] * (args.number // 50 or 1)
+
+    def run(func, data):
+        return min(timeit.repeat(lambda: [func(s) for s in data], number=1, repeat=args.repeat))
+
+    print("\n⏱️ normalize_datetime")
+    print("-" * 70)
+
+    legacy = run(lambda s: legacy_normalize(calc, s), unique)
+    report('التنفيذ السابق (strptime + localize)', legacy, len(unique))
+
+    report('المسار السريع بدون ذاكرة مؤقتة', run(calc._parse_datetime_string, unique), len(unique), legacy)
+
+    calc.clear_parse_cache()
+    report('نصوص فريدة (ذاكرة LRU)', run(calc.normalize_datetime, unique), len(unique), legacy)
+
+    legacy_repeated = run(lambda s: legacy_normalize(calc, s), repeated)
+    calc.clear_parse_cache()
+    report('نصوص متكررة (ذاكرة LRU)', run(calc.normalize_datetime, repeated), len(repeated), legacy_repeated)
+
+    print("-" * 70)
+    print(f"  ذاكرة التحليل: {calc.get_parse_cache_info()}")
+
+    print("\n⏱️ تكامل التعرض لكل فترة قراءة")
+    print("-" * 70)
+
+    rates = [0.1 + (i % 17) * 0.013 for i in range(args.number)]
+    hours = [(30 + i % 7) / 3600 for i in range(args.number)]
+
+    def decimal_path():
+        total = Decimal('0')
+        for rate, h in zip(rates, hours):
+            total += calc.calculate_precise_exposure(rate, Decimal(str(h)))
+        return total
+
+    def float_path():
+        return quantize_exposure(calc.integrate_exposure_float(rates, hours))
+
+    decimal_time = min(timeit.repeat(decimal_path, number=1, repeat=args.repeat))
+    report('Decimal + quantize لكل فترة', decimal_time, len(rates))
+    report('float64 + Neumaier + تقريب واحد', min(timeit.repeat(float_path, number=1, repeat=args.repeat)), len(rates), decimal_time)
+    print(f"  النتيجة: Decimal={decimal_path()}  float={float_path()}")
+
+
+if __name__ == "__main__":
+    main()
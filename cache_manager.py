@@ -3,6 +3,7 @@ Radiation Data Cache Manager
 إدارة التخزين المؤقت لبيانات الإشعاع المستقبلة من ESP32
 """
 
+import sqlite3
 import threading
 import time
 from datetime import datetime, timedelta
@@ -161,6 +162,91 @@ class RadiationCache:
             self.readings.clear()
             logger.info(f"🗑️ تم مسح {cleared_count} قراءة من التخزين المؤقت")
 
+class SharedLatestReading:
+    """
+    آخر قراءة لكل حساس في SQLite (جدول latest_radiation_reading بصف واحد لكل حساس)
+
+    التخزين المؤقت RadiationCache خاص بكل عملية، فمع تعدد عمال gunicorn لا يرى
+    إلا العامل الذي استقبل /data القراءة الجديدة. هذا الجدول مشترك بين العمال
+    ليعرض كل منهم نفس آخر قراءة ونفس علامة الإصدار (ETag)
+    """
+
+    def __init__(self, db_path: str, busy_timeout_ms: int = 2000):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000.0)
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    def ensure_table(self, cursor=None):
+        """إنشاء الجدول إذا لم يكن موجوداً"""
+        sql = '''CREATE TABLE IF NOT EXISTS latest_radiation_reading
+                 (sensor_id TEXT PRIMARY KEY,
+                  cpm INTEGER,
+                  source_power REAL,
+                  absorbed_dose_rate REAL,
+                  total_absorbed_dose REAL,
+                  timestamp TEXT NOT NULL)'''
+        if cursor is not None:
+            cursor.execute(sql)
+            return
+        conn = self._connect()
+        try:
+            conn.execute(sql)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def publish(self, reading: RadiationReading) -> bool:
+        """حفظ القراءة كآخر قراءة للحساس (لا تُستبدل بقراءة أقدم منها)"""
+        try:
+            conn = self._connect()
+            try:
+                conn.execute('''INSERT INTO latest_radiation_reading
+                                (sensor_id, cpm, source_power, absorbed_dose_rate, total_absorbed_dose, timestamp)
+                                VALUES (?, ?, ?, ?, ?, ?)
+                                ON CONFLICT(sensor_id) DO UPDATE SET
+                                    cpm = excluded.cpm,
+                                    source_power = excluded.source_power,
+                                    absorbed_dose_rate = excluded.absorbed_dose_rate,
+                                    total_absorbed_dose = excluded.total_absorbed_dose,
+                                    timestamp = excluded.timestamp
+                                WHERE excluded.timestamp >= latest_radiation_reading.timestamp''',
+                             (reading.sensor_id, reading.cpm, reading.source_power, reading.absorbed_dose_rate,
+                              reading.total_absorbed_dose, reading.timestamp.isoformat()))
+                conn.commit()
+            finally:
+                conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"❌ فشل حفظ آخر قراءة مشتركة: {e}")
+            return False
+
+    def get_latest(self) -> Optional[RadiationReading]:
+        """أحدث قراءة من كل الحساسات، أو None إذا لم تصل قراءة بعد"""
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute('''SELECT sensor_id, cpm, source_power, absorbed_dose_rate,
+                                             total_absorbed_dose, timestamp
+                                      FROM latest_radiation_reading
+                                      ORDER BY timestamp DESC LIMIT 1''').fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ تعذر قراءة آخر قراءة مشتركة: {e}")
+            return None
+        if not row:
+            return None
+
+        sensor_id, cpm, source_power, absorbed_dose_rate, total_absorbed_dose, timestamp = row
+        reading = RadiationReading(cpm, source_power, absorbed_dose_rate, total_absorbed_dose, sensor_id)
+        reading.timestamp = datetime.fromisoformat(timestamp)
+        reading.saved_to_db = True  # لا يحفظها خيط الخلفية مرة أخرى
+        return reading
+
 # إنشاء كائن عام للتخزين المؤقت
 radiation_cache = RadiationCache()
 
@@ -11,6 +11,8 @@ Advanced Database Cleanup Tool
 4. تنظيف قراءات الإشعاع فقط
 5. تنظيف جلسات التعرض فقط
 6. تنظيف الصور فقط
+7. تطبيق سياسات الاحتفاظ حسب العمر (--retention) مع إمكانية العد فقط (--dry-run)
+8. ترحيل قاعدة البيانات إلى auto_vacuum=INCREMENTAL مرة واحدة (--vacuum-migrate)
 """
 
 import sqlite3
@@ -19,6 +21,9 @@ import shutil
 from datetime import datetime
 import argparse
 
+from retention import RetentionEngine
+from db_maintenance import DatabaseMaintenanceManager
+
 class AdvancedDatabaseCleanup:
     """فئة تنظيف قاعدة البيانات المتقدمة"""
     
@@ -111,6 +116,11 @@ class AdvancedDatabaseCleanup:
             count = cursor.fetchone()[0]
             
             cursor.execute("DELETE FROM radiation_readings_local")
+            try:
+                # عدد القراءات المحفوظ في الجلسات لم يعد صحيحاً
+                cursor.execute("UPDATE employee_exposure_sessions SET readings_count = NULL")
+            except sqlite3.OperationalError:
+                pass  # العمود غير موجود في قواعد البيانات القديمة
             conn.commit()
             conn.close()
             
@@ -131,6 +141,11 @@ class AdvancedDatabaseCleanup:
             count = cursor.fetchone()[0]
             
             cursor.execute("DELETE FROM employee_exposure_sessions")
+            try:
+                # سجل الجرعات اليومية مشتق من الجلسات
+                cursor.execute("DELETE FROM employee_daily_dose")
+            except sqlite3.OperationalError:
+                pass  # الجدول غير موجود في قواعد البيانات القديمة
             conn.commit()
             conn.close()
             
@@ -216,6 +231,52 @@ class AdvancedDatabaseCleanup:
         
         return True
     
+    def apply_retention(self, readings_days=None, alerts_days=None, dry_run=False):
+        """تطبيق سياسات الاحتفاظ حسب العمر (حذف على دفعات صغيرة)"""
+        try:
+            engine = RetentionEngine(self.db_path)
+            summary = engine.run({'radiation_readings_local': readings_days,
+                                  'safety_alerts': alerts_days}, dry_run=dry_run)
+            
+            title = "تشغيل تجريبي - لن يتم حذف أي بيانات" if dry_run else "تطبيق سياسات الاحتفاظ"
+            print(f"\n🗓️ {title}:")
+            print("-" * 60)
+            for table, result in summary['tables'].items():
+                if 'error' in result:
+                    print(f"  ⚠️ {table}: {result['error']}")
+                elif dry_run:
+                    print(f"  {table:.<40} {result['expired_rows']:>7} صف أقدم من {result['retention_days']:g} يوم")
+                else:
+                    print(f"  {table:.<40} {result['deleted_rows']:>7} صف محذوف ({result['batches']} دفعة)")
+            print("-" * 60)
+            print(f"  المدة: {summary['duration_seconds']} ثانية")
+            return True
+            
+        except Exception as e:
+            print(f"❌ فشل تطبيق سياسات الاحتفاظ: {e}")
+            return False
+    
+    def migrate_incremental_vacuum(self):
+        """ترحيل قاعدة البيانات إلى auto_vacuum=INCREMENTAL (VACUUM كامل - يُفضل والخادم متوقف)"""
+        try:
+            manager = DatabaseMaintenanceManager(self.db_path, busy_timeout_ms=30000)
+            conn = sqlite3.connect(self.db_path)
+            mode = manager.get_auto_vacuum_mode(conn.cursor())
+            conn.close()
+            if mode == 'INCREMENTAL':
+                print("✅ قاعدة البيانات في وضع auto_vacuum=INCREMENTAL بالفعل")
+                return True
+            
+            print(f"ℹ️ الوضع الحالي: auto_vacuum={mode}")
+            if not manager.migrate_to_incremental_vacuum():
+                print("❌ لم يتغير وضع auto_vacuum")
+                return False
+            return True
+            
+        except Exception as e:
+            print(f"❌ فشل ترحيل auto_vacuum: {e}")
+            return False
+    
     def show_menu(self):
         """عرض القائمة التفاعلية"""
         print("\n" + "=" * 60)
@@ -333,6 +394,12 @@ def main():
     parser.add_argument('--images', action='store_true', help='تنظيف الصور')
     parser.add_argument('--stats', action='store_true', help='عرض الإحصائيات')
     parser.add_argument('--no-backup', action='store_true', help='بدون نسخة احتياطية')
+    parser.add_argument('--retention', action='store_true', help='تطبيق سياسات الاحتفاظ حسب العمر')
+    parser.add_argument('--readings-days', type=float, help='أيام الاحتفاظ بقراءات الإشعاع (الافتراضي من الإعدادات)')
+    parser.add_argument('--alerts-days', type=float, help='أيام الاحتفاظ بالتنبيهات المُقَر بها (الافتراضي من الإعدادات)')
+    parser.add_argument('--dry-run', action='store_true', help='عرض عدد الصفوف التي ستُحذف فقط')
+    parser.add_argument('--vacuum-migrate', action='store_true',
+                        help='ترحيل قاعدة البيانات إلى auto_vacuum=INCREMENTAL (VACUUM كامل مرة واحدة)')
     
     args = parser.parse_args()
     
@@ -340,7 +407,7 @@ def main():
     
     # إذا لم يتم تحديد أي خيار، تشغيل الوضع التفاعلي
     if not any([args.all, args.employees, args.attendance, args.radiation, 
-                args.exposure, args.images, args.stats]):
+                args.exposure, args.images, args.stats, args.retention, args.vacuum_migrate]):
         cleanup.run_interactive()
         return
     
@@ -349,6 +416,16 @@ def main():
         cleanup.get_stats()
         return
     
+    # VACUUM يكتب نسخة جديدة من الملف ولا يحذف بيانات
+    if args.vacuum_migrate:
+        cleanup.migrate_incremental_vacuum()
+        return
+    
+    # الحذف المجزأ لا يحتاج نسخة احتياطية كاملة (ولا نسخ في التشغيل التجريبي)
+    if args.retention:
+        cleanup.apply_retention(args.readings_days, args.alerts_days, dry_run=args.dry_run)
+        return
+    
     if not args.no_backup:
         cleanup.create_backup()
     
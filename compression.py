@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ضغط استجابات JSON/CSV حسب ما يقبله العميل (brotli ثم gzip)
+
+- يُطبق بعد الطلب (after_request) فلا تتغير الواجهات نفسها
+- استجابات أصغر من حد معين لا تُضغط (تكلفة المعالج أكبر من التوفير)
+- الاستجابات المتدفقة (مثل /api/export) تُضغط جزءاً بجزء مع flush بعد كل جزء
+- يمكن تعديل الإعدادات أو تعطيل الضغط لكل واجهة بالمُزخرفين compress و no_compress
+
+brotli اختياري: إذا لم تكن المكتبة مثبتة يُستخدم gzip فقط
+"""
+
+import gzip
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+# أنواع المحتوى التي تستفيد من الضغط
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'text/csv',
+    'text/html', 'text/plain', 'text/css', 'application/javascript'
+}
+
+# لاحقة ETag لكل ترميز - النسخة المضغوطة كيان مختلف بايتياً عن غير المضغوطة
+ETAG_SUFFIXES = {'br': 'br', 'gzip': 'gz'}
+
+def compress(enabled=True, min_size=None, gzip_level=None, brotli_quality=None):
+    """
+    مُزخرف لإعدادات الضغط الخاصة بواجهة (يوضع مباشرة تحت @app.route)
+
+    القيم None تعني استخدام الإعدادات العامة لـ ResponseCompressor
+    """
+    options = {'enabled': enabled, 'min_size': min_size,
+               'gzip_level': gzip_level, 'brotli_quality': brotli_quality}
+
+    def decorator(view):
+        view.compression_options = options
+        return view
+    return decorator
+
+def no_compress(view):
+    """تعطيل الضغط لواجهة (استجابات حية صغيرة تُستطلع كل ثوانٍ)"""
+    return compress(enabled=False)(view)
+
+class ResponseCompressor:
+    """ضغط الاستجابات بعد الطلب حسب Accept-Encoding"""
+
+    def __init__(self, app=None, min_size=1024, gzip_level=6, brotli_quality=4):
+        """
+        :param min_size: أصغر حجم (بايت) يستحق الضغط
+        :param gzip_level: مستوى gzip (1-9)
+        :param brotli_quality: جودة brotli (0-11) - القيم المنخفضة أسرع وتناسب الاستجابات الديناميكية
+        """
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats = {'compressed': 0, 'streamed': 0, 'skipped_small': 0,
+                      'bytes_in': 0, 'bytes_out': 0, 'by_encoding': {}}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.after_request)
+
+    def _route_options(self):
+        view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+        options = getattr(view, 'compression_options', None) or {}
+        return {
+            'enabled': options.get('enabled', True),
+            'min_size': options.get('min_size') if options.get('min_size') is not None else self.min_size,
+            'gzip_level': options.get('gzip_level') or self.gzip_level,
+            'brotli_quality': options.get('brotli_quality') if options.get('brotli_quality') is not None
+                              else self.brotli_quality
+        }
+
+    @staticmethod
+    def choose_encoding():
+        """أفضل ترميز يقبله العميل: br ثم gzip (None إذا لا يقبل أياً منهما)"""
+        accepted = request.accept_encodings
+        if BROTLI_AVAILABLE and accepted.quality('br') > 0:
+            return 'br'
+        if accepted.quality('gzip') > 0:
+            return 'gzip'
+        return None
+
+    def _compress_bytes(self, data, encoding, options):
+        if encoding == 'br':
+            return brotli.compress(data, quality=options['brotli_quality'])
+        return gzip.compress(data, compresslevel=options['gzip_level'])
+
+    def _compress_stream(self, source, encoding, options):
+        """ضغط تدفق جزءاً بجزء - flush بعد كل جزء حتى يصل للعميل فوراً"""
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=options['brotli_quality'])
+            process, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(options['gzip_level'], zlib.DEFLATED, 31)  # 31 = ترويسة gzip
+            process = compressor.compress
+            flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            finish = compressor.flush
+        try:
+            for chunk in source:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = process(chunk) + flush()
+                if data:
+                    yield data
+            yield finish()
+        finally:
+            # تمرير الإغلاق للمولد الأصلي (إغلاق اتصال قاعدة البيانات عند انقطاع العميل)
+            if hasattr(source, 'close'):
+                source.close()
+
+    def after_request(self, response):
+        if (request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        options = self._route_options()
+        if not options['enabled']:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.response, encoding, options)
+            response.direct_passthrough = False
+            response.headers.pop('Content-Length', None)
+            self.stats['streamed'] += 1
+        else:
+            data = response.get_data()
+            if len(data) < options['min_size']:
+                self.stats['skipped_small'] += 1
+                return response
+            compressed = self._compress_bytes(data, encoding, options)
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+            self.stats['compressed'] += 1
+            self.stats['bytes_in'] += len(data)
+            self.stats['bytes_out'] += len(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        self.stats['by_encoding'][encoding] = self.stats['by_encoding'].get(encoding, 0) + 1
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{ETAG_SUFFIXES[encoding]}", weak)
+        return response
+
+    def get_stats(self):
+        stats = dict(self.stats, by_encoding=dict(self.stats['by_encoding']))
+        stats['brotli_available'] = BROTLI_AVAILABLE
+        stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else None
+        return stats
@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+حساب البيانات التراكمية للموظفين
+منطق مشترك بين API التحديث (/api/update_cumulative_data) ومُجدول البيانات التراكمية
+
+يتم الحساب لمجموعة الموظفين كاملة بتمريرة SQL مجمَّعة واحدة ثم executemany واحد
+بدلاً من عدة استعلامات لكل موظف ولكل جلسة
+"""
+
+import json
+from datetime import datetime, timedelta
+
+# الحد الأقصى لعدد المعاملات في IN (...) - أقل من حد SQLite الافتراضي (999)
+_IN_CHUNK_SIZE = 500
+
+# =================================================================
+# تتبع الموظفين الذين تغيرت بياناتهم (سجل التغييرات)
+# =================================================================
+
+def init_change_tracking(cursor):
+    """إنشاء جدول الموظفين المتغيرين إذا لم يكن موجوداً"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cumulative_dirty_employees (
+            employee_id TEXT PRIMARY KEY,
+            marked_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def mark_employees_dirty(cursor, employee_ids):
+    """
+    تعليم موظفين كـ "متغيرين" ليعيد المُجدول حساب بياناتهم التراكمية
+
+    تُستدعى ضمن نفس المعاملة التي تكتب الجلسة أو القراءة - لا تقوم بـ commit
+    """
+    cursor.executemany(
+        "INSERT OR REPLACE INTO cumulative_dirty_employees (employee_id, marked_at) VALUES (?, CURRENT_TIMESTAMP)",
+        [(employee_id,) for employee_id in set(employee_ids) if employee_id]
+    )
+
+def pop_dirty_employees(cursor):
+    """
+    سحب قائمة الموظفين المتغيرين وحذفهم من السجل
+
+    يجب أن تتم إعادة الحساب ضمن نفس المعاملة حتى لا تضيع التغييرات عند الفشل
+
+    Returns:
+        list: أرقام الموظفين
+    """
+    cursor.execute('SELECT employee_id FROM cumulative_dirty_employees')
+    employee_ids = [row[0] for row in cursor.fetchall()]
+    cursor.executemany('DELETE FROM cumulative_dirty_employees WHERE employee_id = ?',
+                       [(employee_id,) for employee_id in employee_ids])
+    return employee_ids
+
+
+# =================================================================
+# سجل الجرعات اليومية لكل موظف (employee_daily_dose)
+# =================================================================
+
+def init_daily_dose_ledger(cursor):
+    """
+    إنشاء جدول الجرعات اليومية (صف واحد لكل موظف ولكل يوم)
+
+    يُملأ من الجلسات المغلقة الموجودة عند إنشائه لأول مرة
+    """
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'employee_daily_dose'")
+    exists = cursor.fetchone() is not None
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS employee_daily_dose (
+            employee_id TEXT NOT NULL,
+            dose_date DATE NOT NULL,
+            total_exposure REAL DEFAULT 0.0,
+            sessions_count INTEGER DEFAULT 0,
+            duration_minutes INTEGER DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (employee_id, dose_date)
+        )
+    ''')
+    # فهرس مغطٍّ لجمع الجرعات: قراءة نطاق الموظف من الفهرس وحده دون الرجوع لصفوف الجدول
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_employee_daily_dose_covering
+                      ON employee_daily_dose (employee_id, dose_date, total_exposure)''')
+
+    if not exists:
+        rebuild_daily_dose_ledger(cursor)
+
+# تجميع يوم واحد من الجلسات المغلقة - الجرعات غير الموجبة لا تُحتسب
+_LEDGER_SELECT = '''
+    SELECT employee_id, session_date,
+           TOTAL(CASE WHEN total_exposure > 0 THEN total_exposure END),
+           COUNT(*),
+           SUM(COALESCE(exposure_duration_minutes, 0)),
+           CURRENT_TIMESTAMP
+    FROM employee_exposure_sessions
+    WHERE is_active = 0 AND session_date IS NOT NULL {where}
+    GROUP BY employee_id, session_date
+'''
+
+def rebuild_daily_dose_ledger(cursor):
+    """إعادة بناء سجل الجرعات اليومية بالكامل من جدول الجلسات"""
+    cursor.execute('DELETE FROM employee_daily_dose')
+    cursor.execute('INSERT INTO employee_daily_dose ' + _LEDGER_SELECT.format(where=''))
+
+def refresh_daily_dose_ledger(cursor, employee_id, dose_date):
+    """
+    إعادة حساب صف يوم واحد لموظف من جلساته المغلقة
+
+    تُستدعى عند إغلاق جلسة ضمن نفس المعاملة (لا تقوم بـ commit).
+    الحساب من الجلسات (وليس بالإضافة) يجعل الاستدعاء المتكرر آمناً
+    """
+    cursor.execute('DELETE FROM employee_daily_dose WHERE employee_id = ? AND dose_date = ?',
+                   (employee_id, str(dose_date)))
+    cursor.execute('INSERT INTO employee_daily_dose ' +
+                   _LEDGER_SELECT.format(where='AND employee_id = ? AND session_date = ?'),
+                   (employee_id, str(dose_date)))
+
+def dose_window_starts(today=None):
+    """بدايات الفترات (يومي/أسبوعي/شهري/سنوي) كنصوص ISO لمقارنتها بالتواريخ المخزنة"""
+    today = today or datetime.now().date()
+    return {
+        'today': str(today),
+        'week_start': str(today - timedelta(days=7)),
+        'month_start': str(today - timedelta(days=30)),
+        'year_start': str(today - timedelta(days=365)),
+    }
+
+_WINDOWS_QUERY = '''
+    SELECT employee_id,
+           TOTAL(CASE WHEN dose_date = :today THEN total_exposure END),
+           TOTAL(CASE WHEN dose_date >= :week_start THEN total_exposure END),
+           TOTAL(CASE WHEN dose_date >= :month_start THEN total_exposure END),
+           TOTAL(total_exposure)
+    FROM employee_daily_dose
+    WHERE dose_date >= :year_start {where}
+    GROUP BY employee_id
+'''
+
+def _in_chunks(cursor, query, params, employee_ids, column):
+    """تنفيذ استعلام مُجمَّع على دفعات من الموظفين باستخدام IN (...)"""
+    if employee_ids is None:
+        cursor.execute(query.format(where=''), params)
+        return cursor.fetchall()
+
+    rows = []
+    for start in range(0, len(employee_ids), _IN_CHUNK_SIZE):
+        chunk = employee_ids[start:start + _IN_CHUNK_SIZE]
+        chunk_params = dict(params, **{f'e{i}': employee_id for i, employee_id in enumerate(chunk)})
+        where = f'AND {column} IN (' + ', '.join(f':e{i}' for i in range(len(chunk))) + ')'
+        cursor.execute(query.format(where=where), chunk_params)
+        rows.extend(cursor.fetchall())
+    return rows
+
+def fetch_dose_windows(cursor, employee_ids=None, today=None):
+    """
+    الجرعات اليومية/الأسبوعية/الشهرية/السنوية من سجل الجرعات اليومية
+
+    يقرأ 366 صفاً على الأكثر لكل موظف بدلاً من كامل تاريخ الجلسات
+
+    Returns:
+        dict: {employee_id: (daily, weekly, monthly, annual)}
+    """
+    if employee_ids is not None:
+        employee_ids = list(dict.fromkeys(employee_ids))
+    rows = _in_chunks(cursor, _WINDOWS_QUERY, dose_window_starts(today), employee_ids, 'employee_id')
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+_DOSE_SUMMARY_QUERY = '''
+    SELECT e.employee_id{columns},
+           COALESCE((SELECT total_exposure FROM employee_daily_dose
+                     WHERE employee_id = e.employee_id AND dose_date = :today), 0.0),
+           (SELECT TOTAL(total_exposure) FROM employee_daily_dose
+            WHERE employee_id = e.employee_id)
+    FROM employees e
+    WHERE {where}
+    ORDER BY e.name, e.employee_id
+'''
+
+def fetch_dose_summaries(cursor, employee_ids=None, department=None, today=None, columns=()):
+    """
+    الجرعة اليومية والتراكمية لمجموعة موظفين باستعلام واحد مرتب بالاسم
+
+    نسخة جماعية من get_daily_dose + get_total_dose لواجهات الملخص متعددة الموظفين:
+    لكل موظف: صف اليوم بحث مباشر في المفتاح الأساسي، والإجمالي مرور واحد على نطاقه
+    في الفهرس المغطّي (employee_id, dose_date, total_exposure) دون قراءة صفوف الجدول
+    ودون GROUP BY على كامل النتيجة.
+    قائمة الموظفين تُمرر كمعامل JSON واحد (json_each) فلا تتجزأ إلى دفعات IN
+
+    Args:
+        employee_ids: قائمة الموظفين، أو None مع department
+        columns: أعمدة إضافية من جدول الموظفين (الاسم المستعار e) تُعاد بعد employee_id
+
+    Returns:
+        list: صفوف (employee_id, *columns, daily, total) -
+              الموظفون غير الموجودين في جدول employees لا يظهرون
+    """
+    params = {'today': str(today or datetime.now().date())}
+    if employee_ids is not None:
+        where = 'e.employee_id IN (SELECT value FROM json_each(:employee_ids))'
+        params['employee_ids'] = json.dumps(list(employee_ids))
+    else:
+        where = 'e.department = :department'
+        params['department'] = department
+    query = _DOSE_SUMMARY_QUERY.format(columns=''.join(f', {column}' for column in columns), where=where)
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+def get_total_dose(cursor, employee_id):
+    """الجرعة التراكمية الإجمالية لموظف من سجل الجرعات اليومية"""
+    cursor.execute('SELECT TOTAL(total_exposure) FROM employee_daily_dose WHERE employee_id = ?',
+                   (employee_id,))
+    return cursor.fetchone()[0]
+
+def get_daily_dose(cursor, employee_id, dose_date):
+    """جرعة يوم واحد لموظف من سجل الجرعات اليومية"""
+    cursor.execute('SELECT total_exposure FROM employee_daily_dose WHERE employee_id = ? AND dose_date = ?',
+                   (employee_id, str(dose_date)))
+    row = cursor.fetchone()
+    return row[0] if row else 0.0
+
+
+# =================================================================
+# محرك الحساب المجمَّع
+# =================================================================
+
+def init_cumulative_storage(cursor):
+    """
+    تهيئة ما يحتاجه محرك الحساب المجمَّع في جدول الجلسات
+
+    - فهرس (employee_id, session_date) للتجميع والتصفية حسب الموظف
+    - عمود readings_count: عدد قراءات الجلسة، يُحفظ عند إغلاقها
+    """
+    try:
+        cursor.execute("ALTER TABLE employee_exposure_sessions ADD COLUMN readings_count INTEGER")
+        # ملء العمود للجلسات المغلقة الموجودة (مرة واحدة عند إضافة العمود)
+        cursor.execute('''
+            UPDATE employee_exposure_sessions
+            SET readings_count = (SELECT COUNT(*) FROM radiation_readings_local r
+                                  WHERE r.session_id = employee_exposure_sessions.id)
+            WHERE is_active = 0
+        ''')
+    except Exception:
+        pass  # العمود موجود بالفعل
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_exposure_sessions_employee_date
+                      ON employee_exposure_sessions (employee_id, session_date)''')
+
+# حدود الأمان (μSv)
+DAILY_LIMIT = 54.8
+WEEKLY_LIMIT = 383.6
+MONTHLY_LIMIT = 1643.8
+ANNUAL_LIMIT = 20000.0
+
+# أعمدة جدول employee_cumulative_data بنفس ترتيب الصفوف الناتجة عن build_cumulative_rows
+CUMULATIVE_COLUMNS = (
+    'employee_id', 'total_sessions', 'completed_sessions', 'active_sessions',
+    'total_duration_minutes', 'total_duration_hours', 'average_session_duration_minutes',
+    'total_cumulative_exposure', 'average_exposure_per_session', 'average_dose_rate_per_hour',
+    'max_single_session_exposure', 'min_single_session_exposure',
+    'daily_exposure', 'weekly_exposure', 'monthly_exposure', 'annual_exposure',
+    'daily_exposure_percentage', 'weekly_exposure_percentage',
+    'monthly_exposure_percentage', 'annual_exposure_percentage',
+    'total_readings', 'average_readings_per_session',
+    'first_session_date', 'last_session_date', 'last_completed_session_date',
+    'safety_status', 'safety_class', 'risk_level', 'last_updated'
+)
+
+# استعلام مجمَّع واحد لجميع الموظفين: الجلسة "المكتملة" هي is_active = 0 مع total_exposure غير فارغ
+# - الجرعات حسب الفترات تُقرأ من سجل الجرعات اليومية (fetch_dose_windows)
+# - عدد القراءات يؤخذ من readings_count المحفوظ عند إغلاق الجلسة، ويُحسب مباشرة للجلسات النشطة
+_AGGREGATE_QUERY = '''
+    SELECT
+        s.employee_id,
+        COUNT(*) AS total_sessions,
+        SUM(s.is_active = 0) AS completed_sessions,
+        SUM(s.is_active = 1) AS active_sessions,
+        SUM(CASE WHEN s.is_active = 0 AND s.total_exposure IS NOT NULL
+                 THEN COALESCE(s.exposure_duration_minutes, 0) ELSE 0 END) AS total_duration_minutes,
+        TOTAL(CASE WHEN s.is_active = 0 THEN s.total_exposure END) AS total_exposure,
+        COALESCE(MAX(CASE WHEN s.is_active = 0 THEN s.total_exposure END), 0.0) AS max_exposure,
+        COALESCE(MIN(CASE WHEN s.is_active = 0 THEN s.total_exposure END), 0.0) AS min_exposure,
+        SUM(COALESCE(s.readings_count,
+                     (SELECT COUNT(*) FROM radiation_readings_local r WHERE r.session_id = s.id))) AS total_readings,
+        CASE WHEN SUM(s.session_date IS NULL) > 0 THEN NULL ELSE MIN(s.session_date) END AS first_session_date,
+        MAX(s.session_date) AS last_session_date,
+        MAX(CASE WHEN s.is_active = 0 THEN s.session_date END) AS last_completed_session_date
+    FROM employee_exposure_sessions s
+    WHERE 1=1 {where}
+    GROUP BY s.employee_id
+'''
+
+def classify_annual_safety(annual_percentage):
+    """حالة الأمان حسب نسبة الجرعة السنوية: (safety_status, safety_class, risk_level)"""
+    if annual_percentage >= 100:
+        return "خطر - تجاوز الحد السنوي", "danger", "عالي جداً"
+    elif annual_percentage >= 80:
+        return "تحذير - اقتراب من الحد السنوي", "warning", "عالي"
+    elif annual_percentage >= 50:
+        return "مراقبة - نصف الحد السنوي", "info", "متوسط"
+    return "آمن", "success", "منخفض"
+
+def _build_row(aggregate, windows, last_updated):
+    """تحويل صف الاستعلام المجمَّع وجرعات الفترات إلى صف employee_cumulative_data"""
+    (employee_id, total_sessions, completed_sessions, active_sessions,
+     total_duration_minutes, total_exposure, max_exposure, min_exposure,
+     total_readings, first_session_date, last_session_date, last_completed_session_date) = aggregate
+    daily_exposure, weekly_exposure, monthly_exposure, annual_exposure = windows
+
+    completed_sessions = completed_sessions or 0
+    total_duration_hours = total_duration_minutes / 60
+    annual_percentage = annual_exposure / ANNUAL_LIMIT * 100
+
+    return (
+        employee_id,
+        total_sessions, completed_sessions, active_sessions or 0,
+        total_duration_minutes, total_duration_hours, total_duration_minutes / max(completed_sessions, 1),
+        total_exposure, total_exposure / max(completed_sessions, 1), total_exposure / max(total_duration_hours, 1),
+        max_exposure, min_exposure,
+        daily_exposure, weekly_exposure, monthly_exposure, annual_exposure,
+        daily_exposure / DAILY_LIMIT * 100, weekly_exposure / WEEKLY_LIMIT * 100,
+        monthly_exposure / MONTHLY_LIMIT * 100, annual_percentage,
+        total_readings, total_readings / max(total_sessions, 1),
+        first_session_date, last_session_date, last_completed_session_date,
+        *classify_annual_safety(annual_percentage),
+        last_updated
+    )
+
+def build_cumulative_rows(cursor, employee_ids=None, today=None):
+    """
+    حساب البيانات التراكمية لمجموعة موظفين بتمريرة SQL مجمَّعة واحدة على الجلسات
+    واستعلام واحد على سجل الجرعات اليومية للفترات
+
+    Args:
+        employee_ids: قائمة الموظفين (None = جميع الموظفين ذوي الجلسات)
+        today: تاريخ اليوم المرجعي للفترات (افتراضياً تاريخ اليوم)
+
+    Returns:
+        list: صفوف بترتيب CUMULATIVE_COLUMNS
+    """
+    if employee_ids is not None:
+        employee_ids = list(dict.fromkeys(employee_ids))
+    last_updated = datetime.now().isoformat()
+
+    aggregates = _in_chunks(cursor, _AGGREGATE_QUERY, {}, employee_ids, 's.employee_id')
+    windows = fetch_dose_windows(cursor, employee_ids, today)
+    no_dose = (0.0, 0.0, 0.0, 0.0)
+    rows = [_build_row(row, windows.get(row[0], no_dose), last_updated) for row in aggregates]
+
+    # الموظفون المطلوبون بدون جلسات يحصلون على صف صفري (كما في الحساب السابق)
+    if employee_ids is not None:
+        found = {row[0] for row in rows}
+        for employee_id in employee_ids:
+            if employee_id not in found:
+                rows.append(_build_row((employee_id, 0, 0, 0, 0, 0.0, 0.0, 0.0, 0, None, None, None),
+                                       no_dose, last_updated))
+    return rows
+
+def calculate_employee_cumulative_data(cursor, employee_id):
+    """حساب البيانات التراكمية لموظف محدد (قاموس بأسماء الأعمدة)"""
+    row = build_cumulative_rows(cursor, [employee_id])[0]
+    return dict(zip(CUMULATIVE_COLUMNS[1:-1], row[1:-1]))
+
+def update_employees_cumulative_data(cursor, employee_ids=None):
+    """
+    إعادة حساب وحفظ البيانات التراكمية لقائمة موظفين (أو جميع الموظفين ذوي الجلسات)
+
+    استعلام مجمَّع واحد ثم executemany واحد - لا تقوم بـ commit، المسؤولية على المستدعي
+
+    Returns:
+        int: عدد الموظفين الذين تم تحديثهم
+    """
+    rows = build_cumulative_rows(cursor, employee_ids)
+    cursor.executemany(
+        f"INSERT OR REPLACE INTO employee_cumulative_data ({', '.join(CUMULATIVE_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in CUMULATIVE_COLUMNS)})",
+        rows
+    )
+    return len(rows)
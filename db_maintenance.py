@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+إدارة ملف WAL واستعادة المساحة في قاعدة البيانات
+
+- نقاط تفتيش (checkpoint) حسب حجم ملف -wal: PASSIVE عند تجاوز الحد الأول
+  وTRUNCATE عند تجاوز الحد الثاني لإعادة الملف إلى الصفر
+- ترحيل قاعدة البيانات القديمة إلى auto_vacuum=INCREMENTAL خطوة إدارية صريحة
+  (VACUUM كامل يعيد كتابة الملف): python cleanup_advanced.py --vacuum-migrate
+- المهمة الدورية تشغل incremental_vacuum بميزانية صفحات صغيرة لكل خطوة مع busy_timeout،
+  فكل خطوة معاملة قصيرة تتناوب مع حفظ القراءات بدلاً من انتظار توقفها
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# أوضاع auto_vacuum كما يعيدها PRAGMA auto_vacuum
+AUTO_VACUUM_MODES = {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}
+
+class DatabaseMaintenanceManager:
+    """مدير نقاط تفتيش WAL واستعادة المساحة"""
+
+    def __init__(self, db_path='attendance.db',
+                 passive_checkpoint_bytes=4 * 1024 * 1024,
+                 truncate_checkpoint_bytes=64 * 1024 * 1024,
+                 vacuum_pages_per_step=256, vacuum_max_steps=20,
+                 busy_timeout_ms=2000):
+        """
+        :param passive_checkpoint_bytes: حجم WAL الذي يبدأ عنده checkpoint من نوع PASSIVE
+        :param truncate_checkpoint_bytes: حجم WAL الذي يبدأ عنده checkpoint من نوع TRUNCATE
+        :param vacuum_pages_per_step: عدد الصفحات المستعادة في كل خطوة incremental_vacuum
+        :param vacuum_max_steps: أقصى عدد خطوات في كل تشغيل (الميزانية = الخطوات × الصفحات)
+        :param busy_timeout_ms: مهلة انتظار الأقفال حتى لا تتعطل عمليات الحفظ
+        """
+        self.db_path = db_path
+        self.passive_checkpoint_bytes = passive_checkpoint_bytes
+        self.truncate_checkpoint_bytes = truncate_checkpoint_bytes
+        self.vacuum_pages_per_step = vacuum_pages_per_step
+        self.vacuum_max_steps = vacuum_max_steps
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._lock = threading.Lock()
+        self.stats = {
+            'checkpoints': {'PASSIVE': 0, 'TRUNCATE': 0},
+            'busy_checkpoints': 0,
+            'last_checkpoint': None,
+            'last_full_checkpoint_at': None,
+            'auto_vacuum_migrated_at': None,
+            'vacuum_runs': 0,
+            'pages_reclaimed': 0,
+            'last_vacuum_at': None,
+            'busy_vacuum_steps': 0,
+            'migration_required': False
+        }
+
+    @property
+    def wal_path(self):
+        return self.db_path + '-wal'
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    def get_wal_size(self):
+        """حجم ملف -wal بالبايت (0 إذا لم يكن موجوداً)"""
+        try:
+            return os.path.getsize(self.wal_path)
+        except OSError:
+            return 0
+
+    def seconds_since_last_reading(self, cursor):
+        """الثواني منذ آخر قراءة إشعاع محفوظة (None إذا لا توجد قراءات)"""
+        try:
+            # آخر صف حسب rowid بدلاً من MAX(timestamp) لتفادي مسح الجدول
+            cursor.execute('''SELECT (julianday('now') - julianday(timestamp)) * 86400
+                              FROM radiation_readings_local ORDER BY id DESC LIMIT 1''')
+            row = cursor.fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row and row[0] is not None else None
+
+    def checkpoint(self, mode='PASSIVE', conn=None):
+        """
+        تنفيذ checkpoint وتسجيل نتيجته
+
+        :return: (busy, wal_frames, checkpointed_frames)
+        """
+        mode = mode.upper()
+        if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f"وضع checkpoint غير معروف: {mode}")
+
+        own_conn = conn is None
+        conn = conn or self._connect()
+        try:
+            started = time.time()
+            busy, wal_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+            duration = time.time() - started
+        finally:
+            if own_conn:
+                conn.close()
+
+        with self._lock:
+            self.stats['checkpoints'][mode] = self.stats['checkpoints'].get(mode, 0) + 1
+            if busy:
+                self.stats['busy_checkpoints'] += 1
+            elif wal_frames == checkpointed:
+                self.stats['last_full_checkpoint_at'] = time.time()
+            self.stats['last_checkpoint'] = {
+                'mode': mode,
+                'at': datetime.now().isoformat(),
+                'busy': bool(busy),
+                'wal_frames': wal_frames,
+                'checkpointed_frames': checkpointed,
+                'duration_seconds': round(duration, 4)
+            }
+        return busy, wal_frames, checkpointed
+
+    def run_checkpoint_cycle(self):
+        """
+        اختيار نوع checkpoint حسب حجم ملف WAL (مهمة دورية سريعة)
+
+        :return: نوع checkpoint المنفذ أو None إذا كان الملف صغيراً
+        """
+        wal_size = self.get_wal_size()
+        if wal_size >= self.truncate_checkpoint_bytes:
+            mode = 'TRUNCATE'
+        elif wal_size >= self.passive_checkpoint_bytes:
+            mode = 'PASSIVE'
+        else:
+            return None
+
+        busy, wal_frames, checkpointed = self.checkpoint(mode)
+        if busy:
+            print(f"⚠️ checkpoint {mode} لم يكتمل - قراء نشطون (WAL: {wal_size / 1048576:.1f} MB)")
+        else:
+            print(f"🧾 checkpoint {mode}: {checkpointed}/{wal_frames} إطار (WAL: {wal_size / 1048576:.1f} MB)")
+        return mode
+
+    def get_auto_vacuum_mode(self, cursor):
+        cursor.execute("PRAGMA auto_vacuum")
+        return AUTO_VACUUM_MODES.get(cursor.fetchone()[0], 'UNKNOWN')
+
+    def migrate_to_incremental_vacuum(self):
+        """
+        ترحيل قاعدة البيانات إلى auto_vacuum=INCREMENTAL (خطوة إدارية يدوية)
+
+        تغيير الوضع لقاعدة بيانات موجودة يتطلب VACUUM كامل يعيد كتابة الملف ويحجز
+        قفل الكتابة طوال مدته، لذلك لا يُشغَّل من المُجدول - يُنفذ مرة واحدة من
+        سطر الأوامر (يُفضل والخادم متوقف)
+        :return: True إذا أصبح الوضع INCREMENTAL
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            if self.get_auto_vacuum_mode(cursor) == 'INCREMENTAL':
+                return True
+
+            print("🔧 ترحيل قاعدة البيانات إلى auto_vacuum=INCREMENTAL (VACUUM كامل)...")
+            started = time.time()
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.isolation_level = None  # VACUUM لا يعمل داخل معاملة
+            cursor.execute("VACUUM")
+            migrated = self.get_auto_vacuum_mode(cursor) == 'INCREMENTAL'
+        finally:
+            conn.close()
+
+        if migrated:
+            with self._lock:
+                self.stats['auto_vacuum_migrated_at'] = datetime.now().isoformat()
+                self.stats['migration_required'] = False
+            print(f"✅ تم الترحيل خلال {time.time() - started:.1f} ثانية")
+        return migrated
+
+    def reclaim_space(self, stop_event=None):
+        """
+        استعادة الصفحات الفارغة بخطوات incremental_vacuum صغيرة (المهمة الدورية)
+
+        كل خطوة تحرر vacuum_pages_per_step صفحة على الأكثر في معاملة قصيرة، وإذا كان
+        قفل الكتابة محجوزاً أكثر من busy_timeout_ms تتوقف المهمة حتى التشغيل التالي.
+        قاعدة البيانات التي ليست في وضع INCREMENTAL لا تُرحَّل هنا (migration_required)
+        :param stop_event: threading.Event - التوقف بين الخطوات عند ضبطه (مهلة المُجدول)
+        :return: عدد الصفحات المستعادة
+        """
+        conn = self._connect()
+        reclaimed = 0
+        try:
+            cursor = conn.cursor()
+            if self.get_auto_vacuum_mode(cursor) != 'INCREMENTAL':
+                with self._lock:
+                    first_notice = not self.stats['migration_required']
+                    self.stats['migration_required'] = True
+                if first_notice:
+                    print("⚠️ قاعدة البيانات ليست في وضع auto_vacuum=INCREMENTAL - "
+                          "شغّل: python cleanup_advanced.py --vacuum-migrate")
+                return 0
+
+            for _ in range(self.vacuum_max_steps):
+                if stop_event is not None and stop_event.is_set():
+                    break
+                cursor.execute("PRAGMA freelist_count")
+                free_pages = cursor.fetchone()[0]
+                if free_pages == 0:
+                    break
+                step = min(free_pages, self.vacuum_pages_per_step)
+                try:
+                    # executescript ينفذ الأمر حتى النهاية (execute يحرر صفحة واحدة فقط لكل خطوة)
+                    conn.executescript(f"PRAGMA incremental_vacuum({step});")
+                except sqlite3.OperationalError as e:
+                    if 'locked' not in str(e) and 'busy' not in str(e):
+                        raise
+                    with self._lock:
+                        self.stats['busy_vacuum_steps'] += 1
+                    break
+                cursor.execute("PRAGMA freelist_count")
+                reclaimed += free_pages - cursor.fetchone()[0]
+                time.sleep(0.05)  # ترك فرصة لعمليات الكتابة الأخرى بين الخطوات
+        finally:
+            conn.close()
+
+        with self._lock:
+            self.stats['vacuum_runs'] += 1
+            self.stats['pages_reclaimed'] += reclaimed
+            self.stats['last_vacuum_at'] = datetime.now().isoformat()
+        if reclaimed:
+            print(f"🧹 تمت استعادة {reclaimed} صفحة من قاعدة البيانات")
+        return reclaimed
+
+    def get_metrics(self):
+        """مقاييس WAL وحجم قاعدة البيانات ونتائج الصيانة"""
+        metrics = {
+            'wal_size_bytes': self.get_wal_size(),
+            'passive_checkpoint_bytes': self.passive_checkpoint_bytes,
+            'truncate_checkpoint_bytes': self.truncate_checkpoint_bytes
+        }
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA page_size")
+            page_size = cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_count")
+            page_count = cursor.fetchone()[0]
+            cursor.execute("PRAGMA freelist_count")
+            freelist_count = cursor.fetchone()[0]
+            metrics.update({
+                'auto_vacuum': self.get_auto_vacuum_mode(cursor),
+                'page_size': page_size,
+                'db_size_bytes': page_size * page_count,
+                'freelist_pages': freelist_count,
+                'reclaimable_bytes': page_size * freelist_count,
+                'seconds_since_last_reading': self.seconds_since_last_reading(cursor)
+            })
+            conn.close()
+        except sqlite3.Error as e:
+            metrics['error'] = str(e)
+
+        with self._lock:
+            stats = dict(self.stats, checkpoints=dict(self.stats['checkpoints']))
+        last = stats['last_checkpoint']
+        # تأخر checkpoint: الإطارات التي لم تُنقل بعد إلى قاعدة البيانات والوقت منذ آخر نقل كامل
+        metrics['checkpoint_lag_frames'] = (last['wal_frames'] - last['checkpointed_frames']) if last else None
+        last_full = stats.pop('last_full_checkpoint_at')
+        metrics['checkpoint_lag_seconds'] = round(time.time() - last_full, 1) if last_full else None
+        metrics.update(stats)
+        return metrics
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+تقليل نقاط السلاسل الزمنية للرسوم البيانية مع الحفاظ على شكلها
+
+- LTTB (Largest-Triangle-Three-Buckets): يختار من كل دلو النقطة التي تصنع
+  أكبر مثلث مع النقطة المختارة قبلها ومتوسط الدلو التالي، فتبقى القمم والتغيرات
+- min/max: أصغر وأكبر قيمة في كل دلو (يضمن ظهور كل قمة حقيقية في الرسم)
+
+الدوال تعيد فهارس النقاط المختارة (مرتبة تصاعدياً) لتُستخدم مع الصفوف الأصلية،
+والنقطتان الأولى والأخيرة محفوظتان دائماً
+"""
+
+import numpy as np
+
+DOWNSAMPLING_METHODS = ('lttb', 'minmax')
+MIN_POINTS = 10
+MAX_POINTS = 10000
+
+def parse_max_points(value, minimum=MIN_POINTS, maximum=MAX_POINTS):
+    """أقصى عدد نقاط من معامل الطلب ضمن الحدود [minimum, maximum] (None = بدون تقليل)"""
+    if value in (None, ''):
+        return None
+    try:
+        points = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("قيمة max_points غير صالحة")
+    return max(minimum, min(points, maximum))
+
+def lttb_indices(x, y, max_points):
+    """
+    فهارس النقاط المختارة بخوارزمية LTTB
+
+    :param x: قيم المحور الأفقي (متزايدة - مثل الوقت)
+    :param y: قيم السلسلة
+    :param max_points: عدد النقاط المطلوب (3 على الأقل)
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    # حدود max_points - 2 دلواً للنقاط بين الأولى والأخيرة (كل دلو فيه نقطة على الأقل لأن n > max_points)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x = x[end:edges[bucket + 2]].mean()
+            next_y = y[end:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]  # الدلو الأخير: النقطة التالية هي آخر نقطة
+
+        # ضعف مساحة المثلث (النقطة السابقة، كل نقطة في الدلو، متوسط الدلو التالي)
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+    return selected
+
+def minmax_indices(y, max_points):
+    """
+    فهارس أصغر وأكبر قيمة في كل دلو (max_points / 2 دلواً)
+
+    :param y: قيم السلسلة
+    :param max_points: أقصى عدد نقاط (النتيجة قد تكون أقل عند تساوي الصغرى والكبرى)
+    """
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    n = len(y)
+    if max_points >= n or max_points < 4:
+        return np.arange(n)
+
+    # النقطتان الأولى والأخيرة خارج الدلاء
+    edges = np.linspace(1, n - 1, (max_points - 2) // 2 + 1).astype(np.int64)
+    selected = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        bucket = y[start:end]
+        selected.append(start + int(bucket.argmin()))
+        selected.append(start + int(bucket.argmax()))
+    return np.unique(selected)
+
+def downsample_indices(x, y, max_points, method='lttb'):
+    """فهارس النقاط المختارة حسب الطريقة ('lttb' أو 'minmax')"""
+    if method == 'lttb':
+        return lttb_indices(x, y, max_points)
+    if method == 'minmax':
+        return minmax_indices(y, max_points)
+    raise ValueError(f"طريقة تقليل النقاط غير معروفة: {method}")
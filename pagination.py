@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ترقيم الصفحات بالمؤشر (keyset pagination) لواجهات التقارير
+
+بدلاً من OFFSET (الذي يمسح كل الصفوف السابقة) يُحفظ آخر (وقت، معرف) في مؤشر
+معتم يرسله العميل لطلب الصفحة التالية، فيبقى زمن كل صفحة وذاكرتها ثابتين
+مهما طال السجل. الترتيب دائماً تنازلي على (عمود الوقت، المعرف).
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """حجم الصفحة من معامل الطلب ضمن الحدود [1, maximum]"""
+    try:
+        size = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        raise ValueError("قيمة limit غير صالحة")
+    return max(1, min(size, maximum))
+
+def encode_cursor(state):
+    """تحويل حالة الترقيم (قاموس) إلى نص معتم آمن للروابط"""
+    raw = json.dumps(state, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """فك المؤشر المعتم - يرفع ValueError إذا كان تالفاً"""
+    if not token:
+        return {}
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        raise ValueError("مؤشر الصفحة غير صالح")
+    if not isinstance(state, dict):
+        raise ValueError("مؤشر الصفحة غير صالح")
+    return state
+
+def date_range_condition(column, date_from='', date_to=''):
+    """
+    شرط نطاق تاريخ قابل للفهرسة على عمود وقت نصي يبدأ بـ YYYY-MM-DD
+
+    يعادل DATE(column) BETWEEN date_from AND date_to بالتاريخ المحلي المخزن،
+    لكن دون دالة على العمود فيستخدم الفهرس
+    :return: (sql, params)
+    """
+    sql, params = '', []
+    if date_from:
+        sql += f' AND {column} >= ?'
+        params.append(date_from)
+    if date_to:
+        try:
+            day_after = (datetime.strptime(date_to[:10], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        except ValueError:
+            raise ValueError("قيمة date_to غير صالحة")
+        sql += f' AND {column} < ?'
+        params.append(day_after)
+    return sql, params
+
+def fetch_page(cursor, query, params, sort_column, id_column, position, page_size, key):
+    """
+    جلب صفحة واحدة مرتبة تنازلياً على (sort_column, id_column)
+
+    :param query: استعلام SELECT مع شروط WHERE (بدون ORDER BY / LIMIT)
+    :param position: [قيمة الترتيب، المعرف] لآخر صف في الصفحة السابقة أو None للصفحة الأولى
+    :param key: دالة تعيد (قيمة الترتيب، المعرف) من صف
+    :return: (rows, next_position) - next_position تساوي None عند انتهاء النتائج
+    """
+    params = list(params)
+    if position:
+        # مقارنة القيم الصفية (row values) تستخدم الفهرس المركب مباشرة
+        query += f' AND ({sort_column}, {id_column}) < (?, ?)'
+        params.extend(position)
+    query += f' ORDER BY {sort_column} DESC, {id_column} DESC LIMIT ?'
+    params.append(page_size + 1)
+
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, list(key(rows[-1]))
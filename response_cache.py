@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+تخزين مؤقت لاستجابات واجهات التقارير داخل العملية مع إبطال بعدادات الأجيال،
+ودعم ETag و 304 Not Modified للواجهات التي تُستطلع بشكل متكرر
+
+كل مجموعة بيانات لها عداد جيل (generation) يُزاد فقط عند تغيّر بياناتها فعلياً
+(إغلاق جلسة، تسجيل حضور، تحديث الجدول التراكمي...). كل استجابة مخزنة تحفظ
+قيم عدادات المجموعات التي تعتمد عليها، فإذا تغيّر أحدها تُعتبر قديمة دون الحاجة
+لتتبع المفاتيح المتأثرة. الحجم محدود مع إخراج الأقدم استخداماً (LRU).
+
+بعد share_generations تُحفظ العدادات في جدول SQLite مشترك (response_cache_generations)
+فيرى كل عمال gunicorn زيادة العداد من أي عامل أو من المُجدول. العمر الأقصى
+(max_age_seconds) يبقى حد أمان للكتابات التي لا تزيد أي عداد (أدوات خارجية)
+
+الواجهات التي تجمع conditional_response مع cached_response تُضاف علامة إصدارها
+إلى مفتاح التخزين، فعلامة جديدة (ETag جديد) تعني دائماً حساب الاستجابة من جديد
+"""
+
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, request
+
+# مجموعات البيانات التي لها عدادات أجيال
+GENERATIONS = ('sessions', 'readings', 'employees', 'cumulative')
+
+# معاملات لا تغيّر النتيجة (كسر التخزين المؤقت في المتصفح)
+IGNORED_PARAMS = ('_', 't', 'ts')
+
+class ResponseCache:
+    """ذاكرة LRU محدودة الحجم لاستجابات JSON مع عدادات أجيال"""
+
+    def __init__(self, max_entries=256, max_age_seconds=120):
+        """
+        :param max_entries: أقصى عدد استجابات مخزنة
+        :param max_age_seconds: أقصى عمر للمدخل (0 = بلا حد)
+        """
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = {name: 0 for name in GENERATIONS}
+        self._db_path = None
+        self.busy_timeout_ms = 2000
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'expired': 0, 'evictions': 0, 'bumps': 0,
+                      'not_modified': 0}
+        self._endpoint_stats = {}
+
+    def share_generations(self, db_path, cursor=None):
+        """
+        حفظ عدادات الأجيال في SQLite بدلاً من ذاكرة العملية (مشتركة بين العمال)
+
+        :param cursor: مؤشر اتصال مفتوح لإنشاء الجدول ضمن معاملته (مثل init_db)
+        """
+        sql = '''CREATE TABLE IF NOT EXISTS response_cache_generations
+                 (name TEXT PRIMARY KEY,
+                  generation INTEGER NOT NULL DEFAULT 0)'''
+        if cursor is not None:
+            cursor.execute(sql)
+        else:
+            conn = self._connect(db_path)
+            try:
+                conn.execute(sql)
+                conn.commit()
+            finally:
+                conn.close()
+        self._db_path = db_path
+
+    @staticmethod
+    def bump_on_write(cursor, table, name):
+        """
+        مشغلات SQLite تزيد جيل المجموعة name عند أي إدراج أو تعديل أو حذف في table
+
+        تلتقط كل الكتابات ولو من خارج التطبيق (أدوات التنظيف، تعديل يدوي)، وقيمة الجيل
+        نفسها تصلح علامة إصدار للجدول (تتغير مع التعديلات التي لا تغيّر COUNT أو MAX(rowid))
+        """
+        if name not in GENERATIONS:
+            raise ValueError(f"مجموعة بيانات غير معروفة: {name}")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_bumps_{name}
+                               AFTER {event} ON {table}
+                               BEGIN
+                                   INSERT INTO response_cache_generations (name, generation) VALUES ('{name}', 1)
+                                   ON CONFLICT(name) DO UPDATE SET generation = generation + 1;
+                               END''')
+
+    def _connect(self, db_path=None):
+        conn = sqlite3.connect(db_path or self._db_path, timeout=self.busy_timeout_ms / 1000.0)
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    def bump(self, *names):
+        """زيادة عدادات الأجيال للمجموعات المتغيرة (تبطل كل ما يعتمد عليها)"""
+        for name in names:
+            if name not in self._generations:
+                raise ValueError(f"مجموعة بيانات غير معروفة: {name}")
+        with self._lock:
+            for name in names:
+                self._generations[name] += 1
+            self.stats['bumps'] += 1
+        if self._db_path is None:
+            return
+        try:
+            conn = self._connect()
+            try:
+                conn.executemany('''INSERT INTO response_cache_generations (name, generation) VALUES (?, 1)
+                                    ON CONFLICT(name) DO UPDATE SET generation = generation + 1''',
+                                 [(name,) for name in names])
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ تعذر زيادة عدادات الأجيال المشتركة {names}: {e}")
+
+    def snapshot(self, names):
+        """
+        قيم عدادات المجموعات المحددة الآن
+
+        :return: tuple، أو None إذا تعذرت قراءة العدادات المشتركة (لا تخزين ولا إصابة)
+        """
+        if self._db_path is None:
+            with self._lock:
+                return tuple(self._generations[name] for name in names)
+        try:
+            conn = self._connect()
+            try:
+                shared = dict(conn.execute('SELECT name, generation FROM response_cache_generations'))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ تعذر قراءة عدادات الأجيال المشتركة: {e}")
+            return None
+        return tuple(shared.get(name, 0) for name in names)
+
+    @staticmethod
+    def make_key(endpoint, view_args=None, args=None):
+        """مفتاح التخزين: اسم الواجهة + معاملات المسار + معاملات الطلب بعد التطبيع"""
+        params = []
+        for name, values in (args.lists() if args is not None else []):
+            if name in IGNORED_PARAMS:
+                continue
+            values = sorted(value.strip() for value in values if value.strip())
+            if values:
+                params.append((name, tuple(values)))
+        return (endpoint, tuple(sorted((view_args or {}).items())), tuple(sorted(params)))
+
+    def _count(self, endpoint, outcome):
+        self.stats[outcome] += 1
+        counters = self._endpoint_stats.setdefault(endpoint, {'hits': 0, 'misses': 0})
+        counters['hits' if outcome == 'hits' else 'misses'] += 1
+
+    def get(self, key, names):
+        """القيمة المخزنة إذا كانت أجيالها مطابقة للحالية، وإلا None"""
+        current = self.snapshot(names)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or current is None:
+                self._count(key[0], 'misses')
+                return None
+            generations, stored_at, value = entry
+            if generations != current:
+                del self._entries[key]
+                self._count(key[0], 'stale')
+                return None
+            if self.max_age_seconds and time.time() - stored_at > self.max_age_seconds:
+                del self._entries[key]
+                self._count(key[0], 'expired')
+                return None
+            self._entries.move_to_end(key)
+            self._count(key[0], 'hits')
+            return value
+
+    def put(self, key, generations, value):
+        """
+        تخزين قيمة مع أجيال مأخوذة قبل حسابها
+
+        إذا تغيّرت البيانات أثناء الحساب فستكون الأجيال قديمة ويُتجاهل المدخل عند أول قراءة
+        """
+        if generations is None:
+            return
+        with self._lock:
+            self._entries[key] = (generations, time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self.stats['not_modified'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """إحصائيات الإصابة والإخفاق وحالة العدادات"""
+        generations = self.snapshot(GENERATIONS)
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats['hits'] + stats['misses'] + stats['stale'] + stats['expired']
+            stats.update({
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'max_age_seconds': self.max_age_seconds,
+                'hit_ratio': round(stats['hits'] / lookups, 3) if lookups else None,
+                'generations': dict(zip(GENERATIONS, generations)) if generations else None,
+                'shared_generations': self._db_path is not None,
+                'endpoints': {name: dict(counters) for name, counters in self._endpoint_stats.items()}
+            })
+        return stats
+
+# كائن عام مشترك بين app.py والمُجدول
+response_cache = ResponseCache(
+    max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '256')),
+    max_age_seconds=float(os.getenv('RESPONSE_CACHE_MAX_AGE', '120'))
+)
+
+def bump_generation(*names):
+    """إبطال الاستجابات المعتمدة على المجموعات المحددة"""
+    response_cache.bump(*names)
+
+def cached_response(*generations):
+    """
+    مُزخرف لواجهة Flask: تخزين استجابات 200 حسب الواجهة والمعاملات
+
+    :param generations: المجموعات التي تعتمد عليها الاستجابة (من GENERATIONS)
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)  # جسم الطلب ليس جزءاً من المفتاح
+
+            # علامة الإصدار من conditional_response (إن وُجد) جزء من المفتاح
+            key = response_cache.make_key(request.endpoint, kwargs, request.args) + (g.get('response_version'),)
+            cached = response_cache.get(key, generations)
+            if cached is not None:
+                body, mimetype = cached
+                response = current_app.response_class(body, status=200, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            # الأجيال قبل تنفيذ الاستعلامات - أي تغيير أثناء التنفيذ يجعل المدخل قديماً
+            generations_before = response_cache.snapshot(generations)
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                response_cache.put(key, generations_before, (response.get_data(), response.mimetype))
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+def make_etag(*parts):
+    """قيمة ETag قوية من علامات الإصدار (بصمة ثابتة الطول)"""
+    raw = json.dumps(parts, default=str, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:24]
+
+def matching_etag(etag):
+    """وسم If-None-Match لدى العميل المطابق لـ etag أو None
+
+    النسخ المضغوطة تحمل لاحقة الترميز (etag-gz / etag-br) - تُقارن بدونها
+    """
+    return next((tag for tag in request.if_none_match.as_set() if tag.split('-', 1)[0] == etag), None)
+
+def not_modified_response(tag):
+    """استجابة 304 تعيد نفس الوسم الذي أرسله العميل"""
+    response_cache.record_not_modified()
+    response = current_app.response_class(status=304)
+    response.set_etag(tag)
+    # no-cache بدلاً من no-store: يُسمح بالاحتفاظ بالنسخة بشرط التحقق في كل طلب
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def conditional_response(version_marker):
+    """
+    مُزخرف لواجهة Flask: ETag قوي من علامة إصدار رخيصة مع معالجة If-None-Match
+
+    علامة الإصدار تُحسب قبل تنفيذ الواجهة، فإذا طابقت ما لدى العميل يُرجع 304
+    بدون أي استعلامات أخرى. تغيّر البيانات بين حساب العلامة وتنفيذ الواجهة
+    يعني فقط إرسال الجسم كاملاً مرة إضافية في الاستطلاع التالي
+    :param version_marker: دالة بدون معاملات تعيد قيمة قابلة للتحويل إلى JSON،
+                           أو None لتعطيل ETag لهذا الطلب
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            marker = version_marker()
+            if marker is None:
+                return view(*args, **kwargs)
+
+            etag = make_etag(ResponseCache.make_key(request.endpoint, kwargs, request.args), marker)
+            matched = matching_etag(etag)
+            if matched:
+                return not_modified_response(matched)
+
+            # cached_response تحت هذا المزخرف لا يعيد جسماً مخزناً تحت علامة أقدم
+            g.response_version = etag
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+محرك سياسات الاحتفاظ بالبيانات حسب العمر
+
+- قراءات الإشعاع الخام: تُحذف بعد N يوم فقط إذا كانت ملخصاتها محفوظة
+  (جلسة مغلقة مع readings_count وسجل الجرعات اليومية) أو كانت قراءة عامة بدون جلسة
+- التنبيهات المُقَر بها (acknowledged): تُحذف بعد M يوم
+
+الحذف على دفعات حسب نطاقات rowid، كل دفعة في معاملة قصيرة مستقلة،
+فلا يُحجز قفل الكتابة إلا لأجزاء من الثانية ويستمر حفظ القراءات بشكل طبيعي.
+عند ضبط stop_event (تجاوز المهلة في المُجدول) يتوقف الحذف بعد الدفعة الحالية
+ويكمل التشغيل التالي من حيث توقف
+"""
+
+import sqlite3
+import time
+from datetime import datetime
+
+# القيم الافتراضية إذا لم توجد الإعدادات في system_settings
+DEFAULT_READINGS_RETENTION_DAYS = 90
+DEFAULT_ALERTS_RETENTION_DAYS = 30
+
+# الجدول -> (مفتاح الإعداد، القيمة الافتراضية، شرط الحذف الإضافي)
+# الأوقات مخزنة بـ CURRENT_TIMESTAMP (UTC) فتُقارن مع datetime('now', ...)
+RETENTION_POLICIES = {
+    'radiation_readings_local': (
+        'readings_retention_days', DEFAULT_READINGS_RETENTION_DAYS,
+        '''(session_id IS NULL OR EXISTS
+               (SELECT 1 FROM employee_exposure_sessions s
+                WHERE s.id = session_id AND s.is_active = 0 AND s.readings_count IS NOT NULL))'''
+    ),
+    'safety_alerts': (
+        'alerts_retention_days', DEFAULT_ALERTS_RETENTION_DAYS,
+        'acknowledged = 1'
+    ),
+}
+
+class RetentionEngine:
+    """تطبيق سياسات الاحتفاظ بحذف مجزأ حسب rowid"""
+
+    def __init__(self, db_path='attendance.db', batch_size=200, pause_seconds=0.01, busy_timeout_ms=2000):
+        """
+        :param batch_size: عرض نطاق rowid في كل دفعة حذف
+        :param pause_seconds: استراحة بين الدفعات لإفساح المجال لعمليات الكتابة الأخرى
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.busy_timeout_ms = busy_timeout_ms
+        self.last_run = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA synchronous=NORMAL")  # آمن مع WAL ويقلل زمن كل دفعة
+        return conn
+
+    def get_retention_days(self, cursor, overrides=None):
+        """
+        أيام الاحتفاظ لكل جدول: القيم الممررة ثم system_settings ثم الافتراضية
+
+        :param overrides: {table: days} - القيمة None تعني استخدام الإعداد
+        """
+        overrides = overrides or {}
+        days = {}
+        for table, (setting_key, default, _) in RETENTION_POLICIES.items():
+            value = overrides.get(table)
+            if value is None:
+                try:
+                    cursor.execute('SELECT setting_value FROM system_settings WHERE setting_key = ?', (setting_key,))
+                    row = cursor.fetchone()
+                    value = float(row[0]) if row and row[0] else default
+                except (sqlite3.OperationalError, ValueError):
+                    value = default
+            days[table] = value
+        return days
+
+    def _expired_condition(self, table):
+        return f"timestamp < datetime('now', ?) AND {RETENTION_POLICIES[table][2]}"
+
+    def count_expired(self, cursor, table, days):
+        """عدد الصفوف المنتهية صلاحيتها (للتشغيل التجريبي)"""
+        cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {self._expired_condition(table)}",
+                       (f'-{days} days',))
+        return cursor.fetchone()[0]
+
+    def purge_table(self, conn, table, days, stop_event=None):
+        """
+        حذف الصفوف المنتهية صلاحيتها على دفعات من نطاقات rowid
+
+        المعرفات تتزايد مع الزمن، فيكفي المرور من أصغر معرف حتى أكبر معرف منتهٍ
+        :param stop_event: threading.Event - التوقف بين الدفعات عند ضبطه
+        :return: (عدد الصفوف المحذوفة، عدد الدفعات)
+        """
+        cursor = conn.cursor()
+        age = f'-{days} days'
+        cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table} WHERE timestamp < datetime('now', ?)", (age,))
+        low, high = cursor.fetchone()
+        if low is None:
+            return 0, 0
+
+        deleted = batches = 0
+        condition = self._expired_condition(table)
+        for start in range(low, high + 1, self.batch_size):
+            if stop_event is not None and stop_event.is_set():
+                break
+            cursor.execute(f"DELETE FROM {table} WHERE id >= ? AND id < ? AND {condition}",
+                           (start, start + self.batch_size, age))
+            conn.commit()
+            deleted += cursor.rowcount
+            batches += 1
+            if self.pause_seconds:
+                time.sleep(self.pause_seconds)
+        return deleted, batches
+
+    def run(self, overrides=None, dry_run=False, stop_event=None):
+        """
+        تطبيق جميع السياسات
+
+        :param overrides: {table: days} لتجاوز الإعدادات
+        :param dry_run: عدّ الصفوف فقط بدون حذف
+        :param stop_event: threading.Event - إيقاف الحذف بين الدفعات (إلغاء تعاوني)
+        :return: ملخص لكل جدول
+        """
+        started = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            retention_days = self.get_retention_days(cursor, overrides)
+            results = {}
+            for table, days in retention_days.items():
+                try:
+                    if dry_run:
+                        results[table] = {'retention_days': days,
+                                          'expired_rows': self.count_expired(cursor, table, days)}
+                    else:
+                        table_started = time.time()
+                        deleted, batches = self.purge_table(conn, table, days, stop_event)
+                        results[table] = {'retention_days': days, 'deleted_rows': deleted, 'batches': batches,
+                                          'duration_seconds': round(time.time() - table_started, 3)}
+                except sqlite3.OperationalError as e:
+                    # الجدول غير موجود بعد (قاعدة بيانات جديدة)
+                    results[table] = {'retention_days': days, 'error': str(e)}
+        finally:
+            conn.close()
+
+        summary = {
+            'dry_run': dry_run,
+            'stopped': stop_event is not None and stop_event.is_set(),
+            'at': datetime.now().isoformat(),
+            'duration_seconds': round(time.time() - started, 3),
+            'tables': results
+        }
+        if not dry_run:
+            self.last_run = summary
+        return summary
+
+    def run_scheduled(self, stop_event=None):
+        """المهمة المُجدولة: تطبيق السياسات وطباعة ملخص"""
+        summary = self.run(stop_event=stop_event)
+        for table, result in summary['tables'].items():
+            if 'error' in result:
+                print(f"⚠️ سياسة الاحتفاظ لـ {table}: {result['error']}")
+            elif result['deleted_rows']:
+                print(f"🗑️ {table}: حذف {result['deleted_rows']} صف أقدم من {result['retention_days']:g} يوم "
+                      f"({result['batches']} دفعة)")
+        if summary['stopped']:
+            print("⏱️ توقف تطبيق سياسات الاحتفاظ قبل اكتماله (تجاوز المهلة) - يكمل في التشغيل التالي")
+        return True
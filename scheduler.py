@@ -3,87 +3,516 @@
 """
 مُجدول تحديث البيانات التراكمية للموظفين
 يقوم بتحديث جدول employee_cumulative_data تلقائياً كل فترة محددة
+
+عند تشغيل عدة عمليات (مثل gunicorn بعدة عمال) تنفذ عملية واحدة فقط المهام المُجدولة:
+القائد هو من يحمل عقد الإيجار (lease) في جدول scheduler_lease ويجدده دورياً،
+وتتولى عملية أخرى القيادة تلقائياً إذا انتهت صلاحية العقد دون تجديد
+
+المهام مسجلة في سجل داخلي (ScheduledJob) بأولويات ومهلة قصوى وتأخير عشوائي (jitter).
+ترسل حلقة المُجدول المهام المستحقة حسب الأولوية دون انتظار أي منها، وكل مهمة تعمل في
+مسار (lane) خاص بها: مهام الصيانة الطويلة (الاحتفاظ واستعادة المساحة) في مسار maintenance
+بعامل واحد، فلا تتصادم في الكتابة فيما بينها ولا تؤخر التحديث الدوري ونقاط WAL
+
+الإلغاء تعاوني: بعد max_runtime_seconds يُضبط stop_event للمهمة (إذا كانت تقبله) فتتوقف
+عند أقرب نقطة آمنة بين الدفعات، وتُحتسب المهمة متجاوزة للمهلة. لا يمكن إيقاف خيط
+Python قسراً، فالمهام التي لا تقبل stop_event تُسجل كمتجاوزة وتكمل عملها
 """
 
+import functools
+import os
+import random
+import socket
 import sqlite3
 import time
 import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait as wait_futures
 from datetime import datetime, timedelta
-import schedule
-import requests
-import json
+
+from cumulative_data import (
+    update_employees_cumulative_data,
+    init_change_tracking,
+    pop_dirty_employees
+)
+from session_rollover import rollover_sessions
+from db_maintenance import DatabaseMaintenanceManager
+from retention import RetentionEngine
+from response_cache import response_cache, bump_generation
+from time_utils import time_calculator
+
+# اسم عقد القيادة في جدول scheduler_lease
+LEASE_NAME = 'cumulative_data_scheduler'
+
+# مسارات التنفيذ: المهام القصيرة في المسار الافتراضي، والصيانة الطويلة في مسار بعامل واحد
+DEFAULT_LANE = 'default'
+MAINTENANCE_LANE = 'maintenance'
+
+def _new_job_metrics():
+    """مقاييس تنفيذ مهمة قبل أول تشغيل"""
+    return {
+        'runs': 0,
+        'successes': 0,
+        'failures': 0,
+        'timeouts': 0,
+        'skipped_overlaps': 0,
+        'last_started_at': None,
+        'last_duration_seconds': None,
+        'max_duration_seconds': 0.0,
+        'total_duration_seconds': 0.0,
+        'last_success_at': None,
+        'last_failure_at': None,
+        'last_error': None
+    }
+
+class ScheduledJob:
+    """مهمة مُجدولة مع إعدادات التشغيل ومقاييس التنفيذ"""
+    def __init__(self, name, func, interval_minutes=None, daily_at=None, priority=50,
+                 max_runtime_seconds=120, jitter_seconds=0, args=(), lane=DEFAULT_LANE, cancellable=False):
+        """
+        :param interval_minutes: التشغيل كل عدد من الدقائق
+        :param daily_at: أو التشغيل يومياً في وقت محلي "HH:MM"
+        :param priority: الأولوية (الرقم الأصغر يُرسل أولاً)
+        :param max_runtime_seconds: المهلة القصوى للمهمة من بدء تنفيذها
+        :param jitter_seconds: تأخير عشوائي يضاف لكل موعد لتفادي تزامن المهام
+        :param lane: مسار التنفيذ (DEFAULT_LANE أو MAINTENANCE_LANE)
+        :param cancellable: الدالة تقبل stop_event وتتوقف عند ضبطه (إلغاء تعاوني)
+        """
+        if (interval_minutes is None) == (daily_at is None):
+            raise ValueError("يجب تحديد interval_minutes أو daily_at (أحدهما فقط)")
+        self.name = name
+        self.func = func
+        self.args = args
+        self.interval_minutes = interval_minutes
+        self.daily_at = daily_at
+        self.priority = priority
+        self.max_runtime_seconds = max_runtime_seconds
+        self.jitter_seconds = jitter_seconds
+        self.lane = lane
+        self.cancellable = cancellable
+        self.next_run = None  # وقت التشغيل التالي (epoch)
+
+    def schedule_next(self, now=None):
+        """حساب موعد التشغيل التالي بعد الوقت الحالي"""
+        now = now or time.time()
+        if self.interval_minutes is not None:
+            next_run = now + self.interval_minutes * 60
+        else:
+            local_now = datetime.fromtimestamp(now, time_calculator.local_tz)
+            hour, minute = map(int, self.daily_at.split(':'))
+            target = local_now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if target <= local_now:
+                target = time_calculator.local_tz.normalize(target + timedelta(days=1))
+            next_run = target.timestamp()
+        if self.jitter_seconds:
+            next_run += random.uniform(0, self.jitter_seconds)
+        self.next_run = next_run
+        return next_run
+
+    def is_due(self, now):
+        return self.next_run is not None and self.next_run <= now
+
+    def to_dict(self):
+        """إعدادات المهمة وموعدها التالي"""
+        return {
+            'name': self.name,
+            'priority': self.priority,
+            'interval_minutes': self.interval_minutes,
+            'daily_at': self.daily_at,
+            'max_runtime_seconds': self.max_runtime_seconds,
+            'jitter_seconds': self.jitter_seconds,
+            'lane': self.lane,
+            'cancellable': self.cancellable,
+            'next_run': datetime.fromtimestamp(self.next_run, time_calculator.local_tz).isoformat()
+                        if self.next_run else None
+        }
 
 class CumulativeDataScheduler:
-    def __init__(self, api_base_url="http://localhost:5000"):
+    def __init__(self, db_path='attendance.db', max_workers=2, job_timeout_seconds=120, lease_ttl_seconds=60):
         """
         إعداد المُجدول
-        :param api_base_url: عنوان API الخاص بالتطبيق
+        :param db_path: مسار قاعدة البيانات
+        :param max_workers: عدد العمال في المسار الافتراضي (مسار الصيانة بعامل واحد)
+        :param job_timeout_seconds: المهلة القصوى لانتظار نتيجة مهمة واحدة
+        :param lease_ttl_seconds: مدة صلاحية عقد القيادة (يُجدد كل ثلث المدة)
         """
-        self.api_base_url = api_base_url
-        self.db_path = 'attendance.db'
+        self.db_path = db_path
         self.is_running = False
         self.update_thread = None
         
+        # القيادة بين العمليات
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_ttl_seconds = lease_ttl_seconds
+        self.is_leader = False
+        self.lease_thread = None
+        self._stop_event = threading.Event()
+        
         # إعدادات المجدول
-        self.update_interval_minutes = 5  # كل 5 دقائق
-        self.force_update_interval_hours = 1  # إجباري كل ساعة
+        self.update_interval_minutes = 5  # كل 5 دقائق (للموظفين المتغيرين فقط)
+        self.last_full_sweep_date = None  # تاريخ آخر تحديث شامل - يتكرر عند تغير اليوم
+        self.rollover_time = "00:00"  # ترحيل الجلسات عند منتصف الليل بالتوقيت المحلي
+        self.last_rollover = None  # ملخص آخر ترحيل
+        
+        # مجمّع التنفيذ الداخلي (بدلاً من استدعاء API التطبيق عبر HTTP)
+        self.max_workers = max_workers
+        self.job_timeout_seconds = job_timeout_seconds
+        self._executors = {}  # مسار التنفيذ -> ThreadPoolExecutor
+        self._executor_lock = threading.RLock()  # فحص التداخل والإرسال والتسجيل تحت نفس القفل
+        self._running_jobs = {}  # اسم المهمة -> Future قيد التنفيذ
+        self._deadlines = {}  # اسم المهمة المُجدولة -> (نهاية المهلة، stop_event)
+        
+        # سجل المهام المُجدولة ومقاييس التنفيذ
+        self.jobs = {}  # اسم المهمة -> ScheduledJob
+        self.job_metrics = {}  # اسم المهمة -> مقاييس التنفيذ
+        self._metrics_lock = threading.Lock()
+        self.poll_interval_seconds = 10  # أقصى انتظار بين فحصين للمهام المستحقة
+        
+        # إدارة ملف WAL واستعادة المساحة
+        self.db_maintenance = DatabaseMaintenanceManager(db_path)
+        self.retention = RetentionEngine(db_path)
+
+        # زيادات العدادات من المُجدول تصل لكل عمال الويب (ولو عمل المُجدول كعملية مستقلة)
+        response_cache.share_generations(db_path)
         
         print("🕒 تم تهيئة مُجدول البيانات التراكمية")
     
-    def update_cumulative_data_direct(self, employee_id=None):
-        """تحديث البيانات مباشرة عبر قاعدة البيانات"""
+    def try_acquire_lease(self):
+        """
+        محاولة الحصول على عقد القيادة أو تجديده (عملية ذرية واحدة في SQLite)
+        
+        ينجح إذا كان العقد لهذه العملية أو منتهي الصلاحية
+        :return: True إذا كانت هذه العملية هي القائد
+        """
+        now = time.time()
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scheduler_lease (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    acquired_at REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                INSERT INTO scheduler_lease (name, holder, acquired_at, heartbeat_at, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    acquired_at = CASE WHEN scheduler_lease.holder = excluded.holder
+                                       THEN scheduler_lease.acquired_at ELSE excluded.acquired_at END,
+                    holder = excluded.holder,
+                    heartbeat_at = excluded.heartbeat_at,
+                    expires_at = excluded.expires_at
+                WHERE scheduler_lease.holder = excluded.holder OR scheduler_lease.expires_at < excluded.heartbeat_at
+            ''', (LEASE_NAME, self.instance_id, now, now, now + self.lease_ttl_seconds))
+            conn.commit()
+            
+            cursor.execute('SELECT holder FROM scheduler_lease WHERE name = ?', (LEASE_NAME,))
+            holder = cursor.fetchone()[0]
+        finally:
+            conn.close()
+        
+        is_leader = holder == self.instance_id
+        if is_leader and not self.is_leader:
+            print(f"👑 أصبحت هذه العملية قائد المُجدول ({self.instance_id})")
+        elif not is_leader and self.is_leader:
+            print(f"🔻 فقدت هذه العملية قيادة المُجدول لصالح {holder}")
+        self.is_leader = is_leader
+        return is_leader
+    
+    def release_lease(self):
+        """التخلي عن عقد القيادة لتتولاها عملية أخرى فوراً"""
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute('UPDATE scheduler_lease SET expires_at = 0 WHERE name = ? AND holder = ?',
+                         (LEASE_NAME, self.instance_id))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ تعذر التخلي عن قيادة المُجدول: {e}")
+        self.is_leader = False
+    
+    def _lease_heartbeat(self):
+        """خيط تجديد عقد القيادة كل ثلث مدة الصلاحية"""
+        while not self._stop_event.wait(self.lease_ttl_seconds / 3):
+            try:
+                self.try_acquire_lease()
+            except sqlite3.Error as e:
+                print(f"⚠️ خطأ في تجديد عقد القيادة: {e}")
+                self.is_leader = False
+    
+    def _get_executor(self, lane=DEFAULT_LANE):
+        """إنشاء مجمّع العمال للمسار عند الحاجة"""
+        with self._executor_lock:
+            executor = self._executors.get(lane)
+            if executor is None:
+                workers = 1 if lane == MAINTENANCE_LANE else self.max_workers
+                executor = self._executors[lane] = ThreadPoolExecutor(max_workers=workers,
+                                                                      thread_name_prefix=f'cumulative-{lane}')
+            return executor
+    
+    def _job_metrics(self, job_name):
+        """مقاييس مهمة (تُنشأ عند أول تشغيل) - المهام اليدوية تُجمع تحت اسمها الأساسي"""
+        key = job_name.split(':', 1)[0]
+        metrics = self.job_metrics.get(key)
+        if metrics is None:
+            metrics = self.job_metrics[key] = _new_job_metrics()
+        return metrics
+    
+    def _record_job_result(self, job_name, started, future):
+        """تسجيل نتيجة المهمة عند انتهائها فعلياً (حتى لو تجاوزت المهلة)"""
+        duration = time.time() - started
+        finished_at = datetime.now().isoformat()
+        error = None
+        if future.cancelled():
+            error = 'cancelled'
+        elif future.exception() is not None:
+            error = str(future.exception())
+        elif future.result() is False:
+            error = 'returned False'
+        
+        with self._metrics_lock:
+            metrics = self._job_metrics(job_name)
+            metrics['last_duration_seconds'] = round(duration, 3)
+            metrics['max_duration_seconds'] = round(max(metrics['max_duration_seconds'], duration), 3)
+            metrics['total_duration_seconds'] += duration
+            if error is None:
+                metrics['successes'] += 1
+                metrics['last_success_at'] = finished_at
+            else:
+                metrics['failures'] += 1
+                metrics['last_failure_at'] = finished_at
+                metrics['last_error'] = error
+    
+    def submit_job(self, job_name, func, *args, lane=DEFAULT_LANE, **kwargs):
+        """
+        إرسال مهمة إلى مجمّع العمال الداخلي دون انتظار نتيجتها
+        
+        فحص التداخل والإرسال والتسجيل في _running_jobs تحت قفل واحد، فلا يمكن
+        لطلبين متزامنين (المُجدول وطلب يدوي مثلاً) تشغيل نفس المهمة مرتين
+        :param lane: مسار التنفيذ
+        :return: Future أو None إذا كان التنفيذ السابق لنفس المهمة لم ينته بعد
+        """
+        with self._executor_lock:
+            previous = self._running_jobs.get(job_name)
+            if previous is not None and not previous.done():
+                print(f"⏭️ تخطي المهمة {job_name} - التنفيذ السابق لم ينته بعد")
+                with self._metrics_lock:
+                    self._job_metrics(job_name)['skipped_overlaps'] += 1
+                return None
+            
+            started = time.time()
+            with self._metrics_lock:
+                metrics = self._job_metrics(job_name)
+                metrics['runs'] += 1
+                metrics['last_started_at'] = datetime.now().isoformat()
+            
+            future = self._get_executor(lane).submit(func, *args, **kwargs)
+            self._running_jobs[job_name] = future
+        future.add_done_callback(lambda f: self._record_job_result(job_name, started, f))
+        return future
+    
+    def run_job(self, job_name, func, *args, timeout=None):
+        """
+        تشغيل مهمة على مجمّع العمال الداخلي وانتظار نتيجتها مع مهلة زمنية
+        
+        لا يتم تشغيل نسخة ثانية من نفس المهمة إذا كانت السابقة لا تزال قيد التنفيذ.
+        عند تجاوز المهلة تستمر المهمة في الخلفية لكن يعود المستدعي بفشل.
+        :param timeout: المهلة بالثواني (الافتراضي job_timeout_seconds)
+        :return: نتيجة المهمة أو False عند الفشل/التجاوز
+        """
+        timeout = timeout or self.job_timeout_seconds
+        future = self.submit_job(job_name, func, *args)
+        if future is None:
+            return False
+        
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            print(f"⏱️ تجاوزت المهمة {job_name} المهلة ({timeout} ثانية)")
+            with self._metrics_lock:
+                self._job_metrics(job_name)['timeouts'] += 1
+            return False
+        except Exception as e:
+            print(f"❌ خطأ في تنفيذ المهمة {job_name}: {e}")
+            return False
+    
+    def register_job(self, name, func, interval_minutes=None, daily_at=None, priority=50,
+                     max_runtime_seconds=None, jitter_seconds=0, args=(), lane=DEFAULT_LANE, cancellable=False):
+        """
+        تسجيل مهمة مُجدولة (يستبدل أي مهمة مسجلة بنفس الاسم)
+        
+        مثال: register_job('analyze', func, daily_at='03:00', priority=80, jitter_seconds=600,
+                           lane=MAINTENANCE_LANE)
+        :return: ScheduledJob
+        """
+        job = ScheduledJob(name, func, interval_minutes=interval_minutes, daily_at=daily_at,
+                           priority=priority,
+                           max_runtime_seconds=max_runtime_seconds or self.job_timeout_seconds,
+                           jitter_seconds=jitter_seconds, args=args, lane=lane, cancellable=cancellable)
+        job.schedule_next()
+        self.jobs[name] = job
+        return job
+    
+    def unregister_job(self, name):
+        """إزالة مهمة من السجل"""
+        return self.jobs.pop(name, None) is not None
+    
+    def run_registered_job(self, name):
+        """تشغيل مهمة مسجلة فوراً وانتظار نتيجتها حتى مهلتها (دون تغيير موعدها التالي)"""
+        job = self.jobs.get(name)
+        if job is None:
+            print(f"⚠️ مهمة غير مسجلة: {name}")
+            return False
+        future = self.submit_registered_job(name)
+        if future is None:
+            return False
+        try:
+            return future.result(timeout=job.max_runtime_seconds)
+        except FutureTimeoutError:
+            self._enforce_deadlines()
+            return False
+        except Exception as e:
+            print(f"❌ خطأ في تنفيذ المهمة {name}: {e}")
+            return False
+    
+    def submit_registered_job(self, name):
+        """
+        إرسال مهمة مسجلة إلى مسارها دون انتظار
+        
+        نهاية المهلة تُسجل عند بدء التنفيذ فعلياً، فلا يُحتسب الانتظار خلف مهمة أخرى في نفس المسار
+        :return: Future أو None (مهمة غير مسجلة أو تنفيذها السابق لم ينته)
+        """
+        job = self.jobs.get(name)
+        if job is None:
+            print(f"⚠️ مهمة غير مسجلة: {name}")
+            return None
+        stop_event = threading.Event()
+        func = functools.partial(job.func, stop_event=stop_event) if job.cancellable else job.func
+        
+        def run_with_deadline(*args):
+            with self._executor_lock:
+                self._deadlines[job.name] = (time.time() + job.max_runtime_seconds, stop_event)
+            return func(*args)
+        
+        return self.submit_job(job.name, run_with_deadline, *job.args, lane=job.lane)
+    
+    def _enforce_deadlines(self, now=None):
+        """
+        المهام التي تجاوزت max_runtime_seconds: ضبط stop_event وتسجيلها كمتجاوزة (مرة واحدة)
+        
+        :return: أسماء المهام التي تجاوزت مهلتها في هذا الفحص
+        """
+        now = now or time.time()
+        overdue = []
+        with self._executor_lock:
+            for name, (deadline, stop_event) in list(self._deadlines.items()):
+                future = self._running_jobs.get(name)
+                if future is None or future.done():
+                    del self._deadlines[name]
+                elif deadline <= now and not stop_event.is_set():
+                    stop_event.set()
+                    overdue.append(name)
+        
+        for name in overdue:
+            job = self.jobs.get(name)
+            if job is not None and job.cancellable:
+                print(f"⏱️ تجاوزت المهمة {name} المهلة ({job.max_runtime_seconds} ثانية) - طلب إيقافها")
+            else:
+                print(f"⏱️ تجاوزت المهمة {name} المهلة - لا تدعم الإيقاف وستكمل في الخلفية")
+            with self._metrics_lock:
+                self._job_metrics(name)['timeouts'] += 1
+        return overdue
+    
+    def run_pending(self):
+        """
+        إرسال المهام المستحقة حسب الأولوية دون انتظار نتائجها (للقائد فقط)
+        
+        يُعاد حساب الموعد التالي قبل الإرسال، فلا تتراكم التشغيلات الفائتة. المهمة التي
+        لا يزال تنفيذها السابق جارياً تُتخطى (skipped_overlaps)، ومهلة المهام الجارية
+        تُفحص في كل دورة
+        """
+        self._enforce_deadlines()
+        if not self.is_leader:
+            return
+        now = time.time()
+        due = sorted((job for job in self.jobs.values() if job.is_due(now)),
+                     key=lambda job: (job.priority, job.next_run))
+        for job in due:
+            if not self.is_running or not self.is_leader:
+                break
+            job.schedule_next()
+            self.submit_registered_job(job.name)
+    
+    def _seconds_until_next_job(self):
+        """مدة الانتظار حتى أقرب مهمة مستحقة أو نهاية مهلة (بحد أقصى poll_interval_seconds)"""
+        with self._executor_lock:
+            wake_times = [deadline for deadline, _ in self._deadlines.values()]
+        wake_times += [job.next_run for job in self.jobs.values() if job.next_run is not None]
+        if not wake_times:
+            return self.poll_interval_seconds
+        return min(max(min(wake_times) - time.time(), 0.5), self.poll_interval_seconds)
+    
+    def run_update_now(self, employee_id=None, wait_seconds=5):
+        """
+        تحديث فوري (للتشغيل اليدوي) عبر مجمّع العمال دون حجز المستدعي طويلاً
+        
+        :param wait_seconds: أقصى انتظار للنتيجة - بعده تستمر المهمة في الخلفية
+        :return: {'job', 'state': done | running | already_running, 'result'}
+        """
+        job_name = f"manual_update:{employee_id}" if employee_id else "manual_update"
+        future = self.submit_job(job_name, self.update_cumulative_data_direct, employee_id)
+        if future is None:
+            return {'job': job_name, 'state': 'already_running', 'result': None}
+        
+        wait_futures([future], timeout=wait_seconds)
+        if not future.done():
+            return {'job': job_name, 'state': 'running', 'result': None}
+        return {'job': job_name, 'state': 'done',
+                'result': future.exception() is None and future.result() is not False}
+    
+    def update_cumulative_data_direct(self, employee_id=None, full_sweep=False):
+        """
+        تحديث البيانات مباشرة عبر قاعدة البيانات
+        
+        بدون employee_id يتم تحديث الموظفين المُعلَّمين كمتغيرين فقط (سجل التغييرات)،
+        ويتم تحديث شامل لجميع الموظفين عند تغير اليوم أو عند طلبه صراحةً
+        """
         try:
             print(f"🔄 بدء تحديث البيانات التراكمية - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
+            init_change_tracking(cursor)
+            
+            today = datetime.now().date()
             
             # تحديد الموظفين المراد تحديثهم
             if employee_id:
-                employees_to_update = [(employee_id,)]
+                employees_to_update = [employee_id]
                 print(f"   📋 تحديث موظف محدد: {employee_id}")
+            elif full_sweep or self.last_full_sweep_date != today:
+                # الفترات (يومي/أسبوعي/شهري/سنوي) تعتمد على تاريخ اليوم - تحديث شامل عند تغيره
+                pop_dirty_employees(cursor)
+                employees_to_update = None
+                print("   📋 تحديث شامل لجميع الموظفين")
             else:
-                cursor.execute('SELECT DISTINCT employee_id FROM employee_exposure_sessions')
-                employees_to_update = cursor.fetchall()
-                print(f"   📋 تحديث جميع الموظفين: {len(employees_to_update)} موظف")
+                employees_to_update = pop_dirty_employees(cursor)
+                print(f"   📋 تحديث الموظفين المتغيرين فقط: {len(employees_to_update)} موظف")
             
+            # تمريرة SQL مجمَّعة واحدة + executemany واحد لجميع الموظفين المحددين
             updated_count = 0
-            
-            for emp in employees_to_update:
-                emp_id = emp[0]
-                
-                # التحقق من وجود جلسات نشطة أو تغييرات حديثة
-                cursor.execute('''
-                    SELECT COUNT(*) FROM employee_exposure_sessions 
-                    WHERE employee_id = ? AND (
-                        is_active = 1 OR 
-                        datetime(created_at) > datetime('now', '-1 hour')
-                    )
-                ''', (emp_id,))
-                
-                has_recent_activity = cursor.fetchone()[0] > 0
-                
-                # التحقق من آخر تحديث للبيانات التراكمية
-                cursor.execute('''
-                    SELECT last_updated FROM employee_cumulative_data 
-                    WHERE employee_id = ?
-                ''', (emp_id,))
-                
-                last_update_result = cursor.fetchone()
-                needs_update = True
-                
-                if last_update_result and not has_recent_activity:
-                    last_update = datetime.fromisoformat(last_update_result[0])
-                    if datetime.now() - last_update < timedelta(minutes=self.update_interval_minutes):
-                        needs_update = False
-                
-                if needs_update:
-                    self.calculate_and_update_employee_data(cursor, emp_id)
-                    updated_count += 1
-                    print(f"   ✅ تم تحديث بيانات الموظف: {emp_id}")
+            if employees_to_update is None or employees_to_update:
+                updated_count = update_employees_cumulative_data(cursor, employees_to_update)
             
             conn.commit()
             conn.close()
+            if updated_count:
+                bump_generation('cumulative')
+            
+            if not employee_id and (full_sweep or self.last_full_sweep_date != today):
+                self.last_full_sweep_date = today
             
             print(f"✨ انتهى التحديث - تم تحديث {updated_count} موظف")
             return True
@@ -92,170 +521,40 @@ class CumulativeDataScheduler:
             print(f"❌ خطأ في التحديث المباشر: {e}")
             return False
     
-    def update_cumulative_data_via_api(self, employee_id=None):
-        """تحديث البيانات عبر API"""
+    def rollover_sessions_direct(self):
+        """
+        ترحيل الجلسات العابرة لحد اليوم في معاملة واحدة ثم تحديث شامل للبيانات التراكمية
+        """
         try:
-            url = f"{self.api_base_url}/api/update_cumulative_data"
+            print(f"🌙 بدء ترحيل الجلسات - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             
-            data = {}
-            if employee_id:
-                data['employee_id'] = employee_id
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            init_change_tracking(cursor)
+            summary = rollover_sessions(cursor)
+            conn.commit()
+            conn.close()
+            if summary['closed'] or summary['split']:
+                bump_generation('sessions', 'readings')
             
-            response = requests.post(url, 
-                                   json=data, 
-                                   headers={'Content-Type': 'application/json'},
-                                   timeout=30)
+            self.last_rollover = dict(summary, at=datetime.now().isoformat())
+            print(f"   🔒 جلسات مغلقة: {summary['closed']}  ✂️ جلسات مقسومة: {summary['split']}  "
+                  f"📦 قراءات منقولة: {summary['readings_moved']}")
+            
+            # بدايات الفترات تغيرت مع اليوم الجديد - تحديث شامل
+            return self.update_cumulative_data_direct(None, True)
             
-            if response.status_code == 200:
-                result = response.json()
-                print(f"✅ تحديث عبر API ناجح: {result.get('message', 'تم التحديث')}")
-                return True
-            else:
-                print(f"⚠️ خطأ في API: {response.status_code}")
-                return False
-                
-        except requests.exceptions.RequestException as e:
-            print(f"🌐 خطأ في الاتصال بـ API: {e}")
-            return False
         except Exception as e:
-            print(f"❌ خطأ عام في التحديث عبر API: {e}")
+            print(f"❌ خطأ في ترحيل الجلسات: {e}")
             return False
     
-    def calculate_and_update_employee_data(self, cursor, employee_id):
-        """حساب وتحديث بيانات موظف واحد"""
-        
-        # حدود الأمان
-        daily_limit = 54.8
-        weekly_limit = 383.6  
-        monthly_limit = 1643.8
-        annual_limit = 20000.0
-        
-        # جلب بيانات الجلسات
-        cursor.execute('''
-            SELECT 
-                id, session_date, check_in_time, check_out_time,
-                exposure_duration_minutes, total_exposure, is_active
-            FROM employee_exposure_sessions 
-            WHERE employee_id = ?
-            ORDER BY session_date, check_in_time
-        ''', (employee_id,))
-        
-        sessions = cursor.fetchall()
-        
-        # حساب الإحصائيات
-        total_sessions = len(sessions)
-        completed_sessions = len([s for s in sessions if s[6] == 0])
-        active_sessions = len([s for s in sessions if s[6] == 1])
-        
-        # حساب المدد والجرعات
-        completed_session_data = [s for s in sessions if s[6] == 0 and s[5] is not None]
-        
-        total_duration_minutes = sum(s[4] or 0 for s in completed_session_data)
-        total_duration_hours = total_duration_minutes / 60
-        avg_session_duration = total_duration_minutes / max(completed_sessions, 1)
-        
-        exposures = [s[5] for s in completed_session_data if s[5] is not None]
-        total_cumulative_exposure = sum(exposures) if exposures else 0.0
-        avg_exposure_per_session = total_cumulative_exposure / max(completed_sessions, 1)
-        avg_dose_rate_per_hour = total_cumulative_exposure / max(total_duration_hours, 1)
-        max_exposure = max(exposures) if exposures else 0.0
-        min_exposure = min(exposures) if exposures else 0.0
-        
-        # حساب الجرعات حسب الفترات
-        today = datetime.now().date()
-        daily_exposure = sum(s[5] or 0 for s in completed_session_data if s[1] == str(today))
-        weekly_exposure = sum(s[5] or 0 for s in completed_session_data if (today - datetime.fromisoformat(s[1]).date()).days <= 7)
-        monthly_exposure = sum(s[5] or 0 for s in completed_session_data if (today - datetime.fromisoformat(s[1]).date()).days <= 30)
-        annual_exposure = sum(s[5] or 0 for s in completed_session_data if (today - datetime.fromisoformat(s[1]).date()).days <= 365)
-        
-        # حساب النسب المئوية
-        daily_percentage = (daily_exposure / daily_limit * 100) if daily_limit > 0 else 0
-        weekly_percentage = (weekly_exposure / weekly_limit * 100) if weekly_limit > 0 else 0
-        monthly_percentage = (monthly_exposure / monthly_limit * 100) if monthly_limit > 0 else 0
-        annual_percentage = (annual_exposure / annual_limit * 100) if annual_limit > 0 else 0
-        
-        # حساب عدد القراءات
-        total_readings = 0
-        for session in sessions:
-            cursor.execute('SELECT COUNT(*) FROM radiation_readings_local WHERE session_id = ?', (session[0],))
-            count = cursor.fetchone()[0]
-            total_readings += count
-        
-        avg_readings_per_session = total_readings / max(total_sessions, 1)
-        
-        # التواريخ المهمة
-        first_session_date = sessions[0][1] if sessions else None
-        last_session_date = sessions[-1][1] if sessions else None
-        completed_sessions_dates = [s[1] for s in sessions if s[6] == 0]
-        last_completed_session_date = max(completed_sessions_dates) if completed_sessions_dates else None
-        
-        # حالة الأمان
-        if annual_percentage >= 100:
-            safety_status = "خطر - تجاوز الحد السنوي"
-            safety_class = "danger"
-            risk_level = "عالي جداً"
-        elif annual_percentage >= 80:
-            safety_status = "تحذير - اقتراب من الحد السنوي"
-            safety_class = "warning" 
-            risk_level = "عالي"
-        elif annual_percentage >= 50:
-            safety_status = "مراقبة - نصف الحد السنوي"
-            safety_class = "info"
-            risk_level = "متوسط"
-        else:
-            safety_status = "آمن"
-            safety_class = "success"
-            risk_level = "منخفض"
-        
-        # تحديث أو إدراج البيانات
-        cursor.execute('''
-            INSERT OR REPLACE INTO employee_cumulative_data (
-                employee_id, total_sessions, completed_sessions, active_sessions,
-                total_duration_minutes, total_duration_hours, average_session_duration_minutes,
-                total_cumulative_exposure, average_exposure_per_session, average_dose_rate_per_hour,
-                max_single_session_exposure, min_single_session_exposure,
-                daily_exposure, weekly_exposure, monthly_exposure, annual_exposure,
-                daily_exposure_percentage, weekly_exposure_percentage, 
-                monthly_exposure_percentage, annual_exposure_percentage,
-                total_readings, average_readings_per_session,
-                first_session_date, last_session_date, last_completed_session_date,
-                safety_status, safety_class, risk_level, last_updated
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            employee_id,
-            total_sessions, completed_sessions, active_sessions,
-            total_duration_minutes, total_duration_hours, avg_session_duration,
-            total_cumulative_exposure, avg_exposure_per_session, avg_dose_rate_per_hour,
-            max_exposure, min_exposure,
-            daily_exposure, weekly_exposure, monthly_exposure, annual_exposure,
-            daily_percentage, weekly_percentage, monthly_percentage, annual_percentage,
-            total_readings, avg_readings_per_session,
-            first_session_date, last_session_date, last_completed_session_date,
-            safety_status, safety_class, risk_level,
-            datetime.now().isoformat()
-        ))
-    
-    def scheduled_update(self):
-        """المهمة المُجدولة للتحديث"""
-        print(f"⏰ تشغيل التحديث المُجدول - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        # محاولة التحديث عبر API أولاً
-        success = self.update_cumulative_data_via_api()
-        
-        # إذا فشل API، جرب التحديث المباشر
-        if not success:
-            print("🔄 محاولة التحديث المباشر...")
-            success = self.update_cumulative_data_direct()
-        
-        if success:
-            print("✅ تم التحديث المُجدول بنجاح")
-        else:
-            print("❌ فشل التحديث المُجدول")
-    
-    def forced_full_update(self):
-        """تحديث شامل إجباري لجميع الموظفين"""
-        print(f"🔥 تحديث شامل إجباري - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        self.update_cumulative_data_direct()
+    def apply_retention_direct(self, stop_event=None):
+        """تطبيق سياسات الاحتفاظ ثم إبطال التقارير المعتمدة على القراءات المحذوفة"""
+        result = self.retention.run_scheduled(stop_event)
+        readings = self.retention.last_run['tables'].get('radiation_readings_local', {})
+        if readings.get('deleted_rows'):
+            bump_generation('readings')
+        return result
     
     def start_scheduler(self):
         """بدء تشغيل المُجدول"""
@@ -263,27 +562,52 @@ class CumulativeDataScheduler:
             print("⚠️ المُجدول يعمل بالفعل!")
             return
         
-        # إعداد المهام المُجدولة
-        schedule.every(self.update_interval_minutes).minutes.do(self.scheduled_update)
-        schedule.every(self.force_update_interval_hours).hours.do(self.forced_full_update)
+        # إعداد المهام المُجدولة (الترحيل أولاً ثم تحديث البيانات التراكمية)
+        self.register_job('midnight_rollover', self.rollover_sessions_direct,
+                          daily_at=self.rollover_time, priority=0, max_runtime_seconds=600)
+        self.register_job('scheduled_update', self.update_cumulative_data_direct,
+                          interval_minutes=self.update_interval_minutes, priority=10)
+        self.register_job('wal_checkpoint', self.db_maintenance.run_checkpoint_cycle,
+                          interval_minutes=1, priority=20, max_runtime_seconds=30)
+        self.register_job('retention', self.apply_retention_direct,
+                          daily_at="02:30", priority=80, max_runtime_seconds=900, jitter_seconds=600,
+                          lane=MAINTENANCE_LANE, cancellable=True)
+        self.register_job('space_reclamation', self.db_maintenance.reclaim_space,
+                          interval_minutes=15, priority=90, max_runtime_seconds=600, jitter_seconds=120,
+                          lane=MAINTENANCE_LANE, cancellable=True)
         
-        # تحديث أولي
-        print("🚀 تشغيل تحديث أولي...")
-        self.forced_full_update()
+        # تحديث أولي (للقائد فقط - باقي العمليات في وضع الاستعداد)
+        # يشمل ترحيل الجلسات المتبقية من أيام سابقة إذا كان الخادم متوقفاً عند منتصف الليل.
+        # يُرسل إلى مجمّع العمال دون انتظار: start_scheduler يُستدعى أثناء استيراد app
+        # تحت gunicorn، وانتظار مهمة طويلة هنا يتجاوز مهلة العامل (--timeout)
+        if self.try_acquire_lease():
+            print("🚀 تشغيل تحديث أولي في الخلفية...")
+            self.submit_registered_job('midnight_rollover')
+        else:
+            print("⏸️ عملية أخرى تقود المُجدول - هذه العملية في وضع الاستعداد")
         
         self.is_running = True
+        self._stop_event.clear()
         
         def run_scheduler():
             while self.is_running:
-                schedule.run_pending()
-                time.sleep(10)  # فحص كل 10 ثواني
+                try:
+                    self.run_pending()
+                except Exception as e:
+                    print(f"❌ خطأ في حلقة المُجدول: {e}")
+                if self._stop_event.wait(self._seconds_until_next_job()):
+                    break
         
         self.update_thread = threading.Thread(target=run_scheduler, daemon=True)
         self.update_thread.start()
         
+        self.lease_thread = threading.Thread(target=self._lease_heartbeat, daemon=True)
+        self.lease_thread.start()
+        
         print(f"✅ تم تشغيل مُجدول البيانات التراكمية")
-        print(f"   📅 التحديث العادي: كل {self.update_interval_minutes} دقيقة")
-        print(f"   📅 التحديث الشامل: كل {self.force_update_interval_hours} ساعة")
+        print(f"   📅 تحديث الموظفين المتغيرين: كل {self.update_interval_minutes} دقيقة")
+        print(f"   📅 التحديث الشامل: عند تغير اليوم")
+        print(f"   🌙 ترحيل الجلسات: يومياً {self.rollover_time} ({time_calculator.local_tz.zone})")
     
     def stop_scheduler(self):
         """إيقاف المُجدول"""
@@ -292,10 +616,24 @@ class CumulativeDataScheduler:
             return
         
         self.is_running = False
-        schedule.clear()
+        self._stop_event.set()
+        self.jobs.clear()
         
         if self.update_thread:
             self.update_thread.join(timeout=5)
+        if self.lease_thread:
+            self.lease_thread.join(timeout=5)
+        self.release_lease()
+        
+        # إيقاف مجمّعات العمال وإلغاء المهام التي لم تبدأ بعد، وطلب إيقاف مهام الصيانة الجارية
+        with self._executor_lock:
+            for _, stop_event in self._deadlines.values():
+                stop_event.set()
+            for executor in self._executors.values():
+                executor.shutdown(wait=False, cancel_futures=True)
+            self._executors.clear()
+            self._deadlines.clear()
+            self._running_jobs.clear()
         
         print("⏹️ تم إيقاف مُجدول البيانات التراكمية")
     
@@ -303,10 +641,40 @@ class CumulativeDataScheduler:
         """الحصول على حالة المُجدول"""
         return {
             'is_running': self.is_running,
+            'is_leader': self.is_leader,
+            'instance_id': self.instance_id,
+            'lease_ttl_seconds': self.lease_ttl_seconds,
             'update_interval_minutes': self.update_interval_minutes,
-            'force_update_interval_hours': self.force_update_interval_hours,
-            'next_runs': [str(job.next_run) for job in schedule.jobs] if self.is_running else []
+            'last_full_sweep_date': str(self.last_full_sweep_date) if self.last_full_sweep_date else None,
+            'rollover_time': self.rollover_time,
+            'last_rollover': self.last_rollover,
+            'max_workers': self.max_workers,
+            'job_timeout_seconds': self.job_timeout_seconds,
+            'running_jobs': [name for name, future in list(self._running_jobs.items()) if not future.done()],
+            'next_runs': [job.to_dict()['next_run'] for job in self.jobs.values()],
+            'jobs': self.get_jobs_status(),
+            'database': self.db_maintenance.get_metrics(),
+            'last_retention': self.retention.last_run
         }
+    
+    def get_jobs_status(self):
+        """إعدادات ومقاييس جميع المهام (المسجلة واليدوية)"""
+        with self._metrics_lock:
+            metrics = {name: dict(values) for name, values in self.job_metrics.items()}
+        running = {name.split(':', 1)[0] for name, future in list(self._running_jobs.items())
+                   if not future.done()}
+        
+        jobs = []
+        for name in sorted(set(self.jobs) | set(metrics),
+                           key=lambda n: (self.jobs[n].priority if n in self.jobs else 1000, n)):
+            entry = self.jobs[name].to_dict() if name in self.jobs else {'name': name}
+            values = metrics.get(name) or _new_job_metrics()
+            completed = values['successes'] + values['failures']
+            values['avg_duration_seconds'] = round(values.pop('total_duration_seconds') / completed, 3) if completed else None
+            entry.update(values)
+            entry['running'] = name in running
+            jobs.append(entry)
+        return jobs
 
 
 # مثال للاستخدام المستقل
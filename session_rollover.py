@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ترحيل جلسات التعرض عند منتصف الليل (بتوقيت بغداد)
+
+كل جلسة نشطة بتاريخ سابق لليوم تعبر حد اليوم، فتُعالج دفعة واحدة داخل معاملة واحدة:
+- إذا تجاوزت الجلسة مدة الخروج التلقائي (auto_checkout_hours) قبل منتصف الليل
+  تُغلق عند انتهاء تلك المدة (خروج منسي)
+- وإلا تُقسم عند منتصف الليل: يُغلق جزء اليوم السابق وتُنشأ جلسة متابعة لليوم الجديد
+  وتُنقل إليها القراءات المسجلة بعد منتصف الليل
+
+يُحسب التعرض النهائي من قراءات الجلسة بنفس طريقة end_exposure_session،
+ثم يُحدَّث سجل الجرعات اليومية وتُعلَّم الموظفين كمتغيرين
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from time_utils import time_calculator, quantize_exposure
+from cumulative_data import refresh_daily_dose_ledger, mark_employees_dirty
+
+# القيمة الافتراضية إذا لم يوجد الإعداد في system_settings
+DEFAULT_AUTO_CHECKOUT_HOURS = 12.0
+
+ROLLOVER_NOTE = ' [تم الترحيل عند منتصف الليل]'
+AUTO_CLOSE_NOTE = ' [تم الإغلاق التلقائي]'
+
+def get_auto_checkout_hours(cursor):
+    """قراءة مدة الخروج التلقائي من إعدادات النظام"""
+    try:
+        cursor.execute("SELECT setting_value FROM system_settings WHERE setting_key = 'auto_checkout_hours'")
+        row = cursor.fetchone()
+        if row and row[0]:
+            return float(row[0])
+    except Exception:
+        pass
+    return DEFAULT_AUTO_CHECKOUT_HOURS
+
+def day_start(day):
+    """بداية اليوم (منتصف الليل) بالتوقيت المحلي"""
+    return time_calculator.local_tz.localize(datetime(day.year, day.month, day.day))
+
+def _fetch_session_readings(cursor, session_ids):
+    """قراءات الجلسات المحددة مجمعة حسب الجلسة ومرتبة زمنياً"""
+    readings = {session_id: [] for session_id in session_ids}
+    placeholders = ','.join('?' * len(session_ids))
+    cursor.execute(f'''SELECT id, session_id, absorbed_dose_rate, total_absorbed_dose, timestamp
+                       FROM radiation_readings_local
+                       WHERE session_id IN ({placeholders})
+                       ORDER BY session_id, timestamp, id''', list(session_ids))
+    for row in cursor.fetchall():
+        readings[row[1]].append(row)
+    return readings
+
+def _finalize_exposure(check_in_dt, close_dt, readings):
+    """
+    حساب إحصائيات الجلسة من قراءاتها حتى وقت الإغلاق
+
+    :return: (total_exposure, average_dose_rate, max_dose_rate, min_dose_rate, final_total_dose)
+    """
+    if not readings:
+        return 0.0, 0.0, 0.0, 0.0, None
+
+    dose_rates = np.array([float(r[2] or 0.0) for r in readings], dtype='float64')
+    _, _, interval_hours, _ = time_calculator.calculate_pairwise_durations_array(
+        [r[4] for r in readings], start_time=check_in_dt
+    )
+
+    # الفترة الأخيرة حتى الإغلاق بمعدل آخر قراءة
+    last_reading_time = time_calculator.normalize_datetime(readings[-1][4])
+    final_hours = time_calculator.calculate_duration_seconds(last_reading_time, close_dt) / 3600.0
+    if final_hours > 0:
+        dose_rates = np.append(dose_rates, dose_rates[-1])
+        interval_hours = np.append(interval_hours, final_hours)
+
+    total_exposure = float(quantize_exposure(time_calculator.integrate_exposure_float(dose_rates, interval_hours)))
+    rates = dose_rates[:len(readings)]
+    return (total_exposure, float(rates.mean()), float(rates.max()), float(rates.min()),
+            readings[-1][3])
+
+def rollover_sessions(cursor, now=None):
+    """
+    ترحيل جميع الجلسات النشطة التي تعبر حد اليوم (لا تقوم بـ commit)
+
+    تُكرر المعالجة حتى لا تبقى جلسة نشطة بتاريخ سابق (مثلاً بعد توقف الخادم عدة أيام)
+    :return: ملخص {'closed', 'split', 'readings_moved', 'readings_detached', 'ledger_days'}
+    """
+    now = time_calculator.normalize_datetime(now) if now else time_calculator.get_current_time()
+    today = now.date()
+    auto_checkout = timedelta(hours=get_auto_checkout_hours(cursor))
+
+    summary = {'closed': 0, 'split': 0, 'readings_moved': 0, 'readings_detached': 0, 'ledger_days': 0}
+    touched_employees = set()
+
+    while True:
+        cursor.execute('''SELECT id, employee_id, check_in_time, initial_total_dose, session_date
+                          FROM employee_exposure_sessions
+                          WHERE is_active = 1 AND DATE(session_date) < DATE(?)''', (str(today),))
+        sessions = cursor.fetchall()
+        if not sessions:
+            break
+
+        readings_by_session = _fetch_session_readings(cursor, [s[0] for s in sessions])
+        session_updates = []
+        moved_readings = []
+        detached_readings = []
+        ledger_days = set()
+
+        for session_id, employee_id, check_in_time, initial_dose, session_date in sessions:
+            session_day = datetime.strptime(str(session_date)[:10], '%Y-%m-%d').date()
+            boundary = day_start(session_day + timedelta(days=1))
+            check_in_dt = time_calculator.normalize_datetime(check_in_time)
+            checkout_deadline = check_in_dt + auto_checkout
+            split = checkout_deadline >= boundary
+            close_dt = boundary if split else max(checkout_deadline, check_in_dt)
+
+            readings = readings_by_session[session_id]
+            reading_times = time_calculator.normalize_datetime_array([r[4] for r in readings])
+            inside = reading_times.as_unit('ns').asi8 < pd.Timestamp(close_dt).value
+            kept = [r for r, keep in zip(readings, inside) if keep]
+            overflow = [r for r, keep in zip(readings, inside) if not keep]
+
+            exposure, avg_rate, max_rate, min_rate, final_dose = _finalize_exposure(check_in_dt, close_dt, kept)
+            if final_dose is None:
+                final_dose = initial_dose
+            duration_minutes = int(time_calculator.calculate_duration_seconds(check_in_dt, close_dt) / 60)
+
+            session_updates.append((close_dt, final_dose, duration_minutes, avg_rate, exposure,
+                                    max_rate, min_rate, exposure, len(kept),
+                                    ROLLOVER_NOTE if split else AUTO_CLOSE_NOTE, session_id))
+
+            if split:
+                # جلسة متابعة لليوم التالي تبدأ من منتصف الليل بالجرعة التي انتهى بها اليوم السابق
+                cursor.execute('''INSERT INTO employee_exposure_sessions
+                                  (employee_id, check_in_time, initial_total_dose, session_date,
+                                   is_active, daily_total_exposure)
+                                  VALUES (?, ?, ?, ?, 1, 0.0)''',
+                               (employee_id, boundary, final_dose, boundary.date()))
+                continuation_id = cursor.lastrowid
+                moved_readings.extend((continuation_id, r[0]) for r in overflow)
+                summary['split'] += 1
+            else:
+                # قراءات ما بعد الخروج التلقائي لا تخص الموظف - تبقى كقراءات عامة
+                detached_readings.extend((r[0],) for r in overflow)
+                summary['closed'] += 1
+
+            ledger_days.add((employee_id, str(session_date)))
+            touched_employees.add(employee_id)
+
+        cursor.executemany('UPDATE radiation_readings_local SET session_id = ? WHERE id = ?', moved_readings)
+        cursor.executemany('UPDATE radiation_readings_local SET session_id = NULL WHERE id = ?', detached_readings)
+        cursor.executemany('''UPDATE employee_exposure_sessions
+                              SET check_out_time = ?,
+                                  final_total_dose = ?,
+                                  exposure_duration_minutes = ?,
+                                  average_dose_rate = ?,
+                                  total_exposure = ?,
+                                  max_dose_rate = ?,
+                                  min_dose_rate = ?,
+                                  daily_total_exposure = ?,
+                                  readings_count = ?,
+                                  notes = COALESCE(notes, '') || ?,
+                                  is_active = 0
+                              WHERE id = ?''', session_updates)
+
+        for employee_id, dose_date in ledger_days:
+            refresh_daily_dose_ledger(cursor, employee_id, dose_date)
+
+        summary['readings_moved'] += len(moved_readings)
+        summary['readings_detached'] += len(detached_readings)
+        summary['ledger_days'] += len(ledger_days)
+
+    if touched_employees:
+        mark_employees_dirty(cursor, list(touched_employees))
+    return summary
@@ -158,6 +158,40 @@ async function makeRequest(url, options = {}) {
     }
 }
 
+// آخر استجابة و ETag لكل رابط - للاستطلاع الدوري بطلبات شرطية (If-None-Match)
+const etagResponses = new Map();
+
+async function fetchJSONWithETag(url, options = {}) {
+    // إزالة معامل كسر التخزين (t) حتى يبقى المفتاح ثابتاً بين الاستطلاعات
+    const requestUrl = new URL(url, window.location.origin);
+    requestUrl.searchParams.delete('t');
+    const key = requestUrl.pathname + requestUrl.search;
+
+    const cached = etagResponses.get(key);
+    const headers = { ...(options.headers || {}) };
+    if (cached) {
+        headers['If-None-Match'] = cached.etag;
+    }
+
+    // no-store: المتصفح لا يضيف طلباته الشرطية الخاصة، فتصل 304 إلى هنا مباشرة
+    const response = await fetch(key, { ...options, headers, cache: 'no-store' });
+    if (response.status === 304 && cached) {
+        return cached.data;
+    }
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        etagResponses.set(key, { etag, data });
+    } else {
+        etagResponses.delete(key);
+    }
+    return data;
+}
+
 // ===================================
 // وظائف التحكم في الواجهة
 // ===================================
@@ -283,6 +317,7 @@ window.RadMeterCommon = {
     validateEmployeeName,
     validateForm,
     makeRequest,
+    fetchJSONWithETag,
     formatDateTime,
     formatTime,
     formatDate,
@@ -54,27 +54,8 @@ class RadiationMonitor {
         try {
             console.log('📡 جاري جلب بيانات الإشعاع...');
 
-            // إضافة timestamp لمنع التخزين المؤقت
-            const timestamp = new Date().getTime();
-            const url = `/api/radiation_data?t=${timestamp}`;
-            console.log('🌐 URL:', url);
-
-            const response = await fetch(url, {
-                cache: 'no-cache',
-                headers: {
-                    'Cache-Control': 'no-cache',
-                    'Pragma': 'no-cache'
-                }
-            });
-
-            console.log('📡 Response status:', response.status);
-            console.log('📡 Response ok:', response.ok);
-
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-
-            const data = await response.json();
+            // طلب شرطي (If-None-Match): إذا لم تتغير القراءة يرد الخادم 304 وتُستخدم النسخة السابقة
+            const data = await fetchJSONWithETag('/api/radiation_data');
             console.log('📥 Raw response data:', data);
 
             if (data.success) {
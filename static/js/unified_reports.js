@@ -1,4 +1,13 @@
 // التقارير الموحدة - JavaScript
+
+// الحقول المعروضة في جدول الجرعات التراكمية (projection في /api/cumulative_doses_fast)
+const CUMULATIVE_TABLE_FIELDS = [
+    'employee_id', 'name', 'daily_exposure', 'weekly_exposure', 'monthly_exposure',
+    'annual_exposure', 'annual_exposure_percentage', 'total_cumulative_exposure',
+    'total_sessions', 'total_readings', 'total_duration_hours', 'total_duration_minutes',
+    'average_dose_rate_per_hour', 'safety_status', 'safety_class'
+];
+
 class UnifiedReports {
     constructor() {
         this.currentData = null;
@@ -7,18 +16,47 @@ class UnifiedReports {
         this.cumulativeData = null;
         this.alertsData = null;
         this.currentAlertFilter = 'all';
+        this.currentFilters = {};
+        this.nextCursor = null;  // مؤشر الصفحة التالية من /api/unified_reports
+        this.attendanceSummary = null;
         this.init();
     }
 
     init() {
         console.log('🚀 تهيئة التقارير الموحدة...');
-        this.loadEmployees();
-        this.loadReports();
-        this.loadCumulativeDoses();
-        this.loadAlerts();
+        this.loadDashboard();
         this.setupEventListeners();
     }
 
+    async loadDashboard() {
+        // الحالة الأولية كاملة في طلب واحد (الموظفون + التقارير + الجرعات التراكمية + التنبيهات)
+        try {
+            console.log('📦 تحميل الحالة الأولية للصفحة...');
+            const params = new URLSearchParams({
+                sections: 'reports,cumulative,alerts',
+                cumulative_shape: 'compact',
+                cumulative_fields: CUMULATIVE_TABLE_FIELDS.join(','),
+                alerts_limit: '100'
+            });
+            const data = await fetchJSONWithETag(`/api/dashboard_bundle?${params}`);
+            if (!data.success) {
+                throw new Error(data.error || 'خطأ في تحميل الصفحة');
+            }
+
+            this.applyEmployees(data.reports.employees);
+            this.applyReports(data.reports);
+            this.applyCumulativeDoses(data.cumulative);
+            this.applyAlerts(data.alerts);
+            console.log(`✅ تم تحميل الصفحة من لقطة واحدة (الإصدار ${data.version})`);
+        } catch (error) {
+            console.warn('⚠️ فشل تحميل الحزمة، التحميل بطلبات منفصلة', error);
+            this.loadEmployees();
+            this.loadReports();
+            this.loadCumulativeDoses();
+            this.loadAlerts();
+        }
+    }
+
     setupEventListeners() {
         // إعداد مستمعي الأحداث
         document.getElementById('employeeFilter').addEventListener('change', () => {
@@ -72,21 +110,12 @@ class UnifiedReports {
     async loadEmployees() {
         try {
             console.log('📋 تحميل قائمة الموظفين...');
-            const response = await fetch('/api/unified_reports');
+            // قائمة الموظفين ترجع مع الصفحة الأولى - صفحة بحجم 1 تكفي
+            const response = await fetch('/api/unified_reports?limit=1');
             const data = await response.json();
 
             if (data.success) {
-                const employeeSelect = document.getElementById('employeeFilter');
-                employeeSelect.innerHTML = '<option value="">All employees</option>';
-
-                data.employees.forEach(employee => {
-                    const option = document.createElement('option');
-                    option.value = employee.employee_id;
-                    option.textContent = `${employee.name} (${employee.employee_id})`;
-                    employeeSelect.appendChild(option);
-                });
-
-                console.log(`✅ تم تحميل ${data.employees.length} موظف`);
+                this.applyEmployees(data.employees);
             }
         } catch (error) {
             console.error('❌ خطأ في تحميل الموظفين:', error);
@@ -94,7 +123,21 @@ class UnifiedReports {
         }
     }
 
-    async loadReports(filters = {}) {
+    applyEmployees(employees) {
+        const employeeSelect = document.getElementById('employeeFilter');
+        employeeSelect.innerHTML = '<option value="">All employees</option>';
+
+        employees.forEach(employee => {
+            const option = document.createElement('option');
+            option.value = employee.employee_id;
+            option.textContent = `${employee.name} (${employee.employee_id})`;
+            employeeSelect.appendChild(option);
+        });
+
+        console.log(`✅ تم تحميل ${employees.length} موظف`);
+    }
+
+    async loadReports(filters = {}, append = false) {
         try {
             console.log('📊 تحميل التقارير...', filters);
             
@@ -103,18 +146,13 @@ class UnifiedReports {
             if (filters.employee_id) params.append('employee_id', filters.employee_id);
             if (filters.date_from) params.append('date_from', filters.date_from);
             if (filters.date_to) params.append('date_to', filters.date_to);
+            if (append && this.nextCursor) params.append('cursor', this.nextCursor);
 
             const response = await fetch(`/api/unified_reports?${params}`);
             const data = await response.json();
 
             if (data.success) {
-                this.currentData = data;
-                this.filteredData = data.attendance_records;
-                this.exposureData = data.exposure_records || [];
-                this.updateStats();
-                this.updateAttendanceTable();
-                this.updateExposureTable();
-                console.log(`✅ تم تحميل ${data.attendance_records.length} سجل حضور و ${this.exposureData.length} سجل تعرض`);
+                this.applyReports(data, filters, append);
             } else {
                 throw new Error(data.error || 'خطأ في تحميل البيانات');
             }
@@ -124,13 +162,46 @@ class UnifiedReports {
         }
     }
 
+    applyReports(data, filters = {}, append = false) {
+        if (append) {
+            this.filteredData = this.filteredData.concat(data.attendance_records);
+            this.exposureData = this.exposureData.concat(data.exposure_records || []);
+        } else {
+            this.currentData = data;
+            this.currentFilters = filters;
+            this.filteredData = data.attendance_records;
+            this.exposureData = data.exposure_records || [];
+            this.attendanceSummary = data.attendance_summary || null;
+        }
+        this.nextCursor = data.next_cursor;
+        this.updateStats();
+        this.updateAttendanceTable();
+        this.updateExposureTable();
+        this.updateLoadMoreButton();
+        console.log(`✅ تم تحميل ${this.filteredData.length} سجل حضور و ${this.exposureData.length} سجل تعرض`);
+    }
+
+    loadMoreReports() {
+        if (this.nextCursor) {
+            this.loadReports(this.currentFilters, true);
+        }
+    }
+
+    updateLoadMoreButton() {
+        const button = document.getElementById('loadMoreReports');
+        if (!button) return;
+        button.style.display = this.nextCursor ? '' : 'none';
+    }
+
     updateStats() {
         if (!this.filteredData) return;
 
-        const totalRecords = this.filteredData.length;
-        const checkInRecords = this.filteredData.filter(r => r.check_type === 'check_in').length;
-        const checkOutRecords = this.filteredData.filter(r => r.check_type === 'check_out').length;
-        const activeEmployees = new Set(this.filteredData.map(r => r.employee_id)).size;
+        // الإحصائيات من الخادم لكامل النتائج (الصفحات المحملة جزء منها فقط)
+        const summary = this.attendanceSummary;
+        const totalRecords = summary ? summary.total_records : this.filteredData.length;
+        const checkInRecords = summary ? summary.check_in_records : this.filteredData.filter(r => r.check_type === 'check_in').length;
+        const checkOutRecords = summary ? summary.check_out_records : this.filteredData.filter(r => r.check_type === 'check_out').length;
+        const activeEmployees = summary ? summary.active_employees : new Set(this.filteredData.map(r => r.employee_id)).size;
 
         // تحديث الإحصائيات
         document.getElementById('totalRecords').textContent = totalRecords;
@@ -336,17 +407,16 @@ class UnifiedReports {
             
             const params = new URLSearchParams();
             if (employeeId) params.append('employee_id', employeeId);
+            // الشكل المضغوط: أسماء الحقول مرة واحدة + الصفوف كمصفوفات، والحقول المعروضة فقط
+            params.append('shape', 'compact');
+            params.append('fields', CUMULATIVE_TABLE_FIELDS.join(','));
 
             // ✅ استخدام الواجهة السريعة المتزامنة مع جدول البيانات التراكمية
-            const response = await fetch(`/api/cumulative_doses_fast?${params}`);
-            const data = await response.json();
+            // طلب شرطي: 304 عند عدم تحديث الجدول التراكمي منذ آخر تحميل
+            const data = await fetchJSONWithETag(`/api/cumulative_doses_fast?${params}`);
 
             if (data.success) {
-                // الواجهة السريعة تُرجع حقلي employees و cumulative_data - نستخدم cumulative_data
-                this.cumulativeData = data.cumulative_data || data.employees || [];
-                console.log('📦 بيانات الجرعات التراكمية (Raw):', this.cumulativeData);
-                this.updateCumulativeTable();
-                console.log(`✅ تم تحميل ${this.cumulativeData.length} موظف مع البيانات التراكمية (سريع)`);
+                this.applyCumulativeDoses(data);
             } else {
                 throw new Error(data.error || 'خطأ في تحميل البيانات التراكمية');
             }
@@ -356,6 +426,14 @@ class UnifiedReports {
         }
     }
 
+    applyCumulativeDoses(data) {
+        this.cumulativeData = data.rows.map(row =>
+            Object.fromEntries(data.fields.map((field, index) => [field, row[index]])));
+        console.log('📦 بيانات الجرعات التراكمية (Raw):', this.cumulativeData);
+        this.updateCumulativeTable();
+        console.log(`✅ تم تحميل ${this.cumulativeData.length} موظف مع البيانات التراكمية (سريع)`);
+    }
+
     updateCumulativeTable() {
         const tbody = document.getElementById('cumulativeTableBody');
 
@@ -389,37 +467,34 @@ class UnifiedReports {
                 return s;
             };
             const safetyText = mapSafety(record.safety_status);
-            if (record.status_class === 'success') {
+            if (record.safety_class === 'success') {
                 statusBadge = `<span class=\"badge bg-success\"><i class=\"fas fa-check-circle me-1\"></i> ${safetyText}</span>`;
-            } else if (record.status_class === 'info') {
+            } else if (record.safety_class === 'info') {
                 statusBadge = `<span class=\"badge bg-info\"><i class=\"fas fa-eye me-1\"></i> ${safetyText}</span>`;
-            } else if (record.status_class === 'warning') {
+            } else if (record.safety_class === 'warning') {
                 statusBadge = `<span class=\"badge bg-warning\"><i class=\"fas fa-exclamation-triangle me-1\"></i> ${safetyText}</span>`;
-            } else if (record.status_class === 'danger') {
+            } else if (record.safety_class === 'danger') {
                 statusBadge = `<span class=\"badge bg-danger\"><i class=\"fas fa-radiation me-1\"></i> ${safetyText}</span>`;
             }
 
             // شريط تقدم نسبة الجرعة السنوية
-            const progressColor = record.annual_percentage >= 80 ? 'bg-danger' : 
-                                  record.annual_percentage >= 50 ? 'bg-warning' : 'bg-success';
+            const progressColor = record.annual_exposure_percentage >= 80 ? 'bg-danger' : 
+                                  record.annual_exposure_percentage >= 50 ? 'bg-warning' : 'bg-success';
 
             // ضمان كون القيم رقمية قبل التنسيق
-            const daily = Number(record.daily_dose || 0);
-            const dailyPct = Number(record.daily_percentage || 0);
-            const weekly = Number(record.weekly_dose || 0);
-            const weeklyPct = Number(record.weekly_percentage || 0);
-            const monthly = Number(record.monthly_dose || 0);
-            const monthlyPct = Number(record.monthly_percentage || 0);
-            const annual = Number(record.annual_dose || 0);
-            const annualPct = Number(record.annual_percentage || 0);
-            const totalDose = Number(record.total_cumulative_dose || 0);
+            const daily = Number(record.daily_exposure || 0);
+            const weekly = Number(record.weekly_exposure || 0);
+            const monthly = Number(record.monthly_exposure || 0);
+            const annual = Number(record.annual_exposure || 0);
+            const annualPct = Number(record.annual_exposure_percentage || 0);
+            const totalDose = Number(record.total_cumulative_exposure || 0);
             const totalSessions = Number(record.total_sessions || 0);
             const totalReadings = Number(record.total_readings || 0);
 
             // ✨ حساب المدة ومعدل الجرعة
             const durationHours = Number(record.total_duration_hours || 0);
             const durationMinutes = Number(record.total_duration_minutes || 0);
-            const doseRatePerHour = Number(record.dose_rate_per_hour || 0);
+            const doseRatePerHour = Number(record.average_dose_rate_per_hour || 0);
             
             row.innerHTML = `
                 <td>
@@ -658,14 +733,10 @@ class UnifiedReports {
             console.log('🔔 تحميل التنبيهات...');
             
             const unreadParam = this.currentAlertFilter === 'unread' ? '&unread_only=true' : '';
-            const response = await fetch(`/api/alerts?limit=100${unreadParam}`);
-            const data = await response.json();
+            const data = await fetchJSONWithETag(`/api/alerts?limit=100${unreadParam}`);
 
             if (data.success) {
-                this.alertsData = data.alerts;
-                this.updateAlertsTable();
-                this.updateAlertsBadge(data.unread_count);
-                console.log(`✅ تم تحميل ${data.alerts.length} تنبيه`);
+                this.applyAlerts(data);
             } else {
                 throw new Error(data.error || 'خطأ في تحميل التنبيهات');
             }
@@ -675,6 +746,13 @@ class UnifiedReports {
         }
     }
 
+    applyAlerts(data) {
+        this.alertsData = data.alerts;
+        this.updateAlertsTable();
+        this.updateAlertsBadge(data.unread_count);
+        console.log(`✅ تم تحميل ${data.alerts.length} تنبيه`);
+    }
+
     updateAlertsTable() {
         const tbody = document.getElementById('alertsTableBody');
 
@@ -830,6 +908,13 @@ function filterAlerts(filter) {
     }
 }
 
+// دالة عامة لتحميل الصفحة التالية من السجلات (يمكن استدعاؤها من HTML)
+function loadMoreReports() {
+    if (window.unifiedReports) {
+        window.unifiedReports.loadMoreReports();
+    }
+}
+
 // دالة عامة لتطبيق الفلاتر (يمكن استدعاؤها من HTML)
 function applyFilters() {
     if (window.unifiedReports) {
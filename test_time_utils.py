@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+اختبارات توحيد الأوقات: المسار المتجه normalize_datetime_array مقابل normalize_datetime
+
+الاستخدام:
+    python -m pytest -q test_time_utils.py
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from time_utils import PrecisionTimeCalculator
+
+calc = PrecisionTimeCalculator()
+
+
+def scalar_reference(values):
+    """النتيجة المتوقعة: normalize_datetime لكل قيمة على حدة"""
+    return pd.DatetimeIndex(pd.to_datetime([calc.normalize_datetime(v) for v in values], utc=True))
+
+
+def assert_same_instants(result, expected):
+    assert isinstance(result, pd.DatetimeIndex)
+    assert str(result.tz) == str(calc.local_tz)
+    assert list(result.as_unit('ns').asi8) == list(expected.as_unit('ns').asi8)
+
+
+def test_datetime64_ndarray_matches_scalar():
+    values = np.array(['2026-10-19T10:00:00', '2026-01-01T00:00:00.123456', '2025-12-31T23:59:59'],
+                      dtype='datetime64[ns]')
+    expected = scalar_reference([pd.Timestamp(v).to_pydatetime() for v in values])
+    assert_same_instants(calc.normalize_datetime_array(values), expected)
+
+
+def test_datetime64_seconds_ndarray_matches_scalar():
+    values = np.array(['2026-10-19T10:00:00', '2026-10-20T11:30:00'], dtype='datetime64[s]')
+    expected = scalar_reference([pd.Timestamp(v).to_pydatetime() for v in values])
+    assert_same_instants(calc.normalize_datetime_array(values), expected)
+
+
+def test_aware_datetimes_in_different_zones_match_scalar():
+    values = [
+        datetime(2026, 1, 1, 12, tzinfo=timezone.utc),
+        datetime(2026, 1, 1, 12, tzinfo=timezone(timedelta(hours=5))),
+        datetime(2026, 1, 1, 12, tzinfo=timezone(timedelta(hours=-4))),
+    ]
+    assert_same_instants(calc.normalize_datetime_array(values), scalar_reference(values))
+
+
+def test_mixed_naive_aware_and_strings_match_scalar():
+    values = [
+        datetime(2026, 1, 1, 12),
+        datetime(2026, 1, 1, 12, tzinfo=timezone(timedelta(hours=5))),
+        '2026-01-01 12:00:00',
+        '2026-01-01T09:00:00Z',
+    ]
+    assert_same_instants(calc.normalize_datetime_array(values), scalar_reference(values))
+
+
+def test_strings_match_scalar():
+    values = ['2026-01-01 12:00:00', '2026-01-01T12:00:00.5', '2026-01-01T09:00:00+00:00',
+              '2026-01-01T09:00:00Z']
+    assert_same_instants(calc.normalize_datetime_array(values), scalar_reference(values))
+
+
+def test_empty_input():
+    result = calc.normalize_datetime_array(np.array([], dtype='datetime64[ns]'))
+    assert len(result) == 0
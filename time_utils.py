@@ -5,9 +5,13 @@ Enhanced Time Calculation System for Higher Precision in Radiation Exposure Meas
 """
 
 from datetime import datetime, timezone, timedelta
-from typing import Union, Tuple, Optional
+from functools import lru_cache
+from typing import Iterator, Union, Tuple, Optional
+import numpy as np
+import pandas as pd
 import pytz
 from decimal import Decimal, ROUND_HALF_UP
+import re
 import time
 
 # إعدادات المنطقة الزمنية
@@ -20,6 +24,81 @@ try:
 except Exception:
     _DEFAULT_LANG = 'en'
 
+# دقة التعرض المحفوظ/المُرجع (μSv بست خانات عشرية)
+EXPOSURE_QUANTUM = Decimal('0.000001')
+
+# حجم ذاكرة التحليل المؤقتة للنصوص المتكررة (مثل أوقات الدخول للجلسات)
+PARSE_CACHE_SIZE = 4096
+
+# أنماط مُجمّعة مسبقاً بدلاً من تجميعها في كل استدعاء
+_TZ_OFFSET_SUFFIX_RE = re.compile(r'[+-]\d{2}:\d{2}$')
+# أنواع المدخلات المقبولة في الواجهات المتجهة
+ArrayLike = Union[list, tuple, np.ndarray, pd.Series, pd.Index]
+
+_LEGACY_FORMATS = (
+    '%Y-%m-%d %H:%M:%S.%f',  # مع الميكروثانية
+    '%Y-%m-%d %H:%M:%S',     # بدون الميكروثانية
+    '%Y-%m-%dT%H:%M:%S.%f',  # ISO format مع الميكروثانية
+    '%Y-%m-%dT%H:%M:%S',     # ISO format بدون الميكروثانية
+)
+
+def neumaier_sum(values) -> float:
+    """
+    جمع float64 معوَّض (Kahan-Babuška / Neumaier)
+
+    يحتفظ بالخطأ المتراكم في متغير تعويض منفصل، فيبقى الخطأ ثابتاً تقريباً
+    بدلاً من أن ينمو مع عدد الحدود.
+    """
+    total = 0.0
+    compensation = 0.0
+    for value in values:
+        value = float(value)
+        t = total + value
+        if abs(total) >= abs(value):
+            compensation += (total - t) + value
+        else:
+            compensation += (value - t) + total
+        total = t
+    return total + compensation
+
+def quantize_exposure(value: Union[float, Decimal]) -> Decimal:
+    """تقريب التعرض مرة واحدة عند حدود الحفظ/الإرجاع إلى 6 خانات عشرية (ROUND_HALF_UP)"""
+    return Decimal(str(value)).quantize(EXPOSURE_QUANTUM, rounding=ROUND_HALF_UP)
+
+def round_half_up_array(values: np.ndarray, decimals: int) -> np.ndarray:
+    """تقريب مصفوفة بأسلوب ROUND_HALF_UP (بعيداً عن الصفر عند التعادل) مثل Decimal.quantize"""
+    factor = 10.0 ** decimals
+    # التقريب المسبق يزيل خطأ التمثيل الثنائي (مثل 0.4999999999) قبل حسم حالات التعادل
+    scaled = np.round(np.abs(values) * factor, 6)
+    return np.sign(values) * np.floor(scaled + 0.5) / factor
+
+_NS_PER_SECOND = 1_000_000_000
+_NS_PER_DAY = 86400 * _NS_PER_SECOND
+
+def _business_seconds(start_ns: np.ndarray, end_ns: np.ndarray,
+                      work_start_hour: int, work_end_hour: int) -> np.ndarray:
+    """
+    ثواني العمل بين أوقات محلية (نانوثانية wall-clock) بصيغة مغلقة
+
+    اليوم الأول: من وقت البداية (مقصوصاً على نافذة العمل) حتى نهاية العمل،
+    اليوم الأخير: من بداية العمل حتى وقت النهاية (مقصوصاً)، وما بينهما أيام كاملة.
+    """
+    window_start = work_start_hour * 3600 * _NS_PER_SECOND
+    window_end = work_end_hour * 3600 * _NS_PER_SECOND
+    window_length = max(window_end - window_start, 0)
+
+    start_day, start_tod = np.divmod(start_ns, _NS_PER_DAY)
+    end_day, end_tod = np.divmod(end_ns, _NS_PER_DAY)
+    start_clip = np.clip(start_tod, window_start, window_end)
+    end_clip = np.clip(end_tod, window_start, window_end)
+
+    same_day = end_clip - start_clip
+    spanning = (window_end - start_clip) + (end_clip - window_start) + (end_day - start_day - 1) * window_length
+    total_ns = np.where(end_day == start_day, same_day, spanning)
+    total_ns = np.where(end_ns > start_ns, np.maximum(total_ns, 0), 0)
+
+    return (total_ns // 1000) / 1e6
+
 class PrecisionTimeCalculator:
     """حاسبة زمنية عالية الدقة للتطبيقات الإشعاعية"""
     
@@ -32,7 +111,47 @@ class PrecisionTimeCalculator:
         """
         self.local_tz = pytz.timezone(timezone_name)
         self.utc = pytz.UTC
-        
+
+        # تخزين إزاحة المنطقة الزمنية بعد آخر انتقال للتوقيت الصيفي
+        # (Asia/Baghdad ثابتة على +03:00 منذ 2008) لتجنب localize المكلفة
+        self._fixed_offset_since, self._fixed_tzinfo = self._resolve_fixed_offset()
+
+        # ذاكرة LRU محدودة لتحليل النصوص المتكررة
+        self._parse_string_cached = lru_cache(maxsize=PARSE_CACHE_SIZE)(self._parse_datetime_string)
+
+    def _resolve_fixed_offset(self) -> Tuple[Optional[datetime], Optional[object]]:
+        """
+        تحديد اللحظة (محلياً) التي تصبح بعدها إزاحة المنطقة الزمنية ثابتة
+
+        Returns:
+            Tuple: (بداية الإزاحة الثابتة, tzinfo الثابتة) أو (None, None)
+        """
+        transitions = getattr(self.local_tz, '_utc_transition_times', None)
+        if not transitions:
+            return None, None
+
+        # يوم كامل بعد آخر انتقال يكفي لتجاوز أي غموض في التوقيت المحلي
+        fixed_since = transitions[-1] + timedelta(days=1)
+        try:
+            fixed_tzinfo = self.local_tz.localize(fixed_since).tzinfo
+        except Exception:
+            return None, None
+        return fixed_since, fixed_tzinfo
+
+    def _localize(self, naive_dt: datetime) -> datetime:
+        """إضافة المنطقة الزمنية المحلية لتاريخ بدون منطقة زمنية"""
+        if self._fixed_offset_since is not None and naive_dt >= self._fixed_offset_since:
+            return naive_dt.replace(tzinfo=self._fixed_tzinfo)
+        return self.local_tz.localize(naive_dt)
+
+    def clear_parse_cache(self):
+        """مسح ذاكرة تحليل النصوص المؤقتة"""
+        self._parse_string_cached.cache_clear()
+
+    def get_parse_cache_info(self):
+        """إحصائيات ذاكرة تحليل النصوص (hits, misses, maxsize, currsize)"""
+        return self._parse_string_cached.cache_info()
+
     def get_current_time(self, use_utc: bool = False) -> datetime:
         """
         الحصول على الوقت الحالي بدقة عالية
@@ -59,58 +178,54 @@ class PrecisionTimeCalculator:
             datetime: تاريخ ووقت موحد مع معلومات المنطقة الزمنية
         """
         if isinstance(dt, str):
-            # محاولة تحليل التنسيقات مع المنطقة الزمنية أولاً
-            try:
-                # إذا كان التاريخ يحتوي على معلومات المنطقة الزمنية
-                if '+' in dt or 'Z' in dt:
-                    # استخدام fromisoformat للتعامل مع ISO format مع المنطقة الزمنية
-                    if dt.endswith('Z'):
-                        dt = dt.replace('Z', '+00:00')
-                    parsed_dt = datetime.fromisoformat(dt)
-                    # تحويل إلى المنطقة الزمنية المحلية
-                    return parsed_dt.astimezone(self.local_tz)
-            except ValueError:
-                pass
-
-            # إزالة معلومات المنطقة الزمنية للتحليل التقليدي
-            clean_dt_str = dt.replace('Z', '').replace('+00:00', '')
-            # إزالة أي معلومات منطقة زمنية أخرى
-            import re
-            clean_dt_str = re.sub(r'[+-]\d{2}:\d{2}$', '', clean_dt_str)
-
-            # محاولة تحليل التنسيقات المختلفة
-            formats = [
-                '%Y-%m-%d %H:%M:%S.%f',  # مع الميكروثانية
-                '%Y-%m-%d %H:%M:%S',     # بدون الميكروثانية
-                '%Y-%m-%dT%H:%M:%S.%f',  # ISO format مع الميكروثانية
-                '%Y-%m-%dT%H:%M:%S',     # ISO format بدون الميكروثانية
-            ]
-            
-            parsed_dt = None
-            for fmt in formats:
-                try:
-                    parsed_dt = datetime.strptime(clean_dt_str, fmt)
-                    break
-                except ValueError:
-                    continue
-            
-            if parsed_dt is None:
-                raise ValueError(f"Unable to parse datetime string: {dt}")
-            
-            # إضافة معلومات المنطقة الزمنية إذا لم تكن موجودة
-            if parsed_dt.tzinfo is None:
-                parsed_dt = self.local_tz.localize(parsed_dt)
-            
-            return parsed_dt
+            return self._parse_string_cached(dt)
         
         elif isinstance(dt, datetime):
             # إضافة معلومات المنطقة الزمنية إذا لم تكن موجودة
             if dt.tzinfo is None:
-                return self.local_tz.localize(dt)
+                return self._localize(dt)
             return dt
         
         else:
             raise TypeError(f"Unsupported datetime type: {type(dt)}")
+
+    def _parse_datetime_string(self, dt: str) -> datetime:
+        """
+        تحليل نص التاريخ والوقت (المسار السريع أولاً ثم التنسيقات القديمة)
+        
+        Args:
+            dt: نص التاريخ والوقت
+            
+        Returns:
+            datetime: تاريخ ووقت مع معلومات المنطقة الزمنية
+        """
+        # المسار السريع: fromisoformat يغطي التنسيقات المخزنة في قاعدة البيانات
+        iso_str = dt[:-1] + '+00:00' if dt.endswith('Z') else dt
+        try:
+            parsed_dt = datetime.fromisoformat(iso_str)
+        except ValueError:
+            parsed_dt = None
+
+        if parsed_dt is not None:
+            if parsed_dt.tzinfo is None:
+                return self._localize(parsed_dt)
+            if '+' in dt or 'Z' in dt:
+                # تحويل إلى المنطقة الزمنية المحلية
+                return parsed_dt.astimezone(self.local_tz)
+            # الإزاحات السالبة كانت تُحذف وتُعامل كتوقيت محلي - نحافظ على السلوك نفسه
+            return self._localize(parsed_dt.replace(tzinfo=None))
+
+        # المسار البطيء: إزالة معلومات المنطقة الزمنية وتجربة التنسيقات القديمة
+        clean_dt_str = dt.replace('Z', '').replace('+00:00', '')
+        clean_dt_str = _TZ_OFFSET_SUFFIX_RE.sub('', clean_dt_str)
+
+        for fmt in _LEGACY_FORMATS:
+            try:
+                return self._localize(datetime.strptime(clean_dt_str, fmt))
+            except ValueError:
+                continue
+
+        raise ValueError(f"Unable to parse datetime string: {dt}")
     
     def calculate_duration(self, start_time: Union[str, datetime], 
                           end_time: Union[str, datetime] = None) -> Tuple[Decimal, Decimal, Decimal, Decimal]:
@@ -124,20 +239,7 @@ class PrecisionTimeCalculator:
         Returns:
             Tuple: (ثواني, دقائق, ساعات, أيام) بدقة عالية
         """
-        start_dt = self.normalize_datetime(start_time)
-        
-        if end_time is None:
-            end_dt = self.get_current_time()
-        else:
-            end_dt = self.normalize_datetime(end_time)
-        
-        # التأكد من أن كلا التوقيتين في نفس المنطقة الزمنية
-        if start_dt.tzinfo != end_dt.tzinfo:
-            end_dt = end_dt.astimezone(start_dt.tzinfo)
-        
-        # حساب الفرق بدقة الميكروثانية
-        duration = end_dt - start_dt
-        total_seconds = Decimal(str(duration.total_seconds()))
+        total_seconds = Decimal(str(self.calculate_duration_seconds(start_time, end_time)))
         
         # حساب الوحدات المختلفة بدقة عالية
         seconds = total_seconds
@@ -146,6 +248,43 @@ class PrecisionTimeCalculator:
         days = total_seconds / Decimal('86400')
         
         return seconds, minutes, hours, days
+
+    def calculate_duration_seconds(self, start_time: Union[str, datetime], 
+                                   end_time: Union[str, datetime] = None) -> float:
+        """
+        حساب المدة بالثواني (float64) - المسار السريع للحلقات الداخلية
+        
+        Args:
+            start_time: وقت البداية
+            end_time: وقت النهاية (افتراضي: الوقت الحالي)
+            
+        Returns:
+            float: المدة بالثواني بدقة الميكروثانية
+        """
+        start_dt = self.normalize_datetime(start_time)
+        
+        if end_time is None:
+            end_dt = self.get_current_time()
+        else:
+            end_dt = self.normalize_datetime(end_time)
+        
+        # الطرح بين أوقات aware يتم على UTC بغض النظر عن المنطقة الزمنية
+        return (end_dt - start_dt).total_seconds()
+
+    def calculate_duration_float(self, start_time: Union[str, datetime], 
+                                 end_time: Union[str, datetime] = None) -> Tuple[float, float, float, float]:
+        """
+        حساب المدة بوحدات متعددة (float64) بدون إنشاء كائنات Decimal
+        
+        Args:
+            start_time: وقت البداية
+            end_time: وقت النهاية (افتراضي: الوقت الحالي)
+            
+        Returns:
+            Tuple: (ثواني, دقائق, ساعات, أيام)
+        """
+        seconds = self.calculate_duration_seconds(start_time, end_time)
+        return seconds, seconds / 60.0, seconds / 3600.0, seconds / 86400.0
     
     def calculate_precise_exposure(self, dose_rate: float, duration_hours: Decimal) -> Decimal:
         """
@@ -159,10 +298,27 @@ class PrecisionTimeCalculator:
             Decimal: التعرض الإجمالي (μSv) بدقة عالية
         """
         dose_rate_decimal = Decimal(str(dose_rate))
-        exposure = dose_rate_decimal * duration_hours
+        exposure = dose_rate_decimal * Decimal(str(duration_hours))
         
         # تقريب إلى 6 خانات عشرية
-        return exposure.quantize(Decimal('0.000001'), rounding=ROUND_HALF_UP)
+        return exposure.quantize(EXPOSURE_QUANTUM, rounding=ROUND_HALF_UP)
+
+    def integrate_exposure_float(self, dose_rates: ArrayLike, duration_hours: ArrayLike) -> float:
+        """
+        تكامل التعرض لعدة فترات بـ float64 مع جمع Neumaier المعوَّض
+        
+        لا يُقرَّب أي حد وسيط؛ استخدم quantize_exposure مرة واحدة عند الحفظ أو الإرجاع.
+        
+        Args:
+            dose_rates: معدلات الجرعة (μSv/h)
+            duration_hours: المدد بالساعات
+            
+        Returns:
+            float: التعرض الإجمالي (μSv) غير مقرب
+        """
+        rates = np.asarray(dose_rates, dtype='float64')
+        hours = np.asarray(duration_hours, dtype='float64')
+        return neumaier_sum(rates * hours)
     
     def format_duration(self, seconds: Decimal, language: str = None) -> str:
         """
@@ -209,7 +365,8 @@ class PrecisionTimeCalculator:
         return " ".join(parts)
     def get_time_intervals(self, start_time: Union[str, datetime], 
                           end_time: Union[str, datetime], 
-                          interval_minutes: int = 1) -> list:
+                          interval_minutes: int = 1,
+                          as_edges: bool = False) -> Union[Iterator[dict], np.ndarray]:
         """
         تقسيم الفترة الزمنية إلى فترات فرعية
         
@@ -217,27 +374,68 @@ class PrecisionTimeCalculator:
             start_time: وقت البداية
             end_time: وقت النهاية
             interval_minutes: طول الفترة الفرعية بالدقائق
+            as_edges: إرجاع حدود الفترات كمصفوفة NumPy بدلاً من مولّد القواميس
             
         Returns:
-            list: قائمة بالفترات الزمنية
+            Iterator[dict] | np.ndarray: مولّد للفترات الزمنية، أو حدودها (انظر get_time_interval_edges)
+        """
+        if as_edges:
+            return self.get_time_interval_edges(start_time, end_time, interval_minutes)
+        return self.iter_time_intervals(start_time, end_time, interval_minutes)
+
+    def iter_time_intervals(self, start_time: Union[str, datetime], 
+                            end_time: Union[str, datetime], 
+                            interval_minutes: int = 1) -> Iterator[dict]:
+        """
+        مولّد للفترات الفرعية دون بناء قائمة كاملة في الذاكرة
+        
+        Args:
+            start_time: وقت البداية
+            end_time: وقت النهاية
+            interval_minutes: طول الفترة الفرعية بالدقائق
+            
+        Yields:
+            dict: {'start', 'end', 'duration_minutes'}
         """
         start_dt = self.normalize_datetime(start_time)
         end_dt = self.normalize_datetime(end_time)
         
-        intervals = []
         current_time = start_dt
         interval_delta = timedelta(minutes=interval_minutes)
         
         while current_time < end_dt:
             next_time = min(current_time + interval_delta, end_dt)
-            intervals.append({
+            yield {
                 'start': current_time,
                 'end': next_time,
                 'duration_minutes': (next_time - current_time).total_seconds() / 60
-            })
+            }
             current_time = next_time
+
+    def get_time_interval_edges(self, start_time: Union[str, datetime], 
+                                end_time: Union[str, datetime], 
+                                interval_minutes: int = 1) -> np.ndarray:
+        """
+        حدود الفترات الفرعية كمصفوفة واحدة
+        
+        Args:
+            start_time: وقت البداية
+            end_time: وقت النهاية
+            interval_minutes: طول الفترة الفرعية بالدقائق
+            
+        Returns:
+            np.ndarray: حدود بنوع datetime64[ns] بتوقيت UTC، طولها عدد الفترات + 1
+                        (مصفوفة فارغة إذا كانت النهاية لا تتجاوز البداية)
+        """
+        start_ns = pd.Timestamp(self.normalize_datetime(start_time)).as_unit('ns').value
+        end_ns = pd.Timestamp(self.normalize_datetime(end_time)).as_unit('ns').value
+        
+        if end_ns <= start_ns:
+            return np.array([], dtype='datetime64[ns]')
         
-        return intervals
+        step_ns = int(interval_minutes * 60 * 1_000_000_000)
+        edges = np.arange(start_ns, end_ns, step_ns, dtype='int64')
+        return np.append(edges, end_ns).view('datetime64[ns]')
     
     def validate_time_sequence(self, times: list) -> bool:
         """
@@ -262,7 +460,11 @@ class PrecisionTimeCalculator:
                                    work_start_hour: int = 8,
                                    work_end_hour: int = 17) -> Decimal:
         """
-        حساب ساعات العمل الفعلية فقط
+        حساب ساعات العمل الفعلية فقط (صيغة مغلقة بدون المرور على كل يوم)
+        
+        الأيام الكاملة في المنتصف × طول يوم العمل + الجزء الفعلي من اليوم الأول والأخير.
+        يُحسب على الوقت المحلي (wall-clock)، أي أن انتقالات التوقيت الصيفي داخل
+        ساعات العمل نفسها لا تُحتسب.
         
         Args:
             start_time: وقت البداية
@@ -273,33 +475,177 @@ class PrecisionTimeCalculator:
         Returns:
             Decimal: ساعات العمل الفعلية
         """
-        start_dt = self.normalize_datetime(start_time)
-        end_dt = self.normalize_datetime(end_time)
+        start_local = self.normalize_datetime(start_time).astimezone(self.local_tz).replace(tzinfo=None)
+        end_local = self.normalize_datetime(end_time).astimezone(self.local_tz).replace(tzinfo=None)
+        
+        start_ns = np.array([pd.Timestamp(start_local).as_unit('ns').value], dtype='int64')
+        end_ns = np.array([pd.Timestamp(end_local).as_unit('ns').value], dtype='int64')
+        seconds = _business_seconds(start_ns, end_ns, work_start_hour, work_end_hour)[0]
+        
+        total_work_hours = Decimal(str(seconds / 3600))
+        return total_work_hours.quantize(Decimal('0.001'), rounding=ROUND_HALF_UP)
+
+    def get_business_hours_duration_array(self, start_times: ArrayLike,
+                                          end_times: ArrayLike,
+                                          work_start_hour: int = 8,
+                                          work_end_hour: int = 17) -> np.ndarray:
+        """
+        ساعات العمل الفعلية لعدة جلسات دفعة واحدة - المقابل المتجه لـ get_business_hours_duration
+        
+        Args:
+            start_times: أوقات البداية
+            end_times: أوقات النهاية
+            work_start_hour: ساعة بداية العمل (افتراضي: 8)
+            work_end_hour: ساعة نهاية العمل (افتراضي: 17)
+            
+        Returns:
+            np.ndarray: ساعات العمل لكل جلسة مقربة إلى 3 خانات عشرية
+        """
+        start_ns = self.normalize_datetime_array(start_times).tz_localize(None).as_unit('ns').asi8
+        end_ns = self.normalize_datetime_array(end_times).tz_localize(None).as_unit('ns').asi8
+        if len(start_ns) != len(end_ns):
+            raise ValueError("start_times and end_times must have the same length")
+        
+        seconds = _business_seconds(start_ns, end_ns, work_start_hour, work_end_hour)
+        return round_half_up_array(seconds / 3600, 3)
+
+    # ===================================
+    # واجهات متجهة (NumPy / pandas)
+    # ===================================
+
+    def normalize_datetime_array(self, values: ArrayLike) -> pd.DatetimeIndex:
+        """
+        توحيد مجموعة من الأوقات إلى المنطقة الزمنية المحلية دفعة واحدة
+        
+        Args:
+            values: أوقات (نصوص أو datetime أو datetime64) في قائمة أو مصفوفة أو Series
+            
+        Returns:
+            pd.DatetimeIndex: أوقات موحدة بالمنطقة الزمنية المحلية
+        """
+        if isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64):
+            # np.asarray(..., dtype=object) يحوّل datetime64[ns] إلى أعداد صحيحة - نمر عبر DatetimeIndex
+            values = pd.DatetimeIndex(values.ravel())
+        if isinstance(values, (pd.Series, pd.Index)) and pd.api.types.is_datetime64_any_dtype(values.dtype):
+            index = pd.DatetimeIndex(values)
+            if index.tz is None:
+                return self._localize_index(index)
+            return index.tz_convert(self.local_tz)
+
+        array = np.asarray(values, dtype=object).ravel()
+        if len(array) == 0:
+            return pd.DatetimeIndex([], tz=self.local_tz)
+
+        if not all(isinstance(v, str) for v in array):
+            # مدخلات مختلطة: المسار العددي مع الاستفادة من ذاكرة التحليل
+            # (utc=True لأن القيم قد تحمل مناطق زمنية مختلفة)
+            return pd.DatetimeIndex(pd.to_datetime([self.normalize_datetime(v) for v in array], utc=True)
+                                    ).tz_convert(self.local_tz)
+
+        strings = pd.Series(array, dtype=object)
+        # نفس قاعدة المسار العددي: '+' أو 'Z' تعني منطقة زمنية صريحة
+        aware_mask = (strings.str.contains('+', regex=False) | strings.str.contains('Z', regex=False)).to_numpy()
+
+        result = np.empty(len(strings), dtype='int64')
+        if aware_mask.any():
+            aware = pd.to_datetime(strings[aware_mask], utc=True, format='ISO8601')
+            result[aware_mask] = aware.to_numpy(dtype='datetime64[ns]').view('int64')
+        if (~aware_mask).any():
+            naive_strings = strings[~aware_mask].str.replace(_TZ_OFFSET_SUFFIX_RE, '', regex=True)
+            naive = self._localize_index(pd.DatetimeIndex(pd.to_datetime(naive_strings, format='ISO8601')))
+            result[~aware_mask] = naive.as_unit('ns').asi8
+
+        return pd.DatetimeIndex(result.view('datetime64[ns]')).tz_localize('UTC').tz_convert(self.local_tz)
+
+    def _localize_index(self, index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+        """إضافة المنطقة الزمنية المحلية لمجموعة أوقات بدون منطقة زمنية (مثل pytz localize)"""
+        return index.tz_localize(self.local_tz,
+                                 ambiguous=np.zeros(len(index), dtype=bool),
+                                 nonexistent='shift_forward')
+
+    def _to_epoch_ns(self, values: ArrayLike) -> np.ndarray:
+        """تحويل الأوقات إلى نانوثانية منذ epoch (UTC)"""
+        return self.normalize_datetime_array(values).as_unit('ns').asi8
+
+    @staticmethod
+    def _seconds_from_ns(delta_ns: np.ndarray) -> np.ndarray:
+        """تحويل فروق النانوثانية إلى ثوانٍ بدقة الميكروثانية (مثل timedelta.total_seconds)"""
+        return (delta_ns // 1000) / 1e6
+
+    @staticmethod
+    def _duration_units(seconds: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """تحويل الثواني إلى (ثواني, دقائق, ساعات, أيام)"""
+        return seconds, seconds / 60.0, seconds / 3600.0, seconds / 86400.0
+
+    def calculate_duration_array(self, start_times: ArrayLike,
+                                 end_times: Optional[ArrayLike] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        حساب المدد لأزواج (بداية, نهاية) دفعة واحدة - المقابل المتجه لـ calculate_duration
         
-        total_work_hours = Decimal('0')
-        current_date = start_dt.date()
-        
-        while current_date <= end_dt.date():
-            # تحديد بداية ونهاية يوم العمل
-            work_start = self.local_tz.localize(
-                datetime.combine(current_date, datetime.min.time().replace(hour=work_start_hour))
-            )
-            work_end = self.local_tz.localize(
-                datetime.combine(current_date, datetime.min.time().replace(hour=work_end_hour))
-            )
+        Args:
+            start_times: أوقات البداية
+            end_times: أوقات النهاية (افتراضي: الوقت الحالي لجميع العناصر)
             
-            # تحديد الفترة الفعلية للعمل في هذا اليوم
-            day_start = max(start_dt, work_start)
-            day_end = min(end_dt, work_end)
+        Returns:
+            Tuple: مصفوفات (ثواني, دقائق, ساعات, أيام)
+        """
+        start_ns = self._to_epoch_ns(start_times)
+        if end_times is None:
+            end_ns = np.full(len(start_ns), pd.Timestamp(self.get_current_time()).value, dtype='int64')
+        else:
+            end_ns = self._to_epoch_ns(end_times)
+            if len(end_ns) != len(start_ns):
+                raise ValueError("start_times and end_times must have the same length")
+
+        return self._duration_units(self._seconds_from_ns(end_ns - start_ns))
+
+    def calculate_pairwise_durations_array(self, times: ArrayLike,
+                                           start_time: Union[str, datetime, None] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        حساب المدد بين الأوقات المتتالية (مثل الفترات بين القراءات)
+        
+        Args:
+            times: أوقات مرتبة
+            start_time: وقت مرجعي قبل أول عنصر (اختياري) - تُحسب المدة الأولى منه
             
-            # إضافة ساعات العمل إذا كانت هناك فترة عمل فعلية
-            if day_start < day_end:
-                day_duration = (day_end - day_start).total_seconds() / 3600
-                total_work_hours += Decimal(str(day_duration))
+        Returns:
+            Tuple: مصفوفات (ثواني, دقائق, ساعات, أيام) بطول len(times) مع start_time أو len(times) - 1 بدونه
+        """
+        times_ns = self._to_epoch_ns(times)
+        if start_time is not None:
+            start_ns = pd.Timestamp(self.normalize_datetime(start_time)).value
+            times_ns = np.concatenate(([start_ns], times_ns))
+
+        return self._duration_units(self._seconds_from_ns(np.diff(times_ns)))
+
+    def calculate_exposure_array(self, dose_rates: ArrayLike, duration_hours: ArrayLike) -> np.ndarray:
+        """
+        حساب التعرض لمجموعة فترات - المقابل المتجه لـ calculate_precise_exposure
+        
+        Args:
+            dose_rates: معدلات الجرعة (μSv/h)
+            duration_hours: المدد بالساعات
             
-            current_date += timedelta(days=1)
+        Returns:
+            np.ndarray: التعرض لكل فترة (μSv) مقرباً إلى 6 خانات عشرية (ROUND_HALF_UP)
+        """
+        rates = np.asarray(dose_rates, dtype='float64')
+        hours = np.asarray(duration_hours, dtype='float64')
+        return round_half_up_array(rates * hours, 6)
+
+    def validate_time_sequence_array(self, times: ArrayLike) -> bool:
+        """
+        التحقق من تزايد الأوقات بشكل صارم - المقابل المتجه لـ validate_time_sequence
         
-        return total_work_hours.quantize(Decimal('0.001'), rounding=ROUND_HALF_UP)
+        Args:
+            times: أوقات
+            
+        Returns:
+            bool: True إذا كانت الأوقات متسلسلة بشكل صحيح
+        """
+        times_ns = self._to_epoch_ns(times)
+        return bool(np.all(np.diff(times_ns) > 0))
+
 
 # إنشاء مثيل عام للاستخدام
 time_calculator = PrecisionTimeCalculator()
@@ -312,25 +658,38 @@ def get_current_time_precise(use_utc: bool = False) -> datetime:
 def calculate_duration_precise(start_time: Union[str, datetime], 
                              end_time: Union[str, datetime] = None) -> dict:
     """حساب المدة بدقة عالية وإرجاع النتائج في قاموس"""
-    seconds, minutes, hours, days = time_calculator.calculate_duration(start_time, end_time)
+    seconds, minutes, hours, days = time_calculator.calculate_duration_float(start_time, end_time)
     
     return {
-        'seconds': float(seconds),
-        'minutes': float(minutes),
-        'hours': float(hours),
-        'days': float(days),
+        'seconds': seconds,
+        'minutes': minutes,
+        'hours': hours,
+        'days': days,
         'formatted': time_calculator.format_duration(seconds)
     }
 
 def calculate_exposure_precise(dose_rate: float, start_time: Union[str, datetime], 
                              end_time: Union[str, datetime] = None) -> dict:
     """حساب التعرض الإشعاعي بدقة عالية"""
-    _, _, hours, _ = time_calculator.calculate_duration(start_time, end_time)
-    exposure = time_calculator.calculate_precise_exposure(dose_rate, hours)
+    _, _, hours, _ = time_calculator.calculate_duration_float(start_time, end_time)
+    exposure = quantize_exposure(float(dose_rate) * hours)
     
     return {
-        'duration_hours': float(hours),
+        'duration_hours': hours,
         'dose_rate': dose_rate,
         'total_exposure': float(exposure),
         'exposure_precise': str(exposure)
     }
+
+def calculate_exposure_precise_batch(dose_rates: ArrayLike, start_times: ArrayLike,
+                                     end_times: Optional[ArrayLike] = None) -> pd.DataFrame:
+    """حساب التعرض الإشعاعي لعدة جلسات دفعة واحدة (المقابل المتجه لـ calculate_exposure_precise)"""
+    _, _, hours, _ = time_calculator.calculate_duration_array(start_times, end_times)
+    rates = np.asarray(dose_rates, dtype='float64')
+    exposure = time_calculator.calculate_exposure_array(rates, hours)
+
+    return pd.DataFrame({
+        'duration_hours': hours,
+        'dose_rate': rates,
+        'total_exposure': exposure
+    })
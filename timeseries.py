@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+استعلامات السلاسل الزمنية المجمّعة لقراءات الإشعاع (متوسط/أقصى/أدنى لكل فترة)
+
+- التجميع في SQL على الوقت كعدد صحيح (ثوانٍ منذ 1970) فلا تُنقل الصفوف الخام
+- الدلاء تبدأ من بداية النطاق المطلوب (from) وليس من منتصف ليل UTC، فالعميل
+  الذي يرسل منتصف الليل بتوقيته المحلي يحصل على أيام محلية
+- الأوقات في قاعدة البيانات مخزنة بـ CURRENT_TIMESTAMP (UTC)، والنصوص بدون
+  منطقة زمنية في from/to تُعامل كـ UTC أيضاً
+- النتيجة أعمدة (مصفوفات متوازية) بدلاً من قائمة كائنات، والدلاء الفارغة لا تظهر
+"""
+
+import re
+from datetime import datetime, timezone
+
+# الحقول المسموح تجميعها (اسم المعامل -> العمود)
+SERIES_FIELDS = {
+    'absorbed_dose_rate': 'absorbed_dose_rate',
+    'cpm': 'cpm',
+    'source_power': 'source_power',
+}
+
+# دوال التجميع المسموحة (count يُضاف دائماً)
+AGGREGATES = {
+    'avg': 'AVG(value)',
+    'min': 'MIN(value)',
+    'max': 'MAX(value)',
+    'sum': 'TOTAL(value)',
+}
+DEFAULT_AGGREGATES = ('avg', 'max', 'min')
+
+MIN_BUCKET_SECONDS = 1
+MAX_BUCKETS = 10000
+
+_BUCKET_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_BUCKET_RE = re.compile(r'^(\d+)\s*([smhd]?)$')
+
+def parse_bucket(value, default=300):
+    """طول الدلو بالثواني من نص مثل '300' أو '5m' أو '1h' أو '1d'"""
+    if value in (None, ''):
+        return default
+    match = _BUCKET_RE.match(str(value).strip().lower())
+    if not match:
+        raise ValueError("قيمة bucket غير صالحة (أمثلة: 300 أو 5m أو 1h أو 1d)")
+    seconds = int(match.group(1)) * _BUCKET_UNITS[match.group(2) or 's']
+    if seconds < MIN_BUCKET_SECONDS:
+        raise ValueError("قيمة bucket يجب أن تكون ثانية واحدة على الأقل")
+    return seconds
+
+def parse_aggregates(value):
+    """قائمة دوال التجميع من نص مفصول بفواصل (مثل 'avg,max')"""
+    if value in (None, ''):
+        return list(DEFAULT_AGGREGATES)
+    aggregates = list(dict.fromkeys(name.strip().lower() for name in value.split(',') if name.strip()))
+    unknown = [name for name in aggregates if name not in AGGREGATES and name != 'count']
+    if unknown or not aggregates:
+        raise ValueError(f"دوال تجميع غير معروفة: {', '.join(unknown)} "
+                         f"(المسموح: {', '.join(list(AGGREGATES) + ['count'])})")
+    return [name for name in aggregates if name != 'count']
+
+def parse_time(value):
+    """
+    وقت من معامل الطلب: ثوانٍ منذ 1970 أو نص ISO (بدون منطقة زمنية = UTC)
+
+    :return: عدد صحيح (ثوانٍ منذ 1970) أو None إذا لم يُحدد
+    """
+    if value in (None, ''):
+        return None
+    text = str(value).strip()
+    if re.match(r'^\d+(\.\d+)?$', text):
+        return int(float(text))
+    try:
+        parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"وقت غير صالح: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+def to_db_timestamp(epoch_seconds):
+    """ثوانٍ منذ 1970 -> نص بتنسيق CURRENT_TIMESTAMP للمقارنة مع الفهرس"""
+    return datetime.fromtimestamp(epoch_seconds, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def build_bucket_query(field, aggregates, session_id=None, start=None, end=None):
+    """
+    استعلام التجميع لكل دلو
+
+    قراءات الحساس تُحفظ نسخة لكل جلسة نشطة (نفس الوقت ونفس القيم)، لذلك بدون session_id
+    تُدمج النسخ المتطابقة فقط قبل التجميع: قراءتان حقيقيتان في نفس الثانية (دقة CURRENT_TIMESTAMP)
+    تختلفان في قيمهما (على الأقل الجرعة التراكمية) فتُحتسب كل منهما
+    :param start: بداية النطاق (ثوانٍ منذ 1970) - أيضاً مرجع محاذاة الدلاء
+    :return: (sql, params) - المعاملات المسماة :bucket و :origin تُضاف من المستدعي
+    """
+    column = SERIES_FIELDS[field]
+    where, params = '', {}
+    if session_id is not None:
+        where += ' AND session_id = :session_id'
+        params['session_id'] = session_id
+    if start is not None:
+        where += ' AND timestamp >= :start'
+        params['start'] = to_db_timestamp(start)
+    if end is not None:
+        where += ' AND timestamp < :end'
+        params['end'] = to_db_timestamp(end)
+
+    if session_id is not None:
+        source = f'''SELECT timestamp, {column} AS value FROM radiation_readings_local
+                     WHERE {column} IS NOT NULL {where}'''
+    else:
+        source = f'''SELECT timestamp, {column} AS value FROM radiation_readings_local
+                     WHERE {column} IS NOT NULL {where}
+                     GROUP BY timestamp, cpm, source_power, absorbed_dose_rate, total_absorbed_dose'''
+
+    selects = ', '.join(AGGREGATES[name] for name in aggregates)
+    sql = f'''SELECT :origin + ((CAST(strftime('%s', timestamp) AS INTEGER) - :origin) / :bucket) * :bucket AS bucket_start,
+                     COUNT(*){', ' + selects if selects else ''}
+              FROM ({source})
+              GROUP BY bucket_start
+              ORDER BY bucket_start'''
+    return sql, params
+
+def fetch_buckets(cursor, field, aggregates, bucket_seconds, origin, session_id=None, start=None, end=None,
+                  digits=6):
+    """
+    تنفيذ استعلام التجميع وإرجاع النتيجة كأعمدة
+
+    :param origin: مرجع محاذاة الدلاء (ثوانٍ منذ 1970)
+    :return: {'t': [...], 'count': [...], 'avg': [...], ...}
+    """
+    sql, params = build_bucket_query(field, aggregates, session_id, start, end)
+    params.update(bucket=bucket_seconds, origin=origin)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+
+    columns = {'t': [row[0] for row in rows], 'count': [row[1] for row in rows]}
+    for position, name in enumerate(aggregates, start=2):
+        columns[name] = [round(row[position], digits) if row[position] is not None else None for row in rows]
+    return columns